@@ -0,0 +1,232 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import atexit
+import os
+import threading
+import traceback
+from collections import deque
+from copy import deepcopy
+from queue import Queue
+
+import numpy as np
+
+from pylabcontrol.core import Script
+from b26_toolkit.core.hdf5_storage import save_data_hdf5, HDF5_EXTENSION
+
+
+class BackgroundWriter(object):
+    """
+    Executes write jobs one after the other in a worker thread, such that the thread that submits them can continue
+    (e.g. with the next measurement) while the data is written to disk. If max_jobs jobs are waiting, submit blocks until
+    one of them is done, such that a slow disk slows down the measurement instead of filling the memory with data.
+    """
+
+    def __init__(self, max_jobs=10):
+        """
+        Args:
+            max_jobs: maximum number of jobs that wait in the queue
+        """
+        self._queue = Queue(maxsize=max_jobs)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, function, args=(), on_error=None):
+        """
+        adds a job to the queue, blocks while the queue is full
+        Args:
+            function: function that is called in the worker thread
+            args: arguments of function
+            on_error: function that is called with the error message if function raises an exception
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='BackgroundWriter')
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put((function, args, on_error))
+
+    def _work(self):
+        """
+        executes the jobs in the queue, runs in the worker thread
+        """
+        while True:
+            function, args, on_error = self._queue.get()
+            try:
+                function(*args)
+            except Exception:
+                message = traceback.format_exc()
+                print(message)
+                if on_error is not None:
+                    on_error(message)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        blocks until all submitted jobs are done
+        """
+        self._queue.join()
+
+
+_background_writer = None
+
+def get_background_writer():
+    """
+    Returns: the BackgroundWriter shared by all scripts, which is flushed when the interpreter exits
+    """
+    global _background_writer
+    if _background_writer is None:
+        _background_writer = BackgroundWriter()
+        atexit.register(_background_writer.flush)
+    return _background_writer
+
+
+def _copy_data(data):
+    """
+    copies the containers and arrays of the script data, such that the acquisition can continue to modify them while the
+    copy is written. Other values (numbers, strings) are immutable and not copied, which is much faster than deepcopy
+    for data with large arrays or long lists.
+    Args:
+        data: dictionary, deque of dictionaries (only the last one is copied, as only that one is saved), list or array
+
+    Returns: the copy
+    """
+    if isinstance(data, np.ndarray):
+        return data.copy()
+    elif isinstance(data, dict):
+        return {key: _copy_data(value) for key, value in data.items()}
+    elif isinstance(data, deque):
+        return deque([_copy_data(data[-1])]) if len(data) > 0 else deque()
+    elif isinstance(data, (list, tuple)):
+        return type(data)(_copy_data(value) for value in data)
+    return data
+
+
+class _DataSnapshot(object):
+    """
+    copy of the data of a script, with the attributes that Script.save_data needs to write it
+    """
+    RAW_DATA_DIR = Script.RAW_DATA_DIR
+    check_filename = staticmethod(Script.check_filename)
+
+    def __init__(self, data):
+        self.data = data
+
+
+class BackgroundSavingScript(object):
+    """
+    Mixin for scripts with large data sets (e.g. images) that writes the data to disk in a background thread.
+
+    save_data takes a snapshot of self.data and returns immediately, so that the next measurement can start while the
+    data is written. Errors that occur while writing are logged by the next call of save_data and raised as IOError by
+    wait_for_saves, which also blocks until all data has been written. save_data doesn't raise them, since Script.run
+    calls it before it saves the log and finishes the script. All pending data is written before the interpreter exits.
+
+    With the setting data_format = 'hdf5' all data of a run is written into a single compressed HDF5 file (requires
+    h5py) instead of one csv file per key, see b26_toolkit.core.hdf5_storage. Scripts without the setting use
+    _DATA_FORMAT.
+
+    The mixin has to come before Script in the list of base classes, e.g. class GalvoScanGeneric(BackgroundSavingScript, Script)
+    """
+
+    _SAVE_IN_BACKGROUND = True
+    _DATA_FORMAT = 'csv'  # 'csv' or 'hdf5'
+
+    def save_data(self, filename=None, data_tag=None, verbose=False):
+        """
+        saves the script data to a file in the background (see Script.save_data)
+        filename: target filename, if not provided, it is created from internal function
+        data_tag: string, if provided save only the data that matches the tag, otherwise save all data
+        verbose: if true print additional info to std out
+        """
+        data_format = self._get_data_format()
+        if not self._SAVE_IN_BACKGROUND and data_format == 'csv':
+            return super(BackgroundSavingScript, self).save_data(filename, data_tag, verbose)
+
+        # the filename depends on the settings and start time, so we get it before the next measurement starts
+        if data_format == 'hdf5':
+            if filename is None:
+                filename = self.filename(HDF5_EXTENSION)
+            # callers that pass a csv filename (e.g. with a data_tag) still get a file that load_data recognizes
+            filename = os.path.splitext(filename)[0] + HDF5_EXTENSION
+            filename = os.path.join(os.path.dirname(filename), self.RAW_DATA_DIR, os.path.basename(filename))
+            data = self.data if data_tag is None else {data_tag: self.data[data_tag]}
+            function, args = save_data_hdf5, (filename, _copy_data(data), deepcopy(dict(self.settings)), verbose)
+        else:
+            if filename is None:
+                filename = self.filename('.csv')
+            function, args = Script.save_data, (_DataSnapshot(_copy_data(self.data)), filename, data_tag, verbose)
+
+        if not self._SAVE_IN_BACKGROUND:
+            return function(*args)
+
+        errors = self._get_save_errors()
+        get_background_writer().submit(function, args, on_error=lambda message: errors.append((filename, message)))
+        self._log_save_errors()
+
+    def _get_data_format(self):
+        """
+        Returns: the file format of the data ('csv' or 'hdf5'), the setting data_format if the script has it and
+            otherwise _DATA_FORMAT
+        """
+        if 'data_format' in self.settings:
+            return self.settings['data_format']
+        return self._DATA_FORMAT
+
+    def wait_for_saves(self):
+        """
+        blocks until all data submitted by save_data is written
+
+        Raises: IOError if a background save of this script failed
+        """
+        get_background_writer().flush()
+        self._raise_save_errors()
+
+    def _get_save_errors(self):
+        """
+        Returns: list of (filename, error message) of failed background saves that have not been reported yet
+        """
+        if not hasattr(self, '_save_errors'):
+            self._save_errors = []
+            self._logged_save_errors = 0
+        return self._save_errors
+
+    def _log_save_errors(self):
+        """
+        reports the errors of failed background saves that have not been logged yet to the log
+        """
+        errors = self._get_save_errors()
+        new_errors = errors[self._logged_save_errors:]
+        for filename, message in new_errors:
+            self.log('failed to save data to {:s}: {:s}'.format(filename, message))
+        self._logged_save_errors += len(new_errors)
+
+    def _raise_save_errors(self):
+        """
+        reports the errors of failed background saves to the log, forgets them and raises the first one
+        """
+        errors = self._get_save_errors()
+        failures = []
+        while errors:
+            failures.append(errors.pop(0))
+        for filename, message in failures[self._logged_save_errors:]:
+            self.log('failed to save data to {:s}: {:s}'.format(filename, message))
+        self._logged_save_errors = 0
+        if failures:
+            raise IOError('failed to save data to {:s}: {:s}'.format(*failures[0]))
@@ -0,0 +1,201 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import glob
+import json
+import os
+from collections import deque
+
+import numpy as np
+
+from pylabcontrol.core import Script
+
+try:
+    import h5py
+    _h5py_detected = True
+except ImportError:
+    _h5py_detected = False
+
+HDF5_EXTENSION = '.h5'
+
+
+def _check_h5py():
+    if not _h5py_detected:
+        raise ImportError('h5py is required to read and write HDF5 data files, install it with pip install h5py')
+
+
+def _write_value(group, key, value):
+    """
+    writes a single data entry to group, arrays with more than a few elements are chunked and compressed
+    Args:
+        group: h5py group or file
+        key: name of the entry
+        value: number, string, list, array or dictionary of those
+
+    Returns: True if the value could be written
+
+    """
+    if isinstance(value, dict):
+        subgroup = group.create_group(key)
+        return all([_write_value(subgroup, str(k), v) for k, v in value.items()])
+
+    if value is None:
+        value = []
+    if isinstance(value, str):
+        group.attrs[key] = value
+        return True
+
+    try:
+        value = np.asarray(value)
+    except ValueError:
+        # ragged lists
+        return False
+    if value.dtype == object:
+        return False
+    if value.dtype.kind == 'U':
+        value = value.astype('S')
+
+    if value.size > 16:
+        group.create_dataset(key, data=value, chunks=True, compression='gzip', compression_opts=4, shuffle=True)
+    else:
+        group.create_dataset(key, data=value)
+    return True
+
+
+def save_data_hdf5(filename, data, settings=None, verbose=False):
+    """
+    saves all data of a script into a single HDF5 file
+    Args:
+        filename: target filename
+        data: dictionary with the script data (or deque of dictionaries, the last one is saved, as in Script.save_data)
+        settings: optional dictionary with the script settings, saved as json in the attribute 'settings'
+        verbose: if true print additional info to std out
+    """
+    _check_h5py()
+
+    if isinstance(data, deque):
+        data = data[-1]
+
+    filename = Script.check_filename(filename)
+    if os.path.dirname(filename) and not os.path.exists(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+
+    with h5py.File(filename, 'w') as h5file:
+        if settings is not None:
+            h5file.attrs['settings'] = json.dumps(settings, default=lambda value: value.tolist() if hasattr(value, 'tolist') else str(value))
+        for key, value in data.items():
+            if not _write_value(h5file, key, value):
+                print('warning! Data ({:s}) can not be converted to an array. Not saved'.format(key))
+            elif verbose:
+                print('saved', key)
+
+
+def _read_group(group, nested=False):
+    """
+    reads a group of a HDF5 file into a dictionary with the same shapes as Script.load_data returns for csv files:
+    arrays are squeezed and the entries of dictionaries (nested groups) are 1D arrays, e.g. {'x': array([0.1])}
+    Args:
+        group: h5py group or file
+        nested: True if the group holds a dictionary entry of the data rather than the data itself
+    """
+    data = {}
+    for key, item in group.items():
+        if isinstance(item, h5py.Group):
+            data[key] = _read_group(item, nested=True)
+        else:
+            value = np.squeeze(np.asarray(item[()]))
+            if value.dtype.kind == 'S':
+                value = value.astype('U')
+            data[key] = np.atleast_1d(value) if nested else value
+    for key, value in group.attrs.items():
+        if key != 'settings':
+            value = value.decode() if isinstance(value, bytes) else value
+            data[key] = np.array([value]) if nested else value
+    return data
+
+
+def get_hdf5_files(path):
+    """
+    Args:
+        path: path to folder saved by a script or raw_data folder within
+
+    Returns: list of the HDF5 data files in the folder
+
+    """
+    if os.path.isfile(path):
+        return [path] if path.endswith(HDF5_EXTENSION) else []
+    if os.path.isdir(os.path.join(path, Script.RAW_DATA_DIR)):
+        path = os.path.join(path, Script.RAW_DATA_DIR)
+    return sorted(glob.glob(os.path.join(path, '*' + HDF5_EXTENSION)))
+
+
+def load_data_hdf5(path):
+    """
+    loads the data that has been saved with save_data_hdf5
+    Args:
+        path: HDF5 file, or folder saved by a script or raw_data folder within
+
+    Returns:
+        a dictionary with the data of form
+        data = {param_1_name: param_1_data, ...}, the same as Script.load_data returns for csv files
+
+    """
+    _check_h5py()
+
+    data = {}
+    for filename in get_hdf5_files(path):
+        with h5py.File(filename, 'r') as h5file:
+            data.update(_read_group(h5file))
+    return data
+
+
+def load_settings_hdf5(path):
+    """
+    Args:
+        path: HDF5 file, or folder saved by a script or raw_data folder within
+
+    Returns: the settings saved with save_data_hdf5 or None
+
+    """
+    _check_h5py()
+
+    for filename in get_hdf5_files(path):
+        with h5py.File(filename, 'r') as h5file:
+            if 'settings' in h5file.attrs:
+                return json.loads(h5file.attrs['settings'])
+
+
+def load_data(path, verbose=False, raise_errors=False):
+    """
+    loads the data of a script from HDF5 if the folder contains HDF5 data files and otherwise from the csv files with
+    Script.load_data
+    Args:
+        path: path to folder saved by a script or raw_data folder within
+        verbose: if true print additional information
+        raise_errors: if true raise errors if false just print to std out
+
+    Returns:
+        a dictionary with the data of form
+        data = {param_1_name: param_1_data, ...}
+
+    """
+    if os.path.exists(path) and get_hdf5_files(path):
+        if verbose:
+            print('loading HDF5 data from', path)
+        return load_data_hdf5(path)
+    return Script.load_data(path, verbose=verbose, raise_errors=raise_errors)
@@ -1,6 +1,15 @@
 from pylabcontrol.core.script_iterator import ScriptIterator
 from pylabcontrol.core import Script, Parameter
+from b26_toolkit.core.background_saving import BackgroundSavingScript
+from b26_toolkit.data_processing.drift_estimation import DriftEstimator
+from b26_toolkit.data_processing.point_ordering import get_point_order
 import numpy as np
+import time
+import datetime
+import glob
+from copy import deepcopy
+import json
+import os
 
 class ScriptIteratorB26(ScriptIterator):
 
@@ -127,7 +136,19 @@ class ScriptIteratorB26(ScriptIterator):
             script_default_settings = [
                 Parameter('script_order', script_order),
                 Parameter('script_execution_freq', script_execution_freq),
-                Parameter('run_all_first', True, bool, 'Run all scripts with nonzero frequency in first pass')
+                Parameter('run_all_first', True, bool, 'Run all scripts with nonzero frequency in first pass'),
+                Parameter('optimize_point_order', False, bool, 'visit the points along a short path instead of in the order of select_points. Tags keep the original index of each point'),
+                Parameter('drift_model', [
+                    Parameter('on/off', False, bool, 'predict the drift from the shifts found by correlate_iter and only run correlate_iter when the prediction becomes too uncertain'),
+                    Parameter('max_uncertainty', .002, float, 'run correlate_iter when the uncertainty of the predicted shift exceeds this (V)'),
+                    Parameter('measurement_noise', .0005, float, 'uncertainty of the shift found by correlate_iter (V)'),
+                    Parameter('process_noise', 1e-7, float, 'random change of the drift velocity (V/s/sqrt(s))')
+                ]),
+                Parameter('checkpoint', [
+                    Parameter('on/off', False, bool, 'write a checkpoint file after each completed point'),
+                    Parameter('filename', '', str, 'checkpoint file, if empty the checkpoint is saved in the data folder of the run and resume uses the latest checkpoint of a run with the same tag'),
+                    Parameter('resume', False, bool, 'skip the points that are completed in the checkpoint file and continue with the saved shift, set point and drift model')
+                ])
             ]
 
         elif iterator_type == 'test':
@@ -202,7 +223,64 @@ class ScriptIteratorB26(ScriptIterator):
             points = self.scripts['select_points'].data['nv_locations']
             N_points = len(points)
 
-            for i, pt in enumerate(points):
+            if self.settings['optimize_point_order'] and N_points > 0:
+                point_order = get_point_order(points)
+            else:
+                point_order = np.arange(N_points)
+            # original index of the point visited in each loop, the tags use the original index
+            self.data['point_order'] = point_order
+
+            checkpoint = self._load_checkpoint(points) if self.settings['checkpoint']['resume'] else None
+            if checkpoint is None:
+                checkpoint = {'iterator_type': self.iterator_type,
+                              'nv_locations': np.array(points).tolist(),
+                              'point_order': np.array(point_order).tolist(),
+                              'completed': [],
+                              'loop_index': -1,
+                              'shift': [x_shift, y_shift],
+                              'set_point': None,
+                              'drift_estimator': None,
+                              # settings of the subscripts that take the data of the completed points, for reference
+                              # only, resume keeps the current settings
+                              'subscript_settings': {name: deepcopy(dict(script.settings))
+                                                     for name, script in self.scripts.items()},
+                              'saved_folders': {}}
+            else:
+                point_order = np.array(checkpoint['point_order'])
+                self.data['point_order'] = point_order
+                [x_shift, y_shift] = checkpoint['shift']
+                # only the parameter that is set for each point is restored, other settings of the subscripts (e.g.
+                # the tags) are kept as they are now
+                if checkpoint.get('set_point') is not None:
+                    set_point.update(checkpoint['set_point'])
+                self.log('resuming from checkpoint, {:d} of {:d} points completed'.format(len(checkpoint['completed']), N_points))
+
+            # state of the iteration used to estimate the progress
+            self._point_iteration = {'pending_loops': [loop_index for loop_index, i in enumerate(point_order)
+                                                       if i not in checkpoint['completed']],
+                                     'position': 0,  # position in pending_loops
+                                     'script_names': sorted_script_names[1:],
+                                     'finished_scripts': []}  # scripts finished in the current loop
+
+            drift_model = self.settings['drift_model']
+            drift_estimator = DriftEstimator(measurement_noise=drift_model['measurement_noise'],
+                                             process_noise=drift_model['process_noise'])
+            if checkpoint.get('drift_estimator') is not None:
+                drift_estimator.set_state(checkpoint['drift_estimator'])
+
+            for loop_index, i in enumerate(point_order):
+                pt = points[i]
+
+                if i in checkpoint['completed']:
+                    continue
+                saved_folders = {}
+                self._point_iteration['finished_scripts'] = []
+
+                if drift_model['on/off']:
+                    # feed-forward the drift predicted from the previous correlations
+                    predicted_shift, shift_uncertainty = drift_estimator.predict(time.time())
+                    if predicted_shift is not None:
+                        [x_shift, y_shift] = predicted_shift
 
                 # account for displacements found by correlation
                 shifted_pt[0] = pt[0] + x_shift
@@ -210,7 +288,7 @@ class ScriptIteratorB26(ScriptIterator):
 
                 print(('NV num: {:d}, shifted_pt: {:.3e}, {:.3e}', i, shifted_pt[0], shifted_pt[1]))
 
-                self.iterator_progress = 1. * i / N_points
+                self.iterator_progress = 1. * loop_index / N_points
 
                 set_point.update({'x': shifted_pt[0], 'y': shifted_pt[1]})
                 self.log('found NV {:03d} near x = {:0.3e}, y = {:0.3e}'.format(i, shifted_pt[0], shifted_pt[1]))
@@ -218,30 +296,131 @@ class ScriptIteratorB26(ScriptIterator):
                 for script_name in sorted_script_names[1:]:
                     if self._abort:
                         break
-                    j = i if self.settings['run_all_first'] else (i+1)
+                    j = loop_index if self.settings['run_all_first'] else (loop_index+1)
                     if self.settings['script_execution_freq'][script_name] == 0 \
                             or not (j % self.settings['script_execution_freq'][script_name] == 0):
                         continue
+                    if script_name == 'correlate_iter' and drift_model['on/off'] \
+                            and shift_uncertainty <= drift_model['max_uncertainty']:
+                        self.log('skipping correlate_iter, predicted shift uncertainty {:0.2e} V'.format(shift_uncertainty))
+                        continue
                     self.log('starting {:s}'.format(script_name))
                     tag = self.scripts[script_name].settings['tag']
                     tmp = tag + '_pt_{' + ':0{:d}'.format(len(str(N_points))) + '}'
                     self.scripts[script_name].settings['tag'] = tmp.format(i)
                     self.scripts[script_name].run()
+                    saved_folders[script_name] = self.scripts[script_name].filename()
                     self.scripts[script_name].settings['tag'] = tag
+                    self._point_iteration['finished_scripts'].append(script_name)
                     #after correlation script runs, update new shift value
                     if script_name == 'correlate_iter':
                         [x_shift, y_shift] = self.scripts['correlate_iter'].data['shift']
+                        drift_estimator.update(time.time(), [x_shift, y_shift])
                         shifted_pt[0] = pt[0] + x_shift
                         shifted_pt[1] = pt[1] + y_shift
                         set_point.update({'x': shifted_pt[0], 'y': shifted_pt[1]})
 
                         print(('NV num: {:d}, shifted_pt: {:.3e}, {:.3e}', i, shifted_pt[0], shifted_pt[1]))
 
+                if self._abort:
+                    break
+
+                # this point is completed once its data is on disk, otherwise a resume after a crash would skip a point
+                # whose data was still waiting to be written in the background
+                point_saved = True
+                if self.settings['checkpoint']['on/off']:
+                    for script_name in self._point_iteration['finished_scripts']:
+                        if isinstance(self.scripts[script_name], BackgroundSavingScript):
+                            try:
+                                self.scripts[script_name].wait_for_saves()
+                            except IOError as e:
+                                self.log('NV {:03d} is not marked as completed: {:s}'.format(i, str(e)))
+                                point_saved = False
+
+                if point_saved:
+                    checkpoint['completed'].append(int(i))
+                    checkpoint['loop_index'] = loop_index
+                    checkpoint['saved_folders'][str(i)] = saved_folders
+                checkpoint['shift'] = [float(x_shift), float(y_shift)]
+                checkpoint['set_point'] = {'x': float(set_point['x']), 'y': float(set_point['y'])}
+                checkpoint['drift_estimator'] = drift_estimator.get_state()
+                if self.settings['checkpoint']['on/off']:
+                    self._save_checkpoint(checkpoint)
+
+                self._point_iteration['position'] += 1
+                self.progress = self._estimate_progress()
+                self.updateProgress.emit(int(self.progress))
 
         else:
             super(ScriptIteratorB26, self)._function()
 
 
+    def _get_checkpoint_filename(self):
+        """
+        Returns: path of the checkpoint file of this run
+        """
+        if self.settings['checkpoint']['filename']:
+            return self.settings['checkpoint']['filename']
+        return self.filename('_checkpoint.json')
+
+    def _find_checkpoint_filename(self):
+        """
+        Returns: path of the checkpoint file to resume from, the latest checkpoint of a previous run with the same tag
+        if no checkpoint filename is set, None if there is none
+        """
+        if self.settings['checkpoint']['filename']:
+            return self.settings['checkpoint']['filename']
+        # the data folders of the runs start with the start time, so the latest run comes last
+        path = os.path.dirname(self.filename())
+        filenames = sorted(glob.glob(os.path.join(path, '*_{:s}'.format(self.settings['tag']),
+                                                  '*_{:s}_checkpoint.json'.format(self.settings['tag']))))
+        return filenames[-1] if filenames else None
+
+    def _save_checkpoint(self, checkpoint):
+        """
+        writes the checkpoint to the checkpoint file, the previous checkpoint is only replaced once the new one is
+        completely written
+        Args:
+            checkpoint: dictionary with the state of the iteration
+        """
+        filename = self._get_checkpoint_filename()
+        try:
+            if os.path.dirname(filename) and not os.path.exists(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename + '.tmp', 'w') as outfile:
+                json.dump(checkpoint, outfile, indent=4,
+                          default=lambda value: value.tolist() if hasattr(value, 'tolist') else str(value))
+            os.replace(filename + '.tmp', filename)
+        except (IOError, OSError, TypeError, ValueError) as e:
+            self.log('failed to write checkpoint {:s}: {:s}'.format(filename, str(e)))
+
+    def _load_checkpoint(self, points):
+        """
+        loads the checkpoint file
+        Args:
+            points: the points of the current iteration, the checkpoint is only used if it was written for the same points
+
+        Returns: the checkpoint as a dictionary or None if there is no matching checkpoint
+        """
+        filename = self._find_checkpoint_filename()
+        if filename is None or not os.path.exists(filename):
+            self.log('no checkpoint found, starting from the first point')
+            return None
+        try:
+            with open(filename, 'r') as infile:
+                checkpoint = json.load(infile)
+        except (IOError, OSError, ValueError) as e:
+            self.log('failed to read checkpoint {:s}: {:s}'.format(filename, str(e)))
+            return None
+
+        saved_points, points = np.array(checkpoint['nv_locations']).reshape(-1, 2), np.array(points).reshape(-1, 2)
+        if checkpoint.get('iterator_type') != self.iterator_type or saved_points.shape != points.shape \
+                or not np.allclose(saved_points, points):
+            self.log('checkpoint {:s} belongs to a different set of points, starting from the first point'.format(filename))
+            return None
+
+        return checkpoint
+
     def to_dict(self):
         """
         Returns: itself as a dictionary
@@ -261,15 +440,8 @@ class ScriptIteratorB26(ScriptIterator):
         """
 
         # ==== get number of iterations and loop index ======================
-        if self.iterator_type == 'iter nvs':
-            progress = 50 #todo implement estimate progress for iter nvs
-        elif self.iterator_type == 'iter points':
-
-
-            N = self.scripts['select_points'].settings['Nx']* self.scripts['select_points'].settings['Ny']
-            loop_index = self.loop_index
-
-            progress = 50 #todo implement estimate progress for iter points
+        if self.iterator_type in ('iter nvs', 'iter points'):
+            progress = self._estimate_point_iteration_progress()
         elif self.iterator_type == 'test':
             progress = 50
 
@@ -277,4 +449,67 @@ class ScriptIteratorB26(ScriptIterator):
             # if can't estimate the remaining time fall back to parent class method
             progress = super(ScriptIteratorB26, self)._estimate_progress()
 
-        return progress
\ No newline at end of file
+        return progress
+
+    def _estimate_point_iteration_progress(self):
+        """
+        estimates the progress of iter nvs and iter points from the remaining time, which is calculated from the number
+        of remaining executions of each subscript and its average duration in the previous loops. Because the progress is
+        proportional to the elapsed time, the remaining time of the iterator follows from the progress.
+
+        Before any subscript has finished, the position in the iteration and the progress of the current subscript are used.
+
+        :return: current progress in percent
+        """
+        iteration = getattr(self, '_point_iteration', None)
+        if iteration is None or len(iteration['pending_loops']) == 0:
+            return 0
+
+        pending_loops = iteration['pending_loops']
+        position = min(iteration['position'], len(pending_loops) - 1)
+        current_subscript = self._current_subscript_stage['current_subscript']
+        if current_subscript is not None and (not current_subscript.is_running
+                                              or current_subscript.name not in iteration['script_names']):
+            current_subscript = None
+
+        durations = {name: self._current_subscript_stage['subscript_exec_duration'][name].total_seconds()
+                     for name in iteration['script_names']
+                     if name in self._current_subscript_stage['subscript_exec_duration']}
+        known_durations = [duration for duration in durations.values() if duration > 0]
+
+        if len(known_durations) == 0:
+            # no duration model yet
+            num_scripts = max(len(iteration['script_names']), 1)
+            loop_progress = len(iteration['finished_scripts']) / num_scripts
+            if current_subscript is not None:
+                loop_progress += 0.01 * current_subscript.progress / num_scripts
+            return 100. * (position + min(loop_progress, 1.)) / len(pending_loops)
+
+        remaining_time = 0.
+        for name in iteration['script_names']:
+            frequency = self.settings['script_execution_freq'][name]
+            if frequency == 0:
+                continue
+            # scripts that have not finished yet are assumed to take as long as the average of the others
+            duration = durations.get(name, 0) or np.mean(known_durations)
+
+            # number of remaining executions in the remaining loops and the current loop
+            j = np.array(pending_loops[position:]) + (0 if self.settings['run_all_first'] else 1)
+            executions = np.sum(j % frequency == 0)
+            if j[0] % frequency == 0 and (name in iteration['finished_scripts']
+                                          or (current_subscript is not None and name == current_subscript.name)):
+                executions -= 1
+            remaining_time += executions * duration
+
+            if current_subscript is not None and name == current_subscript.name:
+                elapsed_time = (datetime.datetime.now() - current_subscript.start_time).total_seconds()
+                if durations.get(name, 0) > 0:
+                    remaining_time += max(duration - elapsed_time, 0)
+                else:
+                    remaining_time += current_subscript.remaining_time.total_seconds()
+
+        elapsed_time = (datetime.datetime.now() - self.start_time).total_seconds()
+        if elapsed_time + remaining_time <= 0:
+            return 0
+
+        return 100. * elapsed_time / (elapsed_time + remaining_time)
@@ -0,0 +1,120 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from b26_toolkit.core.hdf5_storage import load_data
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.b26_toolkit', 'data_cache')
+
+# upper limit for the number of processes of load_folders, each process has to import the toolkit (and with it PyQt)
+# again on Windows, which takes longer than loading a few folders
+MAX_WORKERS = 4
+
+
+def get_folder_signature(folder):
+    """
+    Returns: name, modification time and size of each file in the folder and its raw_data subfolder, which changes when
+    data files are added, removed or rewritten in place; None if the folder doesn't exist
+    """
+    if not os.path.isdir(folder):
+        return None
+    signature = []
+    for path in (folder, os.path.join(folder, 'raw_data')):
+        if os.path.isdir(path):
+            for entry in os.scandir(path):
+                if entry.is_file():
+                    stat = entry.stat()
+                    signature.append((os.path.relpath(entry.path, folder), stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+def _get_cache_filename(folder, cache_folder):
+    """
+    Returns: the file in cache_folder that holds the data of folder
+    """
+    key = hashlib.sha1(os.path.normpath(os.path.abspath(folder)).encode('utf-8')).hexdigest()
+    return os.path.join(cache_folder, key + '.pkl')
+
+
+def load_data_cached(folder, cache_folder=DEFAULT_CACHE_FOLDER):
+    """
+    loads the data in folder like Script.load_data, but keeps a copy of the parsed data in cache_folder which is used
+    as long as the folder has not been modified
+    Args:
+        folder: path to folder saved by a script
+        cache_folder: folder for the cache files, if None the cache is not used
+
+    Returns: dictionary with the data
+
+    """
+    if cache_folder is None:
+        return load_data(folder)
+
+    signature = get_folder_signature(folder)
+    cache_filename = _get_cache_filename(folder, cache_folder)
+
+    if signature is not None and os.path.exists(cache_filename):
+        try:
+            with open(cache_filename, 'rb') as infile:
+                cached_signature, data = pickle.load(infile)
+            if cached_signature == signature:
+                return data
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    data = load_data(folder)
+
+    if data is not None and signature is not None:
+        try:
+            if not os.path.exists(cache_folder):
+                os.makedirs(cache_folder)
+            # write to a temporary file such that parallel readers never see a partial file
+            with open(cache_filename + '.{:d}.tmp'.format(os.getpid()), 'wb') as outfile:
+                pickle.dump((signature, data), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(cache_filename + '.{:d}.tmp'.format(os.getpid()), cache_filename)
+        except (IOError, OSError) as e:
+            print('failed to cache data of {:s}: {:s}'.format(folder, str(e)))
+
+    return data
+
+
+def load_folders(folders, cache_folder=DEFAULT_CACHE_FOLDER, max_workers=None):
+    """
+    loads the data of many folders in parallel processes, using the cache of load_data_cached
+    Args:
+        folders: list of paths to folders saved by scripts
+        cache_folder: folder for the cache files, if None the cache is not used
+        max_workers: number of processes, if None the number of processors but at most MAX_WORKERS; with 1 the folders
+            are loaded in this process
+
+    Returns: list with the data dictionaries in the same order as folders
+
+    """
+    folders = list(folders)
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, MAX_WORKERS)
+    max_workers = min(max_workers, len(folders))
+    if max_workers <= 1 or len(folders) < 2:
+        return [load_data_cached(folder, cache_folder) for folder in folders]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(load_data_cached, folders, [cache_folder] * len(folders)))
@@ -1,4 +1,5 @@
 import glob
+import hashlib
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -10,6 +11,8 @@ import os
 
 from pylabcontrol.core.helper_functions import datetime_from_str
 from pylabcontrol.core.script import Script
+from b26_toolkit.core.hdf5_storage import load_data
+from b26_toolkit.data_analysis.cached_loading import get_folder_signature
 
 freq_to_mag = 1. / (2 * 2.8e6)
 V_to_dist = 60 # convert galvo voltages to distances 1 V is about 60um
@@ -37,7 +40,7 @@ def return_times(f, with_power_sweep=False):
     time = float(time[0]) + float(time[1]) / 60 + float(time[2]) / 3600 + float(day) * 24
     return time
 
-def get_freqs_and_data(ESR_FOLDER, plot_with_norm, esr_fixed=False, get_times=False, get_freqs=False):
+def get_freqs_and_data(ESR_FOLDER, plot_with_norm, esr_fixed=False, get_times=False, get_freqs=False, catalog=None):
     '''
     Get the frequencies of the ESR sweep as well as ESR contrast.
 
@@ -51,14 +54,19 @@ def get_freqs_and_data(ESR_FOLDER, plot_with_norm, esr_fixed=False, get_times=Fa
 
     get_freqs: record and return the piezo frequency drive of each ESR experiment (see OneNotes from early Dec. 2018)
 
+    catalog: (optional) MeasurementCatalog that contains ESR_FOLDER, used to find the ESR subfolders instead of globbing
+
     '''
     data_esr = []
     times = []
     counter = 0  # use a counter to figure out the number of ESR points actually taken, to trunctate the real space coordinate to
     freqs = []
     paths = []
-    paths = glob.glob('{:s}/data_subscripts/*esr*'.format(ESR_FOLDER))
-    paths += glob.glob('{:s}/data_subscripts/*/data_subscripts/*esr*/'.format(ESR_FOLDER))
+    if catalog is None:
+        paths = glob.glob('{:s}/data_subscripts/*esr*'.format(ESR_FOLDER))
+        paths += glob.glob('{:s}/data_subscripts/*/data_subscripts/*esr*/'.format(ESR_FOLDER))
+    else:
+        paths = catalog.find(within=ESR_FOLDER, tag='*esr*')
 
     # if plot_with_norm:
     #     for f in sorted(paths):
@@ -80,19 +88,11 @@ def get_freqs_and_data(ESR_FOLDER, plot_with_norm, esr_fixed=False, get_times=Fa
     #             freqs.append(float(f[-9:]))
 
     for f in sorted(paths):
-        data = Script.load_data(f)
-        if data is None or 'esr_data' not in data: # not an ESR folder (e.g., find_nv instead)
+        data = load_data(f)
+        row = _get_esr_row(data, plot_with_norm, esr_fixed)
+        if row is None: # not an ESR folder (e.g., find_nv instead)
             continue
-        if plot_with_norm and not esr_fixed:
-            full_data = np.divide(data['esr_data'], data['full_laser_data'])
-            data_esr.append(np.mean(full_data, axis=0))
-
-        elif plot_with_norm and esr_fixed:
-            full_data = np.divide(data['esr_data'], data['laser_data'])
-            data_esr.append(np.mean(full_data, axis=0))
-
-        elif not plot_with_norm:
-            data_esr.append(data['data'])
+        data_esr.append(row)
 
         counter = counter + 1
 
@@ -113,6 +113,254 @@ def get_freqs_and_data(ESR_FOLDER, plot_with_norm, esr_fixed=False, get_times=Fa
     elif get_freqs and get_times:
         return f, data_esr, counter, times, freqs
 
+def _get_esr_row(data, plot_with_norm, esr_fixed):
+    """
+    returns the ESR spectrum of a single ESR folder as in get_freqs_and_data, or None if the data is not ESR data
+    """
+    if data is None or 'esr_data' not in data:  # not an ESR folder (e.g., find_nv instead)
+        return None
+    if plot_with_norm and not esr_fixed:
+        return np.mean(np.divide(data['esr_data'], data['full_laser_data']), axis=0)
+    elif plot_with_norm and esr_fixed:
+        return np.mean(np.divide(data['esr_data'], data['laser_data']), axis=0)
+    else:
+        return np.asarray(data['data'])
+
+def _find_esr_folders(ESR_FOLDER, catalog=None):
+    """
+    returns the ESR subfolders of ESR_FOLDER in the order of get_freqs_and_data
+    """
+    if catalog is None:
+        paths = glob.glob('{:s}/data_subscripts/*esr*'.format(ESR_FOLDER))
+        paths += glob.glob('{:s}/data_subscripts/*/data_subscripts/*esr*/'.format(ESR_FOLDER))
+    else:
+        paths = catalog.find(within=ESR_FOLDER, tag='*esr*')
+    return sorted(paths)
+
+def _get_sources(paths):
+    """
+    returns a DataFrame with the folders of a stack and a hash of their files (name, modification time and size), which
+    changes when a folder is added, removed or its data is rewritten
+    """
+    return pd.DataFrame({'folder': paths,
+                         'signature': [hashlib.sha1(repr(get_folder_signature(path)).encode('utf-8')).hexdigest()
+                                       for path in paths]},
+                        columns=['folder', 'signature'])
+
+def _is_stack_up_to_date(stack_folder, sources):
+    """
+    returns True if the stack in stack_folder has been built from sources
+    """
+    if not all(os.path.exists(os.path.join(stack_folder, name)) for name in ['metadata.csv', 'sources.csv']):
+        return False
+    stack_sources = pd.read_csv(os.path.join(stack_folder, 'sources.csv'))
+    return stack_sources['folder'].tolist() == sources['folder'].tolist() and \
+           stack_sources['signature'].tolist() == sources['signature'].tolist()
+
+def build_esr_stack(ESR_FOLDER, stack_folder=None, plot_with_norm=False, esr_fixed=False, catalog=None, overwrite=False):
+    """
+    Converts the ESR subfolders of ESR_FOLDER into a stack on disk, which can be read lazily with load_esr_stack. The
+    folders are loaded one at a time, such that the stack can be larger than the available memory.
+
+    The stack folder contains
+        data.npy: the ESR spectra, one row per ESR folder (same order as get_freqs_and_data). Spectra with fewer
+            frequencies than the longest one (e.g. from ESR_Adaptive) are padded with NaN
+        frequency.npy: the frequency axis, 1D if all spectra share the same frequencies, otherwise the frequencies of
+            each spectrum in the corresponding row, padded with NaN
+        metadata.csv: folder, timestamp, tag, mean and number of frequencies of each row
+        sources.csv: the ESR subfolders and a hash of their files, used to detect when the stack is outdated
+
+    Args:
+        ESR_FOLDER: folder with ESR data in it
+        stack_folder: target folder, default is ESR_FOLDER/esr_stack
+        plot_with_norm: normalize to the photodiode signal (see get_freqs_and_data)
+        esr_fixed: name of the laser data (see get_freqs_and_data)
+        catalog: (optional) MeasurementCatalog that contains ESR_FOLDER
+        overwrite: if False the stack is only built again if ESR subfolders have been added, removed or modified since
+            it was built
+
+    Returns: stack_folder
+
+    """
+    if stack_folder is None:
+        stack_folder = os.path.join(ESR_FOLDER, 'esr_stack')
+
+    paths = _find_esr_folders(ESR_FOLDER, catalog)
+    sources = _get_sources(paths)
+    if not overwrite and _is_stack_up_to_date(stack_folder, sources):
+        return stack_folder
+    if not os.path.exists(stack_folder):
+        os.makedirs(stack_folder)
+
+    # the spectra are appended to temporary files, since the width of the stack is only known once all folders are read
+    data_filename = os.path.join(stack_folder, 'data.tmp')
+    frequency_filename = os.path.join(stack_folder, 'frequency.tmp')
+    metadata = []
+    with open(data_filename, 'wb') as data_file, open(frequency_filename, 'wb') as frequency_file:
+        for f in paths:
+            data = load_data(f)
+            row = _get_esr_row(data, plot_with_norm, esr_fixed)
+            if row is None:
+                continue
+            frequency = np.asarray(data['frequency'], dtype=np.float64).flatten()
+            row = np.asarray(row, dtype=np.float64).flatten()
+            if len(row) != len(frequency):
+                print('skipping {:s}: {:d} values for {:d} frequencies'.format(f, len(row), len(frequency)))
+                continue
+
+            row.tofile(data_file)
+            frequency.tofile(frequency_file)
+
+            folder_name = os.path.basename(os.path.normpath(f))
+            metadata.append({'folder': f, 'timestamp': datetime_from_str(folder_name[0:15]),
+                             'tag': folder_name[16:], 'mean': np.mean(row), 'length': len(row)})
+
+    try:
+        if len(metadata) == 0:
+            print('no ESR data found in {:s}'.format(ESR_FOLDER))
+            return None
+
+        lengths = np.array([m['length'] for m in metadata])
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        rows = np.memmap(data_filename, dtype=np.float64, mode='r')
+        frequencies = np.memmap(frequency_filename, dtype=np.float64, mode='r')
+
+        data_stack = np.lib.format.open_memmap(os.path.join(stack_folder, 'data.npy'), mode='w+',
+                                               dtype=np.float64, shape=(len(metadata), int(lengths.max())))
+        for index, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+            data_stack[index, 0:stop - start] = rows[start:stop]
+            data_stack[index, stop - start:] = np.nan
+        data_stack.flush()
+
+        common_frequency = np.array(frequencies[0:lengths[0]])
+        if all(np.array_equal(frequencies[start:stop], common_frequency) for start, stop in zip(offsets[:-1], offsets[1:])):
+            np.save(os.path.join(stack_folder, 'frequency.npy'), common_frequency)
+        else:
+            # frequencies differ between the spectra, so we store them for each row
+            frequency_stack = np.lib.format.open_memmap(os.path.join(stack_folder, 'frequency.npy'), mode='w+',
+                                                        dtype=np.float64, shape=data_stack.shape)
+            for index, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+                frequency_stack[index, 0:stop - start] = frequencies[start:stop]
+                frequency_stack[index, stop - start:] = np.nan
+            frequency_stack.flush()
+            del frequency_stack
+        # the memory maps have to be closed before the temporary files can be removed on Windows
+        del data_stack, rows, frequencies
+    finally:
+        os.remove(data_filename)
+        os.remove(frequency_filename)
+
+    pd.DataFrame.from_records(metadata).to_csv(os.path.join(stack_folder, 'metadata.csv'), index=False)
+    sources.to_csv(os.path.join(stack_folder, 'sources.csv'), index=False)
+
+    return stack_folder
+
+def load_esr_stack(stack_folder):
+    """
+    opens a stack built with build_esr_stack without reading the data into memory
+    Args:
+        stack_folder: folder with the stack
+
+    Returns:
+        frequency: frequency axis, 1D array or memory-mapped array with the frequencies of each spectrum in its row
+        data: read-only memory-mapped array with one spectrum per row, padded with NaN
+        metadata: pandas DataFrame with folder, timestamp, tag, mean and number of frequencies of each row
+
+    """
+    metadata = pd.read_csv(os.path.join(stack_folder, 'metadata.csv'), parse_dates=['timestamp'])
+    data = np.load(os.path.join(stack_folder, 'data.npy'), mmap_mode='r')
+    frequency = np.load(os.path.join(stack_folder, 'frequency.npy'), mmap_mode='r')
+
+    return frequency, data, metadata
+
+def get_esr_stack_rows(stack_folder, rows=slice(None), normalize=True):
+    """
+    reads a selection of spectra from a stack, only the selected rows are read from disk
+    Args:
+        stack_folder: folder with the stack
+        rows: slice, index array or boolean mask of the rows
+        normalize: divide each spectrum by its mean to filter out slow laser power drifts
+
+    Returns: frequency (of the selected rows if they differ), spectra, metadata of the selected rows
+
+    """
+    frequency, data, metadata = load_esr_stack(stack_folder)
+    index = np.arange(len(metadata))[rows]
+
+    spectra = np.array(data[index])
+    if normalize:
+        spectra /= metadata['mean'].values[index, np.newaxis]
+    if frequency.ndim == 2:
+        frequency = np.array(frequency[index])
+
+    return frequency, spectra, metadata.iloc[index]
+
+def resample_esr_rows(frequency, spectra, num_points=None):
+    """
+    interpolates spectra with different frequencies onto a common frequency axis, e.g. to plot them in a 2D plot
+    Args:
+        frequency: frequencies of each spectrum, one row per spectrum, padded with NaN
+        spectra: spectra, one row per spectrum, padded with NaN
+        num_points: number of points of the common axis, default is the width of frequency
+
+    Returns: common frequency axis spanning all spectra, spectra on that axis (NaN outside of the range of a spectrum)
+
+    """
+    if num_points is None:
+        num_points = frequency.shape[1]
+    common_frequency = np.linspace(np.nanmin(frequency), np.nanmax(frequency), num_points)
+    resampled = np.full((len(spectra), num_points), np.nan)
+    for index, (f, spectrum) in enumerate(zip(frequency, spectra)):
+        valid = ~np.isnan(f)
+        order = np.argsort(f[valid])
+        f, spectrum = f[valid][order], spectrum[valid][order]
+        if len(f) == 0:
+            continue
+        inside = (common_frequency >= f[0]) & (common_frequency <= f[-1])
+        resampled[index, inside] = np.interp(common_frequency[inside], f, spectrum)
+    return common_frequency, resampled
+
+def plot_esr_stack(stack_folder, y_axis='index', rows=slice(None), max_rows=1000, normalize=True):
+    """
+    plots the spectra of a stack in a 2D plot, reading at most max_rows spectra from disk. Spectra with different
+    frequencies are interpolated onto a common frequency axis (see resample_esr_rows)
+    Args:
+        stack_folder: folder with the stack, see build_esr_stack
+        y_axis: 'index' or 'time' (hours since the first spectrum)
+        rows: slice, index array or boolean mask of the rows to plot
+        max_rows: if more rows are selected, only every n-th row is plotted
+        normalize: divide each spectrum by its mean to filter out slow laser power drifts
+
+    Returns: the figure object of the 2D plot
+
+    """
+    _, _, metadata = load_esr_stack(stack_folder)
+    index = np.arange(len(metadata))[rows]
+    index = index[::int(np.ceil(len(index) / float(max_rows)))] if len(index) > max_rows else index
+
+    f, data_esr, metadata = get_esr_stack_rows(stack_folder, index, normalize)
+    if f.ndim == 2:
+        # pcolormesh needs a common frequency axis
+        f, data_esr = resample_esr_rows(f, data_esr)
+
+    if y_axis == 'time':
+        y = (metadata['timestamp'] - metadata['timestamp'].iloc[0]).dt.total_seconds().values / 3600.
+        y_label = 'time (hrs)'
+    else:
+        y = index
+        y_label = 'ESR index'
+
+    plt.figure()
+    fig = plt.pcolormesh(f, y, np.ma.masked_invalid(data_esr))
+    plt.colorbar()
+    plt.xlim(min(f), max(f))
+    plt.xlabel('frequency (Hz)')
+    plt.ylabel(y_label)
+    plt.title('ESR contrast')
+    plt.show()
+
+    return fig
+
 def get_pts(PTS_FOLDER, counter, flip = False):
     '''
     Get the points in real space of the scan. V_to_dist is the conversion factor from galvo voltage to a real distance
@@ -120,7 +368,7 @@ def get_pts(PTS_FOLDER, counter, flip = False):
     flip: allows you to reverse the direction of the plot(e.g. towards or away from the iron/bead)
 
     '''
-    data = Script.load_data(PTS_FOLDER)
+    data = load_data(PTS_FOLDER)
     r = []
     for pt in data['nv_locations']:
         r.append( np.sqrt((pt[0]-data['nv_locations'][0][0])**2+(pt[1]-data['nv_locations'][0][1])**2))
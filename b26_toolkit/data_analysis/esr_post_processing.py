@@ -26,6 +26,7 @@ import datetime
 
 
 from pylabcontrol.core import Script
+from b26_toolkit.core.hdf5_storage import load_data
 from b26_toolkit.data_processing.esr_signal_processing import fit_esr, find_nv_peaks
 from b26_toolkit.plotting.plots_1d import plot_esr
 from pylabcontrol.core.helper_functions import datetime_from_str
@@ -35,8 +36,15 @@ from b26_toolkit.data_processing.esr_signal_processing import get_lorentzian_fit
 
 from b26_toolkit.scripts.find_nv import FindNV
 
-from win32com.client import Dispatch
-import pythoncom
+from b26_toolkit.data_analysis.cached_loading import load_folders, DEFAULT_CACHE_FOLDER
+
+try:
+    # only needed to create shortcuts on windows
+    from win32com.client import Dispatch
+    import pythoncom
+    _win32com_detected = True
+except ImportError:
+    _win32com_detected = False
 
 # stuff for manual correction
 import queue
@@ -125,13 +133,15 @@ def create_shortcut(src_path, dst_path):
         src_path: location to create shortcut
         dst_path: target of shortcut
     """
+    if not _win32com_detected:
+        raise ImportError('creating shortcuts requires pywin32 (win32com), which is only available on windows')
     pythoncom.CoInitialize()
     shell = Dispatch("WScript.Shell")
     shortcut = shell.CreateShortCut(src_path)
     shortcut.Targetpath = dst_path
     shortcut.save()
 
-def autofit_esrs(folder):
+def autofit_esrs(folder, catalog=None, cache_folder=DEFAULT_CACHE_FOLDER, max_workers=None):
     """
 
     fits the esr data, plots them and asks the user for confirmation, the fit data is saved to the folder target_folder with the same structure as folders
@@ -139,28 +149,42 @@ def autofit_esrs(folder):
     Args:
         folders: source folder with esr data, this folder shoudl contain a subfolder data_subscripts which contains subfolders *esr* with the esr data
         target_folder: target folder where the output data is saved in form of a .csv file
+        catalog (optional): MeasurementCatalog that contains folder, used to find the subfolders instead of globbing
+        cache_folder (optional): folder where the loaded data is cached, None to disable the cache
+        max_workers (optional): number of processes that load the data, default is the number of processors (at most
+            cached_loading.MAX_WORKERS)
 
     Returns: fitdataset as a pandas array
 
     """
     # loop over all the folders in the data_subscripts subfolder and retrieve fitparameters and position of NV
-    esr_folders = glob.glob(os.path.join(folder, './data_subscripts/*esr*'))
+    if catalog is None:
+        esr_folders = glob.glob(os.path.join(folder, './data_subscripts/*esr*'))
+    else:
+        esr_folders = catalog.find(parent=os.path.join(folder, 'data_subscripts'), tag='*esr*')
 
-    fit_data_set = None
+    if len(esr_folders) == 0:
+        return None
 
     # classify the nvs according to the following categories
     # by default we set this to na (not available) and try to figure it out based on the data and fitquality
     # nv_type = 'na' # split / single / no_peak / no_nv / na
 
-    for i, esr_folder in enumerate(esr_folders):
+    # find the NV index and the matching find_nv folder
+    pt_ids = [int(os.path.basename(os.path.normpath(esr_folder)).split('pt_')[-1]) for esr_folder in esr_folders]
+    if catalog is None:
+        findnv_folders = [sorted(glob.glob(folder + '/data_subscripts/*find_nv*pt_*{:d}'.format(pt_id)))[0] for pt_id in pt_ids]
+    else:
+        findnv_folders = [catalog.find(parent=os.path.join(folder, 'data_subscripts'), tag='*find_nv*', nv_index=pt_id)[0]
+                          for pt_id in pt_ids]
 
-        # find the NV index
-        pt_id = int(os.path.basename(esr_folder).split('pt_')[-1])
+    # load data of all folders at once
+    data_list = load_folders(esr_folders + findnv_folders, cache_folder=cache_folder, max_workers=max_workers)
+    esr_data_list, findnv_data_list = data_list[:len(esr_folders)], data_list[len(esr_folders):]
 
-        findnv_folder =  sorted(glob.glob(folder + '/data_subscripts/*find_nv*pt_*{:d}'.format(pt_id)))[0]
+    fit_data_set = []
+    for pt_id, data, data_pos in zip(pt_ids, esr_data_list, findnv_data_list):
 
-        # load data
-        data = Script.load_data(esr_folder)
         fit_params = fit_esr(data['frequency'], data['data'])
         nv_type = get_nv_type(fit_params)
 
@@ -168,7 +192,6 @@ def autofit_esrs(folder):
         freq_peaks, ampl_peaks = find_nv_peaks(data['frequency'], data['data'])
 
         # get nv positions
-        data_pos = Script.load_data(findnv_folder)
         pos = data_pos['maximum_point']
         pos_init = data_pos['initial_point']
 
@@ -184,15 +207,10 @@ def autofit_esrs(folder):
 
         fit_data_set_single.update({'B-field (gauss)': get_B_field(nv_type, fit_params)})
 
-        # convert to dataframe
-        fit_data_set_single = pd.DataFrame.from_dict({k: [v] for k, v in fit_data_set_single.items()})
-
-        if fit_data_set is None:
-            fit_data_set = pd.DataFrame(fit_data_set_single)
-        else:
-            fit_data_set = fit_data_set.append(fit_data_set_single, ignore_index=True)
+        fit_data_set.append(fit_data_set_single)
 
-    return fit_data_set
+    # convert to dataframe
+    return pd.DataFrame.from_records(fit_data_set)
 
 def manual_correction(folder, target_folder, fit_data_set, nv_type_manual, b_field_manual, queue, current_id_queue, lower_peak_widget, upper_peak_widget, lower_fit_widget, upper_fit_widget):
     """
@@ -274,7 +292,7 @@ def manual_correction(folder, target_folder, fit_data_set, nv_type_manual, b_fie
         for esr_folder in esr_folders:
             print(esr_folder)
             sys.stdout.flush()
-            data = Script.load_data(esr_folder)
+            data = load_data(esr_folder)
             data_array.append(data)
             print('looping')
             sys.stdout.flush()
@@ -282,7 +300,7 @@ def manual_correction(folder, target_folder, fit_data_set, nv_type_manual, b_fie
 
         nv_folders = glob.glob(folder + '\\data_subscripts\\*find_nv*pt_*')
         for nv_folder in nv_folders:
-            data_pos_array.append(Script.load_data(nv_folder))
+            data_pos_array.append(load_data(nv_folder))
 
         while True:
 
@@ -631,7 +649,7 @@ def visualize_magnetic_fields(src_folder, target_folder, manual=True):
                     df.set_value(id, 'B-field (gauss)', df.get_value(id, 'manual_B_field'))
 
     # load the image data
-    select_points_data = Script.load_data(get_select_points(src_folder))
+    select_points_data = load_data(get_select_points(src_folder))
     image_data = select_points_data['image_data']
     #     points_data = select_points_data['nv_locations']
     extent = select_points_data['extent']
@@ -0,0 +1,286 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import glob
+import json
+import os
+import re
+import sqlite3
+
+# folders written by Script.filename: YYMMDD-HH_MM_SS_tag
+FOLDER_NAME = re.compile(r'^(\d{6}-\d{2}_\d{2}_\d{2})_(.*)$')
+# index of the point added to the tag by the ScriptIteratorB26, e.g. esr_pt_012
+NV_INDEX = re.compile(r'_pt_(\d+)$')
+# folders that never contain measurement folders
+SKIPPED_FOLDERS = ('raw_data', 'images')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    timestamp TEXT,
+    tag TEXT,
+    script_class TEXT,
+    nv_index INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    path TEXT,
+    name TEXT,
+    value TEXT,
+    PRIMARY KEY (path, name)
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+CREATE INDEX IF NOT EXISTS folders_tag ON folders (tag);
+CREATE INDEX IF NOT EXISTS settings_name ON settings (name, value);
+"""
+
+
+def _like_prefix(path):
+    """
+    Returns: SQL LIKE pattern (with escape character !) that matches everything below path
+    """
+    return os.path.join(path.replace('!', '!!').replace('%', '!%').replace('_', '!_'), '%')
+
+
+def _flatten_settings(settings, prefix=''):
+    """
+    flattens nested settings into {'group/name': value}
+    """
+    flat = {}
+    for key, value in settings.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten_settings(value, name + '/'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def read_folder_info(path):
+    """
+    reads the information about a measurement folder from its name and the .b26 settings file in it
+    Args:
+        path: measurement folder of the form YYMMDD-HH_MM_SS_tag
+
+    Returns: dictionary with timestamp, tag, nv_index, script_class and settings or None if path is not a measurement
+    folder
+
+    """
+    match = FOLDER_NAME.match(os.path.basename(os.path.normpath(path)))
+    if match is None:
+        return None
+
+    time_string, tag = match.groups()
+    try:
+        timestamp = datetime.datetime.strptime(time_string, '%y%m%d-%H_%M_%S')
+    except ValueError:
+        return None
+
+    nv_index = NV_INDEX.search(tag)
+
+    info = {'timestamp': timestamp.isoformat(),
+            'tag': tag,
+            'nv_index': int(nv_index.group(1)) if nv_index else None,
+            'script_class': None,
+            'settings': {}}
+
+    for b26_file in glob.glob(os.path.join(path, '*.b26')):
+        try:
+            with open(b26_file, 'r') as infile:
+                scripts = json.load(infile).get('scripts', {})
+        except (IOError, OSError, ValueError):
+            continue
+        if len(scripts) > 0:
+            script = list(scripts.values())[0]
+            info['script_class'] = script.get('class')
+            info['settings'] = _flatten_settings(script.get('settings', {}))
+            break
+
+    return info
+
+
+class MeasurementCatalog(object):
+    """
+    SQLite catalog of the measurement folders in one or more data directories.
+
+    The catalog stores the timestamp, tag, script class, NV index (for subscripts of the ScriptIteratorB26) and settings
+    of each folder, so that the analysis can find folders with a query instead of globbing and parsing folder names.
+    update only lists the directories whose modification time changed since the last update (the subdirectories of the
+    others are taken from the catalog) and only reads measurement folders that are new or changed.
+
+    Example:
+        catalog = MeasurementCatalog('Z:\\\\Lab\\\\catalog.db')
+        catalog.update('Z:\\\\Lab\\\\Measurements')
+        esr_folders = catalog.find(parent=os.path.join(folder, 'data_subscripts'), tag='*esr*')
+    """
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename: SQLite database file, created if it doesn't exist
+        """
+        self.filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def update(self, data_directory, verbose=False):
+        """
+        adds new and changed measurement folders in data_directory to the catalog and removes deleted ones
+        Args:
+            data_directory: folder that is searched recursively for measurement folders
+            verbose: if true print additional info to std out
+
+        Returns: number of folders that have been added or updated
+
+        """
+        data_directory = os.path.normpath(os.path.abspath(data_directory))
+        below = (data_directory, _like_prefix(data_directory))
+
+        known = dict(self._connection.execute(
+            "SELECT path, mtime FROM folders WHERE path = ? OR path LIKE ? ESCAPE '!'", below).fetchall())
+
+        # directories listed in previous updates, a directory whose modification time didn't change has the same
+        # subdirectories as back then
+        listed, subdirectories = {}, {}
+        for path, parent, mtime in self._connection.execute(
+                "SELECT path, parent, mtime FROM directories WHERE path = ? OR path LIKE ? ESCAPE '!'", below):
+            listed[path] = mtime
+            subdirectories.setdefault(parent, []).append(path)
+
+        updated = 0
+        found = {}
+        stack = [(data_directory, None)]
+        while stack:
+            path, parent = stack.pop()
+            try:
+                mtime = os.path.getmtime(path)
+                if listed.get(path) == mtime:
+                    children = subdirectories.get(path, [])
+                else:
+                    children = [entry.path for entry in os.scandir(path)
+                                if entry.is_dir(follow_symlinks=False) and entry.name not in SKIPPED_FOLDERS]
+            except OSError:
+                # deleted or not readable
+                continue
+            found[path] = (parent, mtime)
+            stack += [(child, path) for child in children]
+
+            if parent is None or FOLDER_NAME.match(os.path.basename(path)) is None or known.get(path) == mtime:
+                continue
+            info = read_folder_info(path)
+            if info is None:
+                continue
+            self._add_folder(path, parent, mtime, info)
+            updated += 1
+            if verbose:
+                print('cataloged', path)
+
+        deleted = [path for path in known if path not in found]
+        self._connection.executemany('DELETE FROM folders WHERE path = ?', [(path,) for path in deleted])
+        self._connection.executemany('DELETE FROM settings WHERE path = ?', [(path,) for path in deleted])
+        self._connection.executemany('DELETE FROM directories WHERE path = ?',
+                                     [(path,) for path in listed if path not in found])
+        self._connection.executemany('INSERT OR REPLACE INTO directories VALUES (?, ?, ?)',
+                                     [(path, parent, mtime) for path, (parent, mtime) in found.items()
+                                      if listed.get(path) != mtime])
+        self._connection.commit()
+
+        return updated
+
+    def _add_folder(self, path, parent, mtime, info):
+        """
+        writes a folder to the database
+        """
+        self._connection.execute('INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 (path, parent, info['timestamp'], info['tag'], info['script_class'],
+                                  info['nv_index'], mtime))
+        self._connection.execute('DELETE FROM settings WHERE path = ?', (path,))
+        self._connection.executemany('INSERT INTO settings VALUES (?, ?, ?)',
+                                     [(path, name, json.dumps(value)) for name, value in info['settings'].items()])
+
+    def find(self, parent=None, within=None, tag=None, script_class=None, nv_index=None, start=None, end=None,
+             settings=None):
+        """
+        finds measurement folders
+        Args:
+            parent: only folders directly in this folder, e.g. the data_subscripts folder of an iterator
+            within: only folders anywhere below this folder
+            tag: tag of the folder, case sensitive glob pattern (* and ? as wildcards), e.g. '*esr*'
+            script_class: name of the script class, e.g. 'ESR'
+            nv_index: index of the point of the ScriptIteratorB26
+            start: only folders taken at or after this datetime
+            end: only folders taken before this datetime
+            settings: dictionary {'group/name': value} of settings the folder must have
+
+        Returns: list of folders, ordered by time and NV index
+
+        """
+        conditions, parameters = [], []
+        if parent is not None:
+            conditions.append('parent = ?')
+            parameters.append(os.path.normpath(os.path.abspath(parent)))
+        if within is not None:
+            conditions.append("path LIKE ? ESCAPE '!'")
+            parameters.append(_like_prefix(os.path.normpath(os.path.abspath(within))))
+        if tag is not None:
+            conditions.append('tag GLOB ?')
+            parameters.append(tag)
+        if script_class is not None:
+            conditions.append('script_class = ?')
+            parameters.append(script_class)
+        if nv_index is not None:
+            conditions.append('nv_index = ?')
+            parameters.append(int(nv_index))
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            parameters.append(start.isoformat())
+        if end is not None:
+            conditions.append('timestamp < ?')
+            parameters.append(end.isoformat())
+        for name, value in (settings or {}).items():
+            conditions.append('path IN (SELECT path FROM settings WHERE name = ? AND value = ?)')
+            parameters += [name, json.dumps(value)]
+
+        query = 'SELECT path FROM folders'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY timestamp, nv_index, path'
+
+        return [row[0] for row in self._connection.execute(query, parameters)]
+
+    def get_settings(self, path):
+        """
+        Args:
+            path: measurement folder
+
+        Returns: the flattened settings {'group/name': value} of the folder
+
+        """
+        rows = self._connection.execute('SELECT name, value FROM settings WHERE path = ?',
+                                        (os.path.normpath(os.path.abspath(path)),))
+        return {name: json.loads(value) for name, value in rows}
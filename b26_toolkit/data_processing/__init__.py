@@ -19,4 +19,4 @@
 # from .fit_functions import fit_gaussian, fit_lorentzian, lorentzian, gaussian
 
 # from correlate_images import find_image_shift
-from .correlate_images import find_image_shift, correlation, shift_NVs
\ No newline at end of file
+from .correlate_images import find_image_shift, correlation, shift_NVs, ImageCorrelator
\ No newline at end of file
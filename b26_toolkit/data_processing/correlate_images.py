@@ -17,8 +17,9 @@
 """
 
 import numpy as np
-from PIL import Image as im
-from scipy import signal
+from scipy.fftpack import next_fast_len
+from scipy.spatial import cKDTree
+from scipy.optimize import linear_sum_assignment
 import trackpy as tp
 from skimage.filters import sobel
 
@@ -32,58 +33,174 @@ def find_image_shift(reference_image, reference_image_extent, shifted_image, shi
         shifted_image: numpy 2D array of pixel values
         shifted_image_bounds: numpy array with 4 elements containing the voltage bounds of the shifted image
         correlation_padding: Allows the correlation to overlap images beyond their respective edges, filling
-                                outside pixels with value 0.
+                                outside pixels with value 0. If False (default) the correlation is circular, i.e. the
+                                images wrap around at the edges. Before the ImageCorrelator was introduced, False
+                                restricted the correlation to the shifts where the images fully overlap ('valid' mode).
 
     Returns: ordered pair (x_shift, y_shift) of pixel values
 
     """
+    correlator = ImageCorrelator(reference_image, reference_image_extent, correlation_padding=correlation_padding)
+    dx_voltage, dy_voltage, correlation_image, _ = correlator.find_shift(shifted_image, shifted_image_extent)
 
-    # get pixel-to-voltage conversion for each image
-    # print('shifted_image', shifted_image)
-    shifted_img_pix2vol = pixel_to_voltage_conversion_factor(shifted_image.shape, shifted_image_extent)
-    ref_img_pix2vol = pixel_to_voltage_conversion_factor(reference_image.shape, reference_image_extent)
-
-    # subtract average from images for later correlation calculations
-    shifted_image = shifted_image - shifted_image.mean()
-    reference_image = reference_image - reference_image.mean()
+    return dx_voltage, dy_voltage, correlation_image
 
-    # make images commensurate, i.e., match image pixel lengths by scaling shifted_image
-    if shifted_img_pix2vol != ref_img_pix2vol:
+class ImageCorrelator(object):
+    """
+    Finds the shift of new images relative to a fixed baseline image with normalized phase correlation, or with plain
+    cross correlation for the sparse NV images rendered with trackpy, whose spectra are dominated by the shape of the
+    blocks and where the whitening of the phase correlation mostly amplifies noise.
+
+    The (processed) baseline image and its spectrum are calculated once and cached, such that repeated correlations
+    against the same baseline, e.g. when tracking, only require the transform of the new image.
+    The position of the correlation peak is refined to subpixel precision by fitting a parabola through the peak and
+    its neighbours along each axis.
+    """
 
-        # find new size for shifted img
-        scaled_shifted_img_x_size = int(round(shifted_image.shape[0] * (shifted_img_pix2vol[0]/ref_img_pix2vol[0])))
-        scaled_shifted_img_y_size = int(round(shifted_image.shape[1] * (shifted_img_pix2vol[1]/ref_img_pix2vol[1] )))
-        scaled_shifted_img_size = (scaled_shifted_img_x_size, scaled_shifted_img_y_size)
+    def __init__(self, baseline_image, baseline_image_extent, use_trackpy = False, use_edge_detection = False, nv_size = 11,
+                 correlation_padding = True, phase_correlation = None):
+        """
+        Args:
+            baseline_image: original image before shifting
+            baseline_image_extent: extent of that image
+            use_trackpy: if true, correlates 'dummy images' of just NVs (see correlation)
+            use_edge_detection: if true, correlates images of the edges (see correlation)
+            nv_size: only used if use_trackpy is selected, gives the expected NV size in pixels
+            correlation_padding: Allows the correlation to overlap images beyond their respective edges, filling
+                                outside pixels with value 0. If False, the correlation is circular.
+            phase_correlation: if true, the cross power spectrum is normalized to its magnitude (phase correlation),
+                                if false the plain cross correlation is used. None uses the phase correlation unless
+                                use_trackpy is selected.
+        """
+        self.use_trackpy = use_trackpy
+        self.use_edge_detection = use_edge_detection
+        self.nv_size = nv_size
+        self.correlation_padding = correlation_padding
+        self.phase_correlation = not use_trackpy if phase_correlation is None else phase_correlation
+
+        self.baseline_image = baseline_image
+        self.baseline_image_extent = baseline_image_extent
+        self.baseline_processed_image = self.process_image(baseline_image)
+        self._baseline_pix2vol = pixel_to_voltage_conversion_factor(self.baseline_processed_image.shape, baseline_image_extent)
+        self._baseline_spectra = {}  # baseline spectrum for each correlation shape
+
+    def process_image(self, image):
+        """
+        applies the edge detection and / or trackpy filters to image
+        """
+        image = np.array(image, dtype=float)
+        if self.use_edge_detection:
+            image = _create_edge_image(image)
+        if self.use_trackpy:
+            image = _create_nv_image(image, self.nv_size)
+        return image
+
+    def _get_correlation_shape(self, shape):
+        """
+        returns the shape of the correlation image for a new image with the given shape
+        """
+        baseline_shape = self.baseline_processed_image.shape
+        if self.correlation_padding:
+            return tuple(next_fast_len(n + m - 1) for n, m in zip(baseline_shape, shape))
+        else:
+            return tuple(max(n, m) for n, m in zip(baseline_shape, shape))
+
+    def _get_baseline_spectrum(self, correlation_shape):
+        """
+        returns the cached spectrum of the baseline image for the given correlation shape
+        """
+        if correlation_shape not in self._baseline_spectra:
+            baseline = self.baseline_processed_image - self.baseline_processed_image.mean()
+            self._baseline_spectra[correlation_shape] = np.fft.rfft2(baseline, s=correlation_shape)
+        return self._baseline_spectra[correlation_shape]
+
+    def find_shift(self, new_image, new_image_extent):
+        """
+        finds the shift of new_image with respect to the baseline image
+        Args:
+            new_image: final image after shifting
+            new_image_extent: extent of that image
+
+        Returns: the x and y shifts in voltage, the correlation image (zero shift in the center) and the processed new
+        image
+
+        """
+        new_processed_image = self.process_image(new_image)
+
+        # make images commensurate, i.e., match image pixel lengths by scaling the new image
+        new_pix2vol = pixel_to_voltage_conversion_factor(new_processed_image.shape, new_image_extent)
+        shifted_image = new_processed_image
+        if new_pix2vol != self._baseline_pix2vol:
+            scaled_shape = tuple(int(round(n * new / baseline)) for n, new, baseline
+                                 in zip(shifted_image.shape, new_pix2vol, self._baseline_pix2vol))
+            shifted_image = _resize_image(shifted_image, scaled_shape)
+        shifted_image = shifted_image - shifted_image.mean()
+
+        correlation_shape = self._get_correlation_shape(shifted_image.shape)
+        cross_power = self._get_baseline_spectrum(correlation_shape) * np.conj(np.fft.rfft2(shifted_image, s=correlation_shape))
+        if self.phase_correlation:
+            # normalize to get the phase correlation, the small offset avoids dividing by zero for empty frequencies
+            magnitude = np.abs(cross_power)
+            cross_power /= magnitude + 1e-12 * magnitude.max()
+        correlation_image = np.fft.irfft2(cross_power, s=correlation_shape)
+
+        # peak position with subpixel refinement, lags larger than half the image wrap around to negative lags
+        peak = np.unravel_index(np.argmax(correlation_image), correlation_shape)
+        dy_pixel, dx_pixel = [_refine_peak(correlation_image, peak, axis) for axis in range(2)]
+        dy_pixel, dx_pixel = [(lag + n // 2) % n - n // 2 for lag, n in zip((dy_pixel, dx_pixel), correlation_shape)]
+
+        dx_voltage = -1.0 * self._baseline_pix2vol[0] * (dx_pixel) - (np.mean(self.baseline_image_extent[0:2]) - np.mean(new_image_extent[0:2]))
+        dy_voltage = -1.0 * self._baseline_pix2vol[1] * (dy_pixel) - (np.mean(self.baseline_image_extent[2:4]) - np.mean(new_image_extent[2:4]))
+
+        return dx_voltage, dy_voltage, np.fft.fftshift(correlation_image), new_processed_image
+
+def _refine_peak(correlation_image, peak, axis):
+    """
+    refines the position of the maximum of correlation_image along axis by fitting a parabola through the maximum and
+    its (periodic) neighbours
+    Args:
+        correlation_image: 2D array
+        peak: index of the maximum
+        axis: 0 or 1
 
-        # use PIL package to do resizing
-        scaled_shifted_image_PIL = im.fromarray(shifted_image).resize(scaled_shifted_img_size)
-        scaled_shifted_image_pixels = list(scaled_shifted_image_PIL.getdata())
-        scaled_width, scaled_height = scaled_shifted_image_PIL.size
-        shifted_image = np.array([scaled_shifted_image_pixels[i * scaled_width:(i + 1) * scaled_width] for i in range(scaled_height)])
+    Returns: subpixel position of the maximum along axis
 
-    # get correlation function, find max, return it
+    """
+    n = correlation_image.shape[axis]
+    values = []
+    for offset in (-1, 0, 1):
+        index = list(peak)
+        index[axis] = (index[axis] + offset) % n
+        values.append(correlation_image[tuple(index)])
+    left, center, right = values
+
+    curvature = left - 2 * center + right
+    if curvature >= 0:
+        return float(peak[axis])
+    return peak[axis] + 0.5 * (left - right) / curvature
+
+def _resize_image(image, shape):
+    """
+    resizes image to shape with bilinear interpolation
+    Args:
+        image: 2D array
+        shape: shape of the resized image
 
-    #It turns out that signal.correlate2d is extremely, extremely, extremely slow. It's poorly optimized for
-    # if correlation_padding:
-    #     correlation_image = signal.correlate2d(reference_image, shifted_image, mode='full')
-    # else:
-    #     correlation_image = signal.correlate2d(reference_image, shifted_image, mode='valid')
+    Returns: resized image
 
-    #[::-1,::-1] flips second array, since convolution flips the second array relative to correlations so it will be
-    #flipped back
-    if correlation_padding:
-        correlation_image = signal.fftconvolve(reference_image, shifted_image[::-1,::-1], mode='full')
-    else:
-        correlation_image = signal.fftconvolve(reference_image, shifted_image[::-1,::-1], mode='valid')
+    """
+    def interpolation_weights(length, new_length):
+        positions = np.linspace(0, length - 1, new_length)
+        lower = np.floor(positions).astype(int)
+        upper = np.minimum(lower + 1, length - 1)
+        return lower, upper, positions - lower
 
-    dy_pixel, dx_pixel = np.unravel_index(np.argmax(correlation_image), correlation_image.shape) - np.array(correlation_image.shape)/2
+    row_lower, row_upper, row_weights = interpolation_weights(image.shape[0], shape[0])
+    col_lower, col_upper, col_weights = interpolation_weights(image.shape[1], shape[1])
 
-    #convert, including one pixel shift from above processing
-    # dx_voltage = -1.0 * ref_img_pix2vol[0] * (dx_pixel - 1) - (np.mean(reference_image_extent[0:2]) - np.mean(shifted_image_extent[0:2]))
-    # dy_voltage = -1.0 * ref_img_pix2vol[1] * (dy_pixel - 1) - (np.mean(reference_image_extent[2:4]) - np.mean(shifted_image_extent[2:4]))
-    dx_voltage = -1.0 * ref_img_pix2vol[0] * (dx_pixel) - (np.mean(reference_image_extent[0:2]) - np.mean(shifted_image_extent[0:2]))
-    dy_voltage = -1.0 * ref_img_pix2vol[1] * (dy_pixel) - (np.mean(reference_image_extent[2:4]) - np.mean(shifted_image_extent[2:4]))
-    return dx_voltage, dy_voltage, correlation_image
+    # interpolate along the columns, then along the rows
+    image = image[:, col_lower] * (1 - col_weights) + image[:, col_upper] * col_weights
+    return image[row_lower, :] * (1 - row_weights[:, np.newaxis]) + image[row_upper, :] * row_weights[:, np.newaxis]
 
 def pixel_to_voltage_conversion_factor(image_shape, image_extent):
     # COMMENT_ME
@@ -94,17 +211,54 @@ def pixel_to_voltage_conversion_factor(image_shape, image_extent):
     return x_voltage, y_voltage
 
 def _create_nv_image(image, nv_size, created_pt_size = 3):
-    # COMMENT_ME
-    y_len, x_len = image.shape
+    """
+    Creates an image of just the NVs found by trackpy in image, each NV being replaced by a square block of pixels
+    Args:
+        image: image to find NVs in
+        nv_size: expected NV size in pixels (odd integer)
+        created_pt_size: half width of the block of pixels that represents a NV
+
+    Returns: the NV image, same shape as image
+
+    """
     f = tp.locate(image, nv_size)
 
+    return _render_nv_image(image.shape, f.values[:, 0:2], created_pt_size)
+
+def _render_nv_image(shape, nv_locs, created_pt_size = 3):
+    """
+    Paints a square block of pixels with value 10 for each NV location into an empty image of the given shape. All
+    blocks are painted at once by broadcasting the block offsets against the NV locations.
+    Args:
+        shape: shape of the image
+        nv_locs: N x 2 array of NV locations, as returned by trackpy (the second column is used as row index)
+        created_pt_size: half width of the block
+
+    Returns: image with the blocks
+
+    """
+    y_len, x_len = shape
     new_image = np.zeros((y_len, x_len))
-    nv_locs = f.values
-    for pt in nv_locs:
-        for i in range(-created_pt_size, created_pt_size+1):
-            for j in range(-created_pt_size, created_pt_size+1):
-                if pt[1] + j < y_len and pt[1] - j >= 0 and pt[0] + i < x_len and pt[0] - i >= 0:
-                    new_image[pt[1] + j, pt[0] + i] = 10
+    nv_locs = np.asarray(nv_locs, dtype=float).reshape(-1, 2)
+    offsets = np.arange(-created_pt_size, created_pt_size + 1)
+
+    def block_indices(positions, length):
+        """
+        returns the pixel indices of the block along one axis and whether they are painted, for every NV
+        """
+        positions = positions[:, np.newaxis]
+        indices = positions + offsets
+        painted = (indices < length) & (positions - offsets >= 0)
+        return np.trunc(indices).astype(int), painted
+
+    rows, painted_rows = block_indices(nv_locs[:, 1], y_len)
+    cols, painted_cols = block_indices(nv_locs[:, 0], x_len)
+
+    painted = painted_rows[:, :, np.newaxis] & painted_cols[:, np.newaxis, :]
+    rows = np.broadcast_to(rows[:, :, np.newaxis], painted.shape)[painted]
+    cols = np.broadcast_to(cols[:, np.newaxis, :], painted.shape)[painted]
+    new_image[rows, cols] = 10
+
     return new_image
 
 def _create_edge_image(image):
@@ -140,15 +294,9 @@ def correlation(baseline_image, baseline_image_extent, new_image, new_image_exte
     Returns: the x and y shifts in voltage, and the correlation image
 
     '''
-    if use_edge_detection:
-        baseline_image = _create_edge_image(baseline_image)
-        new_image = _create_edge_image(new_image)
-
-    if use_trackpy:
-        baseline_image = _create_nv_image(baseline_image, nv_size)
-        new_image = _create_nv_image(new_image, nv_size)
-
-    dx_voltage, dy_voltage, correlation_image = find_image_shift(baseline_image, baseline_image_extent, new_image, new_image_extent, correlation_padding=True)
+    correlator = ImageCorrelator(baseline_image, baseline_image_extent, use_trackpy=use_trackpy,
+                                 use_edge_detection=use_edge_detection, nv_size=nv_size)
+    dx_voltage, dy_voltage, correlation_image, _ = correlator.find_shift(new_image, new_image_extent)
 
     return dx_voltage, dy_voltage, correlation_image
 
@@ -165,8 +313,78 @@ def shift_NVs(dx_voltage, dy_voltage, nv_pos_list):
     '''
     return [[pos[0]+dx_voltage, pos[1]+dy_voltage] for pos in nv_pos_list]
 
-def pair_NVs(image1, image2, nv_size):
-    f1 = tp.locate(image1, nv_size)
+def pair_nv_locations(nv_locs_1, nv_locs_2, max_distance = np.inf, one_to_one = False):
+    """
+    Pairs two lists of NV locations, e.g. the NVs found in two images of the same area. A KD-tree of the second list
+    is used to find the nearest neighbours, such that large lists can be paired efficiently.
+    Args:
+        nv_locs_1: N x 2 array of NV locations
+        nv_locs_2: M x 2 array of NV locations
+        max_distance: NVs further apart than this are not paired (same units as the locations)
+        one_to_one: if False, each NV in nv_locs_1 is paired with its nearest neighbour in nv_locs_2, such that a NV
+            in nv_locs_2 can be paired multiple times. If True, each NV is paired at most once, and the pairs minimize
+            the total distance (Hungarian assignment)
+
+    Returns:
+        pairs: K x 2 integer array of indices (i, j), meaning nv_locs_1[i] is paired with nv_locs_2[j]
+        unmatched_1: indices of the NVs in nv_locs_1 that are not paired
+        unmatched_2: indices of the NVs in nv_locs_2 that are not paired
+
+    """
+    nv_locs_1 = np.asarray(nv_locs_1, dtype=float).reshape(-1, 2)
+    nv_locs_2 = np.asarray(nv_locs_2, dtype=float).reshape(-1, 2)
+
+    if len(nv_locs_1) == 0 or len(nv_locs_2) == 0:
+        pairs = np.zeros((0, 2), dtype=int)
+    elif one_to_one:
+        # only pairs within max_distance are candidates, all others get a cost that is never chosen over a candidate
+        tree_1, tree_2 = cKDTree(nv_locs_1), cKDTree(nv_locs_2)
+        if np.isfinite(max_distance):
+            distances = tree_1.sparse_distance_matrix(tree_2, max_distance, output_type='ndarray')
+            candidates = np.full((len(nv_locs_1), len(nv_locs_2)), np.inf)
+            candidates[distances['i'], distances['j']] = distances['v']
+        else:
+            candidates = np.sqrt(np.sum(np.square(nv_locs_1[:, np.newaxis, :] - nv_locs_2[np.newaxis, :, :]), axis=2))
+        finite = np.isfinite(candidates)
+        cost = np.where(finite, candidates, 2 * candidates[finite].sum() + 1 if finite.any() else 1)
+        rows, cols = linear_sum_assignment(cost)
+        matched = finite[rows, cols]
+        pairs = np.column_stack([rows[matched], cols[matched]])
+    else:
+        distances, nearest = cKDTree(nv_locs_2).query(nv_locs_1, distance_upper_bound=max_distance)
+        # nearest is len(nv_locs_2) if there is no neighbour within max_distance
+        matched = np.isfinite(distances)
+        pairs = np.column_stack([np.flatnonzero(matched), nearest[matched]])
+
+    unmatched_1 = np.setdiff1d(np.arange(len(nv_locs_1)), pairs[:, 0])
+    unmatched_2 = np.setdiff1d(np.arange(len(nv_locs_2)), pairs[:, 1])
+
+    return pairs, unmatched_1, unmatched_2
+
+def pair_NVs(image1, image2, nv_size, max_distance = np.inf, one_to_one = False):
+    """
+    Locates the NVs in two images with trackpy and pairs them (see pair_nv_locations)
+    Args:
+        image1: first image
+        image2: second image
+        nv_size: expected NV size in pixels (odd integer)
+        max_distance: NVs further apart than this (in pixels) are not paired
+        one_to_one: if True, each NV is paired at most once
+
+    Returns:
+        pairs: list of pairs [[x1, y1], [x2, y2]] of pixel positions in image1 and image2
+        unmatched_1: list of pixel positions [x, y] in image1 without partner
+        unmatched_2: list of pixel positions [x, y] in image2 without partner
+
+    """
+    # trackpy returns y, x
+    nv_locs_1 = tp.locate(image1, nv_size)[['x', 'y']].values
+    nv_locs_2 = tp.locate(image2, nv_size)[['x', 'y']].values
+
+    pairs, unmatched_1, unmatched_2 = pair_nv_locations(nv_locs_1, nv_locs_2, max_distance, one_to_one)
+
+    return [[list(nv_locs_1[i]), list(nv_locs_2[j])] for i, j in pairs], \
+           nv_locs_1[unmatched_1].tolist(), nv_locs_2[unmatched_2].tolist()
 
 '''
 data3 = Script.load_data(path = 'Z:\\Lab\\Cantilever\\Measurements\\__test_data_for_coding\\160524-18_52_29_magn_on_center_beam\\')
@@ -0,0 +1,144 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+
+
+class DriftEstimator(object):
+    """
+    Kalman filter that estimates the drift of a 2D position (e.g. the galvo voltages of an NV) from a series of
+    timestamped measurements (e.g. the maximum_point found by FindNV).
+
+    The model assumes that x and y drift independently with a velocity that changes slowly (constant velocity model
+    with white noise acceleration). The filter predicts the position at any later time together with its uncertainty,
+    which grows with the time since the last measurement and can be used to decide when to measure again.
+    """
+
+    def __init__(self, measurement_noise=5e-4, process_noise=1e-7, initial_velocity=1e-5):
+        """
+        Args:
+            measurement_noise: standard deviation of a single position measurement (V)
+            process_noise: standard deviation of the random change of the drift velocity per sqrt(s) (V/s/sqrt(s))
+            initial_velocity: standard deviation of the drift velocity before any information is available (V/s)
+        """
+        self.measurement_noise = measurement_noise
+        self.process_noise = process_noise
+        self.initial_velocity = initial_velocity
+        self.reset()
+
+    def reset(self):
+        """
+        forgets all measurements
+        """
+        self.time = None
+        self.state = None  # x, y, vx, vy
+        self.covariance = None
+
+    def get_state(self):
+        """
+        Returns: the state of the filter as a dictionary of plain lists and numbers, e.g. to save it to a json file
+        """
+        return {'time': self.time,
+                'state': None if self.state is None else self.state.tolist(),
+                'covariance': None if self.covariance is None else self.covariance.tolist()}
+
+    def set_state(self, state):
+        """
+        restores the state of the filter
+        Args:
+            state: dictionary returned by get_state
+        """
+        self.time = state['time']
+        self.state = None if state['state'] is None else np.array(state['state'], dtype=float)
+        self.covariance = None if state['covariance'] is None else np.array(state['covariance'], dtype=float)
+
+    @property
+    def initialized(self):
+        """
+        True once the filter has received a measurement
+        """
+        return self.state is not None
+
+    def _propagate(self, time):
+        """
+        propagates the state and covariance to time
+
+        Returns: state, covariance at time
+
+        """
+        dt = max(time - self.time, 0.)
+
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = dt
+
+        # white noise acceleration
+        q = self.process_noise ** 2
+        noise = np.zeros((4, 4))
+        noise[[0, 1], [0, 1]] = q * dt ** 3 / 3.
+        noise[[0, 1, 2, 3], [2, 3, 0, 1]] = q * dt ** 2 / 2.
+        noise[[2, 3], [2, 3]] = q * dt
+
+        return transition.dot(self.state), transition.dot(self.covariance).dot(transition.T) + noise
+
+    def predict(self, time):
+        """
+        predicts the position at time
+        Args:
+            time: time in s (same clock as the measurements, e.g. time.time())
+
+        Returns:
+            position: predicted position, array of length 2, None if there has been no measurement yet
+            uncertainty: standard deviation of the predicted position along the worse axis, inf if there has been no
+                measurement yet
+
+        """
+        if not self.initialized:
+            return None, np.inf
+
+        state, covariance = self._propagate(time)
+
+        return state[0:2], float(np.sqrt(max(covariance[0, 0], covariance[1, 1])))
+
+    def update(self, time, position):
+        """
+        adds a measurement to the filter
+        Args:
+            time: time in s of the measurement
+            position: measured position, array of length 2
+        """
+        position = np.array(position, dtype=float)
+
+        if not self.initialized:
+            self.state = np.array([position[0], position[1], 0., 0.])
+            self.covariance = np.diag([self.measurement_noise ** 2] * 2 + [self.initial_velocity ** 2] * 2)
+            self.time = time
+            return
+
+        state, covariance = self._propagate(time)
+
+        # we only measure the position
+        observation = np.zeros((2, 4))
+        observation[0, 0] = observation[1, 1] = 1.
+
+        residual = position - observation.dot(state)
+        residual_covariance = observation.dot(covariance).dot(observation.T) + np.eye(2) * self.measurement_noise ** 2
+        gain = covariance.dot(observation.T).dot(np.linalg.inv(residual_covariance))
+
+        self.state = state + gain.dot(residual)
+        self.covariance = (np.eye(4) - gain.dot(observation)).dot(covariance)
+        self.time = time
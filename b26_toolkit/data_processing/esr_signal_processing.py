@@ -403,6 +403,62 @@ def calc_esr_noise(freq, amp, fit_params):
         return None
 
 
+def get_esr_peaks(freq, ampl, fit_params=None, default_fwhm=5e6):
+    """
+    returns the center frequencies and widths of the esr dips, taken from the fit if available and otherwise estimated
+    with find_nv_peaks
+    Args:
+        freq: 1d array of frequencies which were scanned for esr resonance
+        ampl: 1d array of amplitudes corresponding to the frequencies (freq)
+        fit_params: output of fit_esr (4 or 6 parameters or None)
+        default_fwhm: width assumed for the dips if they are not taken from the fit
+
+    Returns:
+        centers, fwhm
+        list of center frequencies (empty if no dip was found) and the width of the dips
+
+    """
+    if fit_params is not None and len(fit_params) == 4:
+        return [fit_params[2]], np.abs(fit_params[3])
+    elif fit_params is not None and len(fit_params) == 6:
+        return [fit_params[4], fit_params[5]], np.abs(fit_params[1])
+
+    freq_peaks, _ = find_nv_peaks(np.array(freq), np.array(ampl))
+    if freq_peaks[0] == 0:
+        return [], default_fwhm
+    elif freq_peaks[0] == freq_peaks[1]:
+        return [freq_peaks[0]], default_fwhm
+    else:
+        return list(freq_peaks), default_fwhm
+
+
+def get_adaptive_freq_array(freq_start, freq_stop, centers, fwhm, points_per_peak=50, peak_range=3.,
+                            baseline_points=20):
+    """
+    returns a non-uniform frequency array that is sampled densely around the esr dips and coarsely on the baseline
+    Args:
+        freq_start: lowest frequency of the scan
+        freq_stop: highest frequency of the scan
+        centers: center frequencies of the dips (e.g. from get_esr_peaks)
+        fwhm: width of the dips
+        points_per_peak: number of frequencies in the window around each dip
+        peak_range: half width of the window around each dip in units of fwhm
+        baseline_points: number of uniformly spaced frequencies across the full range
+
+    Returns:
+        sorted array of unique frequencies between freq_start and freq_stop
+
+    """
+    freq_values = [np.linspace(freq_start, freq_stop, baseline_points)]
+    for center in centers:
+        window_start = max(freq_start, center - peak_range * fwhm)
+        window_stop = min(freq_stop, center + peak_range * fwhm)
+        if window_stop > window_start:
+            freq_values.append(np.linspace(window_start, window_stop, points_per_peak))
+
+    return np.unique(np.concatenate(freq_values))
+
+
 def get_counts_threshold(esr, show_plot=False):
     """
     returns the threshold value above which measuements are considered to be background
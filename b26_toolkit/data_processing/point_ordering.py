@@ -0,0 +1,107 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import numpy as np
+
+
+def _distance_matrix(points):
+    """
+    Args:
+        points: N x 2 array of points
+
+    Returns: N x N array of the distances between the points
+
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    return np.sqrt(np.sum(np.square(points[:, np.newaxis, :] - points[np.newaxis, :, :]), axis=2))
+
+
+def nearest_neighbour_path(points, start=0):
+    """
+    builds a path through all points by always going to the closest point that has not been visited
+    Args:
+        points: N x 2 array of points
+        start: index of the first point
+
+    Returns: array with the indices of the points in the order they are visited
+
+    """
+    distances = _distance_matrix(points)
+    N = len(distances)
+    if N == 0:
+        return np.zeros(0, dtype=int)
+
+    visited = np.zeros(N, dtype=bool)
+    path = [start]
+    visited[start] = True
+    for _ in range(N - 1):
+        next_point = int(np.argmin(np.where(visited, np.inf, distances[path[-1]])))
+        path.append(next_point)
+        visited[next_point] = True
+
+    return np.array(path)
+
+
+def two_opt(points, path, max_iterations=100):
+    """
+    shortens an open path through points by reversing segments of the path (2-opt) until no reversal shortens it any
+    further. The first point of the path is kept.
+    Args:
+        points: N x 2 array of points
+        path: array with the indices of the points in the order they are visited
+        max_iterations: maximum number of passes over the path
+
+    Returns: improved path
+
+    """
+    distances = _distance_matrix(points)
+    path = np.array(path, dtype=int)
+    N = len(path)
+
+    for _ in range(max_iterations):
+        improved = False
+        for i in range(N - 2):
+            # reversing path[i + 1:k + 1] replaces the edges (a, b) and (c, d) by (a, c) and (b, d)
+            a, b = path[i], path[i + 1]
+            c = path[i + 2:]
+            d = path[i + 3:]
+            change = distances[a, c] - distances[a, b]
+            # the last point of the path has no successor
+            change[:-1] += distances[b, d] - distances[c[:-1], d]
+            k = int(np.argmin(change))
+            if change[k] < -1e-12:
+                path[i + 1:i + k + 3] = path[i + 1:i + k + 3][::-1]
+                improved = True
+        if not improved:
+            break
+
+    return path
+
+
+def get_point_order(points, start=0):
+    """
+    finds a short path through all points (approximate solution of the travelling salesman problem) by building a
+    nearest neighbour path and improving it with 2-opt
+    Args:
+        points: N x 2 array of points
+        start: index of the first point
+
+    Returns: array with the indices of the points in the order they should be visited
+
+    """
+    return two_opt(points, nearest_neighbour_path(points, start))
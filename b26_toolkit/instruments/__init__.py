@@ -16,22 +16,63 @@
     along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from .gauge_controller import PressureGauge, PumpLinePressureGauge, ChamberPressureGauge
-from .spectrum_analyzer import SpectrumAnalyzer
-from .ni_daq import NI6259, NI9263, NI9402, NI9219
-from .piezo_controller import PiezoController, PiezoControllerCold
-from .zurich_instruments import ZIHF2
-from .pulse_blaster import B26PulseBlaster, Pulse
-from .maestro import MaestroLightControl
-from .attocube import Attocube, AttocubeXY
-from .microwave_generator import MicrowaveGenerator
-from .magnet_coils import MagnetCoils
-from .temperature_controller import TemperatureController
-from .montana import CryoStation
-from .newport_smc100 import SMC100
-# from .awg import AWG
-from .keysight_oscilloscope import Oscilloscope
-from .thorlabs_kcube import KDC001, TLI_DeviceInfo, B26KDC001x, B26KDC001y, B26KDC001z
-from .magnet_coils import MagnetCoils
-from .ueye_camera import UEyeCamera
-from .optotune_lens import OptotuneLens
\ No newline at end of file
+import sys
+from importlib import import_module
+
+# public classes and the modules they are defined in, the modules are imported on first access
+_CLASSES = {
+    'PressureGauge': '.gauge_controller',
+    'PumpLinePressureGauge': '.gauge_controller',
+    'ChamberPressureGauge': '.gauge_controller',
+    'SpectrumAnalyzer': '.spectrum_analyzer',
+    'NI6259': '.ni_daq',
+    'NI9263': '.ni_daq',
+    'NI9402': '.ni_daq',
+    'NI9219': '.ni_daq',
+    'PiezoController': '.piezo_controller',
+    'PiezoControllerCold': '.piezo_controller',
+    'ZIHF2': '.zurich_instruments',
+    'B26PulseBlaster': '.pulse_blaster',
+    'Pulse': '.pulse_blaster',
+    'MaestroLightControl': '.maestro',
+    'Attocube': '.attocube',
+    'AttocubeXY': '.attocube',
+    'MicrowaveGenerator': '.microwave_generator',
+    'MagnetCoils': '.magnet_coils',
+    'TemperatureController': '.temperature_controller',
+    'CryoStation': '.montana',
+    'SMC100': '.newport_smc100',
+    # from .awg import AWG
+    'Oscilloscope': '.keysight_oscilloscope',
+    'KDC001': '.thorlabs_kcube',
+    'TLI_DeviceInfo': '.thorlabs_kcube',
+    'B26KDC001x': '.thorlabs_kcube',
+    'B26KDC001y': '.thorlabs_kcube',
+    'B26KDC001z': '.thorlabs_kcube',
+    'UEyeCamera': '.ueye_camera',
+    'OptotuneLens': '.optotune_lens',
+}
+
+__all__ = list(_CLASSES)
+
+
+def __getattr__(name):
+    """
+    imports the class name from its module on first access (PEP 562), such that importing the package doesn't load
+    all the drivers and their libraries
+    """
+    if name in _CLASSES:
+        value = getattr(import_module(_CLASSES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {:s} has no attribute {:s}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_CLASSES))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ is not supported, import everything
+    for _name in _CLASSES:
+        __getattr__(_name)
@@ -18,9 +18,11 @@
 
 import serial
 from pylabcontrol.core import Parameter, Instrument
+from b26_toolkit.instruments.probe_cache import CachedProbesInstrument
+from b26_toolkit.instruments.serial_transport import SerialTransport
 
 
-class PressureGauge(Instrument):
+class PressureGauge(CachedProbesInstrument, Instrument):
     """
     This class implements the AGC100 pressure gauge. The class communicates with the device over RS232 using pyserial.
     """
@@ -55,6 +57,13 @@ class PressureGauge(Instrument):
 
     _possible_com_ports = ['COM' + str(i) for i in range(0, 256)]
 
+    # maximum age in seconds of cached probe values, the units and the model hardly ever change
+    _PROBE_MAX_AGE = {
+        'pressure': 0.5,
+        'units': 60.0,
+        'model': float('inf')
+    }
+
     _DEFAULT_SETTINGS = Parameter([
             Parameter('port', 'COM7', _possible_com_ports, 'com port to which the gauge controller is connected'),
             Parameter('timeout', 1.0, float, 'amount of time to wait for a response '
@@ -75,6 +84,8 @@ class PressureGauge(Instrument):
         super(PressureGauge, self).__init__(name, settings)
         self.serial_connection = serial.Serial(port=self.settings['port'], baudrate=self.settings['baudrate'],
                                                timeout=self.settings['timeout'])
+        # all replies of the controller end with CR LF
+        self.transport = SerialTransport(self.serial_connection, terminators=(self.LF,))
 
     @property
     def _PROBES(self):
@@ -92,7 +103,7 @@ class PressureGauge(Instrument):
     def update(self, settings):
         super(PressureGauge, self).update(settings)
 
-    def read_probes(self, probe_name):
+    def _read_probe(self, probe_name):
         """
         Args:
             probe_name: Name of the probe to get the value of from the Pressure Gauge (e.g., 'pressure')
@@ -139,22 +150,22 @@ class PressureGauge(Instrument):
         """
         assert self.serial_connection.isOpen()
 
-        self.serial_connection.write('PR1' + self.CR + self.LF)
-        acknowledgement = self.serial_connection.readline()
-        self._check_acknowledgement(acknowledgement)
+        # hold the lock of the transport such that the command - enquiry sequence is not interrupted by other threads
+        with self.transport.lock:
+            acknowledgement = self.transport.query('PR1' + self.CR + self.LF)
+            self._check_acknowledgement(acknowledgement)
 
-        self.serial_connection.write(self.ENQ)
-        err_msg_and_pressure = self.serial_connection.readline().rstrip(self.LF).rstrip(self.CR)
+            err_msg_and_pressure = self.transport.query(self.ENQ).rstrip(self.LF).rstrip(self.CR)
 
-        err_msg = err_msg_and_pressure[0]
-        pressure = float(err_msg_and_pressure[3:])
+            err_msg = err_msg_and_pressure[0]
+            pressure = float(err_msg_and_pressure[3:])
 
-        if err_msg != '0':
-            print(('xx', err_msg, pressure))
-            message = 'Pressure query resulted in an error: ' + self.MEASUREMENT_STATUS[err_msg]
-            # raise IOError(message) # JG: don't raise the error because this crashes the programm, rather we want to return an invalid value
+            if err_msg != '0':
+                print(('xx', err_msg, pressure))
+                message = 'Pressure query resulted in an error: ' + self.MEASUREMENT_STATUS[err_msg]
+                # raise IOError(message) # JG: don't raise the error because this crashes the programm, rather we want to return an invalid value
 
-        self.serial_connection.write(self.CR + self.LF)
+            self.transport.write(self.CR + self.LF)
         return pressure
 
     def _get_model(self):
@@ -164,14 +175,14 @@ class PressureGauge(Instrument):
         """
         assert self.serial_connection.isOpen()
 
-        self.serial_connection.write('TID' + self.CR + self.LF)
-        acknowledgement = self.serial_connection.readline(25)
-        self._check_acknowledgement(acknowledgement)
+        # hold the lock of the transport such that the command - enquiry sequence is not interrupted by other threads
+        with self.transport.lock:
+            acknowledgement = self.transport.query('TID' + self.CR + self.LF)
+            self._check_acknowledgement(acknowledgement)
 
-        self.serial_connection.write(self.ENQ)
-        model = self.serial_connection.readline().rstrip(self.LF).rstrip(self.CR)
+            model = self.transport.query(self.ENQ).rstrip(self.LF).rstrip(self.CR)
 
-        self.serial_connection.write(self.CR + self.LF)
+            self.transport.write(self.CR + self.LF)
 
         return model
 
@@ -183,14 +194,14 @@ class PressureGauge(Instrument):
         """
         #assert self.ser.isOpen()
 
-        self.serial_connection.write('UNI' + self.CR + self.LF)
-        acknowledgement = self.serial_connection.readline()
-        self._check_acknowledgement(acknowledgement)
+        # hold the lock of the transport such that the command - enquiry sequence is not interrupted by other threads
+        with self.transport.lock:
+            acknowledgement = self.transport.query('UNI' + self.CR + self.LF)
+            self._check_acknowledgement(acknowledgement)
 
-        self.serial_connection.write(self.ENQ)
-        unit = self.MEASUREMENT_UNITS[self.serial_connection.readline().rstrip(self.LF).rstrip(self.CR)]
+            unit = self.MEASUREMENT_UNITS[self.transport.query(self.ENQ).rstrip(self.LF).rstrip(self.CR)]
 
-        self.serial_connection.write(self.CR + self.LF)
+            self.transport.write(self.CR + self.LF)
 
         return unit
 
@@ -17,7 +17,7 @@
 """
 
 from pylabcontrol.core import Instrument, Parameter
-import visa
+from b26_toolkit.instruments.visa_sessions import open_resource
 import numpy as np
 import time
 
@@ -86,15 +86,16 @@ class Oscilloscope(Instrument):
 
         """
 
+        # preamble of the waveform of each channel, cleared whenever the settings change
+        self._preambles = {}
+
         super(Oscilloscope, self).__init__(name, settings)
 
         # keep track of when the instrument was updated last to prevent sending requests to frequently
         self._last_update_time = time.time()
 
-        rm = visa.ResourceManager()
-
         # todo: JG 20170623 implement proper error handling when insturment is not connected.
-        self.osci = rm.open_resource(self.settings['visa_resource'])
+        self.osci = open_resource(self.settings['visa_resource'])
         self.osci.read_termination = '\n'
         self.osci.timeout = self.settings['connection_timeout']
         self.osci.inputbuffersize = 1000
@@ -113,6 +114,7 @@ class Oscilloscope(Instrument):
 
         """
         self.osci.write('*RST') #Places the oscilloscope in the factory default setup state.
+        self._preambles.clear()
 
     def update(self, settings):
         """
@@ -123,6 +125,7 @@ class Oscilloscope(Instrument):
 
         """
         super(Oscilloscope, self).update(settings)
+        self._preambles.clear()
 
         if 'timebase' in settings:
             # self._wait_for_osci()
@@ -205,96 +208,118 @@ class Oscilloscope(Instrument):
         identification = self.osci.query('*IDN?')
         return identification == self._INSTRUMENT_IDENTIFIER
 
-    def get_timetrace(self):
+    def get_timetrace(self, channels=None):
         """
-        reads a time trace from the intruments
-        Returns:
+        acquires a single time trace and reads it from the intruments
+        Args:
+            channels: list of channels that are read from the same acquisition (trigger), if None only the channel in
+                the waveform settings is read
+
+        Returns: the data and the preamble of the channel or, if channels is given, two dictionaries with the data and
+            the preamble of each channel
 
         """
         self.osci.write(':SINGLE') # start a single acquisition
         self.osci.write(':FORCetrig') # force trigger to make sure that the acquisition starts
 
+        # wait until the acquisition is finished, allow for twice the estimated acquisition time
+        timeout = 2 * self.acq_time() * self.settings['acquisition']['count'] + self.settings['connection_timeout'] / 1000.
+        self._wait_for_acquisition(timeout)
 
-        # estimate acquisition time and wait until acquisition is finished
-        # JG: This seems to work, just wait enough time so that the oscilloscope can acquire the data
-        # output counter to terminal to show that the program didn't freeze
-        total_time = self.acq_time()
-        total_time = int(total_time )*10 # multiply by 10 because the wait loop time is 100ms
-        total_time = int(total_time * 1.2+1) # give another percent margin, this is empirical
+        if channels is None:
+            return self._read_waveform(self.settings['waveform']['channel'])
 
-        for i in range(total_time):
-            print(('waiting {:d}/{:d}'.format(i, total_time)))
-            time.sleep(0.1)
+        data, preambles = {}, {}
+        for channel in channels:
+            self.osci.write(':WAV:SOURCE CHAN' + str(channel))
+            data[channel], preambles[channel] = self._read_waveform(channel)
+        # restore the source of the settings
+        self.osci.write(':WAV:SOURCE CHAN' + str(self.settings['waveform']['channel']))
 
-        operationComplete = bool(self.osci.query('*OPC?'))
-        print(('operationComplete', operationComplete))
+        return data, preambles
 
+    def _wait_for_acquisition(self, timeout):
+        """
+        polls the trigger status with increasing intervals until the single acquisition has stopped
+        Args:
+            timeout: maximum time to wait in seconds
+
+        """
+        start_time = time.time()
+        interval = 0.01
+        while self.osci.query(':TRIG:STAT?').strip().upper() != 'STOP':
+            if time.time() - start_time > timeout:
+                raise IOError('oscilloscope acquisition did not finish within {:0.1f} s'.format(timeout))
+            time.sleep(interval)
+            interval = min(1.5 * interval, 0.2)
+        # make sure that all pending operations are complete before the data is read
+        self.osci.query('*OPC?')
+
+    def _get_preamble(self, channel):
+        """
+        reads the preamble of the waveform, the preamble only changes with the settings so it is read once per channel
+        and cached until the next update
+        Args:
+            channel: channel that is the current waveform source
 
-        # Get the preamble block
-        preambleBlock = self.osci.query(':WAV:PREAMBLE?')
-        # preable contains the curren settings
-        #   FORMAT        : int16 - 0 = WORD, 1 = BYTE, 2 = ASCII.
-        #   TYPE          : int16 - 0 = NORMAL, 1 = PEAK DETECT, 2 = AVERAGE
-        #   POINTS        : int32 - number of data points transferred.
-        #   COUNT         : int32 - 1 and is always 1.
-        #   XINCREMENT    : float64 - time difference between data points.
-        #   XORIGIN       : float64 - always the first data point in memory.
-        #   XREFERENCE    : int32 - specifies the data point associated with x-origin.
-        #   YINCREMENT    : float32 - voltage diff between data points.
-        #   YORIGIN       : float32 - value is the voltage at center screen.
-        #   YREFERENCE    : int32 - specifies the data point where y-origin occurs
+        Returns: the preamble as a dictionary
 
-        # convert into dictionary
-        preamble = {k:float(v) for k, v in zip(['format', 'type', 'points', 'count', 'xincrement', 'xorigin', 'xreference', 'yincrement', 'yorigin', 'yreference'], preambleBlock.split(','))}
+        """
+        if channel not in self._preambles:
+            # Get the preamble block
+            preambleBlock = self.osci.query(':WAV:PREAMBLE?')
+            # preable contains the curren settings
+            #   FORMAT        : int16 - 0 = WORD, 1 = BYTE, 2 = ASCII.
+            #   TYPE          : int16 - 0 = NORMAL, 1 = PEAK DETECT, 2 = AVERAGE
+            #   POINTS        : int32 - number of data points transferred.
+            #   COUNT         : int32 - 1 and is always 1.
+            #   XINCREMENT    : float64 - time difference between data points.
+            #   XORIGIN       : float64 - always the first data point in memory.
+            #   XREFERENCE    : int32 - specifies the data point associated with x-origin.
+            #   YINCREMENT    : float32 - voltage diff between data points.
+            #   YORIGIN       : float32 - value is the voltage at center screen.
+            #   YREFERENCE    : int32 - specifies the data point where y-origin occurs
+
+            # convert into dictionary
+            self._preambles[channel] = {k:float(v) for k, v in zip(['format', 'type', 'points', 'count', 'xincrement', 'xorigin', 'xreference', 'yincrement', 'yorigin', 'yreference'], preambleBlock.split(','))}
+
+        return dict(self._preambles[channel])
+
+    def _read_waveform(self, channel):
+        """
+        reads the waveform of the current source from the instrument
+        Args:
+            channel: channel that is the current waveform source
 
+        Returns: the data as a numpy array and the preamble
 
+        """
+        preamble = self._get_preamble(channel)
 
         format = str(self.settings['waveform']['format']).lower()
         # depending on the setting we get differnet data back
         if format == 'ascii':
-            print('datatype ascii')
-            print('JG: WARNING ascii NOT TESTED!')
-
-            # send command to read data
-            # raw_data = self.osci.query(':WAV:DATA?')
-            raw_data = self.osci.query_ascii_values(':WAV:DATA?')
-            # the first charactars are some metadata
-            prefix = raw_data[:11]
-            data = raw_data[11:].split(',')
-            # data = [float(d) for d in data]
-            data = np.array(data)
-
-        elif format == 'word':
-            print('datatype word')
-            # try until we get the data
-            max_attempts = 100
-            count = 0
-            raw_data = []
-            while len(raw_data) == 0 and count<max_attempts:
-                raw_data = self.osci.query_binary_values(':WAV:DATA?', datatype='H')
-                print(('data empty retry, attempt {:02d}/{:02d}'.format(count, max_attempts)))
-                count += 1
-                time.sleep(0.1)
-            data = raw_data
-
-        elif format == 'byte':
-            print('datatype byte')
-            print('JG: WARNING BYTE NOT TESTED!')
-            raw_data = self.osci.query_binary_values(':WAV:DATA?')
-            data = raw_data
+            raw_data = self.osci.query(':WAV:DATA?')
+            # the data starts with a block header #N<N digits with the length>
+            if raw_data.startswith('#'):
+                raw_data = raw_data[2 + int(raw_data[1]):]
+            data = np.array(raw_data.split(','), dtype=float)
+        elif format in ('word', 'byte'):
+            # transfer the binary block in a single read directly into a numpy array
+            data = self.osci.query_binary_values(':WAV:DATA?', datatype='H' if format == 'word' else 'B',
+                                                 is_big_endian=False, container=np.array)
         else:
-            print('WARNING UNKNOWN DATA FORMAT')
+            raise ValueError('unknown waveform format {:s}'.format(format))
 
-        if len(data)>0:
-            dt = float(self.time_base_to_nr3(self.settings['waveform']['timebase'], self.settings['waveform']['timebase_unit']))*10/len(data)
-        else:
-            dt = 1
+        if len(data) == 0:
+            raise IOError('oscilloscope returned no data for channel {:s}'.format(str(channel)))
+
+        dt = float(self.time_base_to_nr3(self.settings['waveform']['timebase'], self.settings['waveform']['timebase_unit']))*10/len(data)
         # add more meta data to the preamble
         preamble['dt']= dt
         preamble['vert_scale'] =float(self.settings['waveform']['vert_scale'])*float(self.settings['waveform']['probe'].split('X')[0]) #  vertical scale of osci
         return data, preamble
 
-
     def __del__(self):
         #COMMENT_ME
         # self._wait_for_osci()
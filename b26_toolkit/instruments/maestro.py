@@ -17,6 +17,7 @@
 """
 
 from pylabcontrol.core import Instrument,Parameter
+from b26_toolkit.instruments.serial_transport import SerialTransport
 from time import sleep
 # =============== MAESTRO ==================================
 # ==========================================================
@@ -45,6 +46,7 @@ class MaestroController(Instrument):
     def __init__(self, name = None, settings = None):
 
         self.usb = None
+        self.transport = None
         # Open the command port
         # self.usb = self.serial.Serial(port)
         # Command lead-in and device 12 are sent for each Pololu serial commands.
@@ -73,7 +75,9 @@ class MaestroController(Instrument):
             if key == 'port':
                 try:
                     if self.usb is None or value != self.usb.port:
-                        self.usb = self.serial.Serial(value)
+                        self.usb = self.serial.Serial(value, timeout=1.0)
+                        # the Pololu protocol is binary, latin-1 maps the chr() based commands one to one to bytes
+                        self.transport = SerialTransport(self.usb, encoding='latin-1')
                 except OSError:
                     print(('Couln\'t connect to maestro controler at port {:s}'.format(value)))
 
@@ -153,7 +157,7 @@ class MaestroController(Instrument):
         msb = (target >> 7) & 0x7f #shift 7 and take next 7 bits for msb
         # Send Pololu intro, device number, command, channel, and target lsb/msb
         cmd = self.PololuCmd + chr(0x04) + chr(chan) + chr(lsb) + chr(msb)
-        self.usb.write(cmd)
+        self.transport.write(cmd)
         # Record Target value
         self.Targets[chan] = target
 
@@ -170,7 +174,7 @@ class MaestroController(Instrument):
         msb = (target >> 7) & 0x7f #shift 7 and take next 7 bits for msb
         # Send Pololu intro, device number, command, channel, and target lsb/msb
         cmd = self.PololuCmd + chr(0x04) + chr(chan) + chr(lsb) + chr(msb)
-        self.usb.write(cmd)
+        self.transport.write(cmd)
         # Record Target value
         self.Targets[chan] = target
 
@@ -190,7 +194,7 @@ class MaestroController(Instrument):
         msb = (speed >> 7) & 0x7f #shift 7 and take next 7 bits for msb
         # Send Pololu intro, device number, command, channel, speed lsb, speed msb
         cmd = self.PololuCmd + chr(0x07) + chr(chan) + chr(lsb) + chr(msb)
-        self.usb.write(cmd)
+        self.transport.write(cmd)
 
 
     def set_accel(self, chan, accel):
@@ -207,7 +211,7 @@ class MaestroController(Instrument):
         msb = (accel >> 7) & 0x7f #shift 7 and take next 7 bits for msb
         # Send Pololu intro, device number, command, channel, accel lsb, accel msb
         cmd = self.PololuCmd + chr(0x09) + chr(chan) + chr(lsb) + chr(msb)
-        self.usb.write(cmd)
+        self.transport.write(cmd)
 
     def get_position(self, chan):
         """
@@ -223,9 +227,8 @@ class MaestroController(Instrument):
 
         """
         cmd = self.PololuCmd + chr(0x10) + chr(chan)
-        self.usb.write(cmd)
-        lsb = ord(self.usb.read())
-        msb = ord(self.usb.read())
+        self.transport.write(cmd)
+        lsb, msb = [ord(c) for c in self.transport.read_bytes(2)]
         return (msb << 8) + lsb
 
     # # Test to see if a servo has reached its target position.  This only provides
@@ -269,7 +272,7 @@ class MaestroController(Instrument):
         Stop the current Maestro Script
         """
         cmd = self.PololuCmd + chr(0x22)
-        self.usb.write(cmd)
+        self.transport.write(cmd)
 
 class MaestroLightControl(MaestroController):
     """
@@ -314,6 +317,7 @@ class MaestroLightControl(MaestroController):
     def __init__(self, name = None, settings = None):
 
         self.usb = None
+        self.transport = None
 
         super(MaestroLightControl, self).__init__(name, settings = settings)
 
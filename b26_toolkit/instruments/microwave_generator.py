@@ -16,16 +16,24 @@
     along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import visa
+import time
+
 import pyvisa.errors
 
 from pylabcontrol.core import Parameter, Instrument
+from b26_toolkit.instruments.visa_sessions import open_resource, close_resource
+from b26_toolkit.instruments.probe_cache import CachedProbesInstrument
 
 # RANGE_MIN = 2025000000 #2.025 GHz
 RANGE_MIN = 1012500000
 RANGE_MAX = 4050000000 #4.050 GHZ
 
-class MicrowaveGenerator(Instrument):
+# values last written to or read from each SRS and the time they were confirmed, keyed by resource name and internal
+# command. Instances that share a visa session also share this state, it is used to skip writes of values that are
+# already set on the instrument
+_instrument_states = {}
+
+class MicrowaveGenerator(CachedProbesInstrument, Instrument):
     """
     This class implements the Stanford Research Systems SG384 microwave generator. The class commuicates with the
     device over GPIB using pyvisa.
@@ -48,6 +56,18 @@ class MicrowaveGenerator(Instrument):
         Parameter('dev_width', 32e6, float, 'Width of deviation from center frequency in FM')
     ])
 
+    # the outputs only change when they are set through update, which invalidates the cached value, or from the front panel
+    _PROBE_MAX_AGE = {key: 5.0 for key in ['enable_output', 'frequency', 'amplitude', 'phase', 'enable_modulation',
+                                           'modulation_type', 'modulation_function', 'pulse_modulation_function',
+                                           'dev_width']}
+
+    # time in s after which a value in the state cache is written again even if it didn't change, such that changes
+    # from the front panel or from other programs are eventually overwritten
+    _STATE_MAX_AGE = 60.0
+
+    # if True, the error queue is also checked after updates that change a single value
+    _CHECK_ERRORS = False
+
     def __init__(self, name=None, settings=None):
 
         super(MicrowaveGenerator, self).__init__(name, settings)
@@ -66,14 +86,50 @@ class MicrowaveGenerator(Instrument):
         #===========================================
 
     def _connect(self):
-        rm = visa.ResourceManager()
         if self.settings['connection_type'] == 'GPIB':
-            self.srs = rm.open_resource(
-                'GPIB' + str(self.settings['GPIB_num']) + '::' + str(self.settings['port']) + '::INSTR')
+            resource_name = 'GPIB' + str(self.settings['GPIB_num']) + '::' + str(self.settings['port']) + '::INSTR'
+            self.srs = open_resource(resource_name)
         elif self.settings['connection_type'] == 'RS232':
-            self.srs = rm.open_resource('COM' + str(self.settings['port']))
-            self.srs.baud_rate = 115200
-        self.srs.query('*IDN?')
+            resource_name = 'COM' + str(self.settings['port'])
+            self.srs = open_resource(resource_name, baud_rate=115200)
+        else:
+            raise ValueError('unknown connection_type {:s}, must be GPIB or RS232'.format(str(self.settings['connection_type'])))
+        try:
+            self.srs.query('*IDN?')
+        except pyvisa.errors.VisaIOError:
+            # drop the shared handle such that the next attempt opens a new session
+            close_resource(resource_name)
+            raise
+        self._instrument_state = _instrument_states.setdefault(resource_name, {})
+        self._instrument_state.clear()
+        self.invalidate_probes()
+
+    def clear_state_cache(self):
+        """
+        forgets the values that are known to be set on the SRS, such that the next update sends all values again. Call
+        this if the SRS has been changed from the front panel or by another program.
+        """
+        self._instrument_state.clear()
+        self.invalidate_probes()
+
+    def _get_known_value(self, key_internal):
+        """
+        Args:
+            key_internal: GPIB command, ex. FREQ
+
+        Returns: the value that is known to be set on the SRS, None if it is unknown or older than _STATE_MAX_AGE
+
+        """
+        value, timestamp = self._instrument_state.get(key_internal, (None, 0))
+        if time.time() - timestamp > self._STATE_MAX_AGE:
+            return None
+        return value
+
+    def _set_known_value(self, key_internal, value):
+        """
+        records that value has been confirmed to be set on the SRS
+        """
+        self._instrument_state[key_internal] = (value, time.time())
 
     #Doesn't appear to be necessary, can't manually make two sessions conflict, rms may share well
     # def __del__(self):
@@ -89,6 +145,7 @@ class MicrowaveGenerator(Instrument):
         super(MicrowaveGenerator, self).update(settings)
         # XXXXX MW ISSUE = START
         # ===========================================
+        commands = []
         for key, value in settings.items():
             if key == 'connection_type':
                 self._connect()
@@ -100,20 +157,42 @@ class MicrowaveGenerator(Instrument):
                 elif key == 'modulation_function':
                     value = self._mod_func_to_internal(value)
                 elif key == 'pulse_modulation_function':
-                    value = self._pulse_mod_func_to_internal
+                    value = self._pulse_mod_func_to_internal(value)
                 # elif key == 'frequency':
                 #     if value > RANGE_MAX or value < RANGE_MIN:
                 #         raise ValueError("Invalid frequency. All frequencies must be between 2.025 GHz and 4.050 GHz.")
                 key = self._param_to_internal(key)
 
-                # only send update to instrument if connection to instrument has been established
-                if self._settings_initialized:
-                    self.srs.write(key + ' ' + str(value)) # frequency change operation timed using timeit.timeit and
-                                                           # completion confirmed by query('*OPC?'), found delay of <10ms
-                    # ER 20180904
-                   # if key == 'FREQ':
-                   #     print('frequency set to: ', float(self.srs.query('FREQ?')))
-                    # print(self.srs.query('*OPC?'))
+                # only send update to instrument if connection to instrument has been established and only send
+                # values that differ from the ones already set on the instrument
+                if self._settings_initialized and self._get_known_value(key) != value:
+                    commands.append((key, value))
+
+        if commands:
+            # the SRS accepts several commands separated by semicolons, so all changes are sent in a single write
+            command = ';'.join(key + ' ' + str(value) for key, value in commands)
+            error = 0
+            try:
+                self.srs.write(command)
+                # the SRS doesn't answer to set commands, a rejected command only shows up in the error queue. Reading
+                # it costs a round trip, so it is only checked for batches, a single command (e.g. the frequency steps
+                # of a sweep) is sent with a single write as before
+                if len(commands) > 1 or self._CHECK_ERRORS:
+                    error = int(self.srs.query('LERR?'))
+            except Exception:
+                self.clear_state_cache()
+                raise
+            if error != 0:
+                self.clear_state_cache()
+                raise ValueError('SRS rejected "{:s}" with error code {:d}'.format(command, error))
+            # frequency change operation timed using timeit.timeit and
+            # completion confirmed by query('*OPC?'), found delay of <10ms
+            # ER 20180904
+            # if key == 'FREQ':
+            #     print('frequency set to: ', float(self.srs.query('FREQ?')))
+            # print(self.srs.query('*OPC?'))
+            for key, value in commands:
+                self._set_known_value(key, value)
 
         # XXXXX MW ISSUE = END
         # ===========================================
@@ -132,7 +211,7 @@ class MicrowaveGenerator(Instrument):
             'dev_width': 'Width of deviation from center frequency in FM'
         }
 
-    def read_probes(self, key):
+    def _read_probe(self, key):
         # assert hasattr(self, 'srs') #will cause read_probes to fail if connection not yet established, such as when called in init
         assert(self._settings_initialized) #will cause read_probes to fail if settings (and thus also connection) not yet initialized
         assert key in list(self._PROBES.keys())
@@ -141,6 +220,7 @@ class MicrowaveGenerator(Instrument):
         if key in ['enable_output', 'enable_modulation']:
             key_internal = self._param_to_internal(key)
             value = int(self.srs.query(key_internal + '?'))
+            self._set_known_value(key_internal, value)
             if value == 1:
                 value = True
             elif value == 0:
@@ -148,6 +228,7 @@ class MicrowaveGenerator(Instrument):
         elif key in ['modulation_type','modulation_function','pulse_modulation_function']:
             key_internal = self._param_to_internal(key)
             value = int(self.srs.query(key_internal + '?'))
+            self._set_known_value(key_internal, value)
             if key == 'modulation_type':
                 value = self._internal_to_mod_type(value)
             elif key == 'modulation_function':
@@ -157,6 +238,7 @@ class MicrowaveGenerator(Instrument):
         else:
             key_internal = self._param_to_internal(key)
             value = float(self.srs.query(key_internal + '?'))
+            self._set_known_value(key_internal, value)
 
         return value
 
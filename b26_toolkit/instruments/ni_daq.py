@@ -566,17 +566,8 @@ class DAQ(Instrument):
             task['sample_num'] = len(waveform)
             numChannels = 1
         task['task_handle'] = TaskHandle(0)
-        # special case 1D waveform since length(waveform[0]) is undefined
-        # converts python array to ctypes array
-        if len(numpy.shape(waveform)) == 2:
-            data = numpy.zeros((numChannels, task['sample_num']), dtype=numpy.float64)
-            for i in range(numChannels):
-                for j in range(task['sample_num']):
-                    data[i, j] = waveform[i, j]
-        else:
-            data = numpy.zeros((task['sample_num']), dtype=numpy.float64)
-            for i in range(task['sample_num']):
-                data[i] = waveform[i]
+        # converts python array to a contiguous float64 array (full frame galvo waveforms are too long for python loops)
+        data = numpy.array(waveform, dtype=numpy.float64, order='C')
 
         if not (clk_source == ""):
             clk_source = self.tasklist[clk_source]['counter_out_PFI_str']
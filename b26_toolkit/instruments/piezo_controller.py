@@ -16,10 +16,45 @@
     along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import re
 import serial
+import threading
 import numpy as np
 import time as time
+from concurrent.futures import Future
 from pylabcontrol.core import Instrument, Parameter
+from b26_toolkit.instruments.serial_transport import SerialTransport, SerialTimeoutError
+
+# replies end with a line feed (MDT693A) or with the '>' prompt (MDT693B)
+REPLY_TERMINATORS = ('\n', '>')
+# commands that set a value are acknowledged with '*' (MDT693A) or the prompt (MDT693B) and rejected with '!'
+ACKNOWLEDGEMENTS = ('*', '!', '>')
+
+
+def _parse_reply(reply):
+    """
+    extracts the value from a reply of the controller, e.g. '*[ 75.0]\r\n' or '[ 75.00]\r>'
+    Args:
+        reply: reply as str
+
+    Returns: the value as str
+
+    """
+    return reply.strip('\r\n>*! ').strip('[]').strip()
+
+
+def _parse_float(reply):
+    """
+    Args:
+        reply: reply as str
+
+    Returns: the first number in the reply
+
+    """
+    match = re.search(r'[-+]?\d*\.?\d+', reply)
+    if match is None:
+        raise ValueError('could not read a value from the reply {:s}'.format(repr(reply)))
+    return float(match.group(0))
 
 
 class PiezoController(Instrument):
@@ -63,8 +98,8 @@ class PiezoController(Instrument):
 
         """
         self.ser = serial.Serial(port = port, baudrate = baudrate, timeout = timeout)
-        self.ser.write('echo=0\r'.encode()) #disables repetition of input commands in output
-        self.ser.readlines()
+        self.transport = SerialTransport(self.ser, terminators=REPLY_TERMINATORS)
+        self.transport.query('echo=0\r', ACKNOWLEDGEMENTS) #disables repetition of input commands in output
         self._is_connected = True
 
     def update(self, settings):
@@ -110,13 +145,11 @@ class PiezoController(Instrument):
         assert isinstance(key, str)
 
         if key in ['voltage']:
-            self.ser.write((self.settings['axis'] + 'voltage?\r').encode())
-            xVoltage = self.ser.readline()
-            return(float(xVoltage[2:-3].strip()))
+            xVoltage = self.transport.query(self.settings['axis'] + 'voltage?\r')
+            return _parse_float(xVoltage)
         elif key in ['voltage_limit']:
-            self.ser.write(('vlimit?\r').encode())
-            vlimit = self.ser.readline()
-            return vlimit[2:-3].strip()
+            vlimit = self.transport.query('vlimit?\r')
+            return _parse_reply(vlimit)
 
     @property
     def is_connected(self):
@@ -146,16 +179,21 @@ class PiezoController(Instrument):
             voltage: voltage (in V) to set
 
         """
-        self.ser.write((self.settings['axis'] + 'voltage=' + str(voltage) + '\r').encode())
-        successCheck = self.ser.readlines()
-        # print(successCheck)
+        self._write_voltage(voltage)
+
+    def _write_voltage(self, voltage):
+        """
+        sends the voltage to the controller and waits for the acknowledgement
+        Args:
+            voltage: voltage (in V) to set
+
+        """
+        try:
+            successCheck = self.transport.query(self.settings['axis'] + 'voltage=' + str(voltage) + '\r', ACKNOWLEDGEMENTS)
+        except SerialTimeoutError as e:
+            raise SerialTimeoutError('Something went wrong --- check that you are using the right port! ' + str(e))
         # * and ! are values returned by controller on success or failure respectively
-        #if(successCheck[0] == '*'):
-        #    print('Voltage set')
-        if len(successCheck) == 0:
-            message = 'Something went wrong --- check that you are using the right port!'
-            raise ValueError(message)
-        elif successCheck[0] == '!':
+        if successCheck.endswith('!'):
             message = 'Setting voltage failed. Confirm that device is properly connected and a valid voltage was entered'
             raise ValueError(message)
 
@@ -170,34 +208,122 @@ class PiezoControllerCold(PiezoController):
 
     """
 
+    _DEFAULT_SETTINGS = Parameter([
+        Parameter('axis', 'x', ['x', 'y', 'z'], '"x", "y", or "z" axis'),
+        Parameter('port', 'COM9', str, 'serial port on which to connect'),
+        Parameter('baudrate', 115200, int, 'baudrate of connection'),
+        Parameter('timeout', .1, float, 'connection timeout'),
+        Parameter('voltage', 0.0, float, 'current voltage'),
+        Parameter('ramp', [
+            Parameter('slew_rate', 4.0, float, 'speed (in V/s) at which the voltage is ramped'),
+            Parameter('max_step', 1.0, float, 'largest voltage step (in V) sent to the controller')
+        ])
+    ])
+
+    def __init__(self, name = None, settings = None):
+        """
+        Initializes connection to piezo controller. If none found, raises exception.
+        Args:
+            name: instrument name
+            settings: dictionary of settings to override defaults
+        """
+        self._ramp_thread = None
+        self._ramp_cancel = threading.Event()
+        super(PiezoControllerCold, self).__init__(name, settings)
+
     def set_voltage(self, voltage):
         """
-        Sets the voltage on the piezo.
+        Sets the voltage on the piezo. The voltage is ramped with the slew rate in the settings and the function returns
+        once the voltage has been reached. Use ramp_to to ramp in the background.
         Args:
             voltage: voltage (in V) to set
 
         """
+        self.ramp_to(voltage).result()
+
+    def ramp_to(self, voltage, slew_rate = None, max_step = None):
+        """
+        Starts ramping the voltage in a background thread and returns immediately, such that the caller can do other
+        things while the piezo moves. A ramp that is still running is cancelled first.
+        Args:
+            voltage: target voltage (in V)
+            slew_rate: speed of the ramp in V/s, if None the value in the settings is used
+            max_step: largest voltage step in V, if None the value in the settings is used
+
+        Returns: concurrent.futures.Future, result() waits until the ramp is done and returns the final voltage, i.e. the
+            target voltage or, if the ramp has been cancelled, the last voltage that has been set
+
+        """
+        if slew_rate is None:
+            slew_rate = self.settings['ramp']['slew_rate']
+        if max_step is None:
+            max_step = self.settings['ramp']['max_step']
+        assert slew_rate > 0 and max_step > 0
+
+        self.cancel_ramp()
+
+        future = Future()
+        cancel = threading.Event()
+        thread = threading.Thread(target=self._ramp, args=(future, cancel, voltage, slew_rate, max_step),
+                                  name='PiezoControllerColdRamp')
+        thread.daemon = True
+        self._ramp_cancel = cancel
+        self._ramp_thread = thread
+        thread.start()
+
+        return future
+
+    def cancel_ramp(self, wait = True):
+        """
+        stops the ramp that is currently running, the piezo stays at the last voltage that has been set
+        Args:
+            wait: if True, wait until the ramp thread has stopped
+
+        """
+        self._ramp_cancel.set()
+        if wait and self._ramp_thread is not None and self._ramp_thread is not threading.current_thread():
+            self._ramp_thread.join()
+
+    @property
+    def is_ramping(self):
+        """
 
-        current_voltage = self.voltage
+        Returns: True if a ramp is running in the background
 
-        voltage_list = np.linspace(current_voltage, voltage, np.floor(np.abs(voltage-current_voltage)))
+        """
+        return self._ramp_thread is not None and self._ramp_thread.is_alive()
+
+    def _ramp(self, future, cancel, voltage, slew_rate, max_step):
+        """
+        steps the voltage to the target, runs in the ramp thread
+        Args:
+            future: Future that receives the final voltage or the exception
+            cancel: threading.Event that stops the ramp when set
+            voltage: target voltage (in V)
+            slew_rate: speed of the ramp in V/s
+            max_step: largest voltage step in V
 
-        print('voltage_list ', voltage_list)
+        """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            current_voltage = self.read_probes('voltage')
 
-        t_start = time.time()
+            number_of_steps = max(int(np.ceil(np.abs(voltage - current_voltage) / max_step)), 1)
+            step_time = np.abs(voltage - current_voltage) / number_of_steps / slew_rate
 
-        for volts in voltage_list:
             next_time = time.time()
-            self.ser.write((self.settings['axis'] + 'voltage=' + str(volts) + '\r').encode())
-            successCheck = self.ser.readlines()
-            time.sleep(0.25)
-            print('time elapsed: ', time.time()-next_time)
-            if len(successCheck) == 0:
-                message = 'Something went wrong --- check that you are using the right port!'
-                raise ValueError(message)
-            elif successCheck[0] == '!':
-                message = 'Setting voltage failed. Confirm that device is properly connected and a valid voltage was entered'
-                raise ValueError(message)
+            for volts in np.linspace(current_voltage, voltage, number_of_steps + 1)[1:]:
+                # wait on the event rather than sleeping, such that a cancelled ramp stops right away
+                if cancel.wait(max(next_time - time.time(), 0)):
+                    break
+                self._write_voltage(volts)
+                current_voltage = volts
+                next_time += step_time
+
+            future.set_result(current_voltage)
+        except Exception as e:
+            future.set_exception(e)
 
 class MDT693A(Instrument):
     """
@@ -220,7 +346,7 @@ class MDT693A(Instrument):
             name: instrument name
             settings: dictionary of settings to override defaults
         '''
-        super(PiezoController, self).__init__(name, settings)
+        super(MDT693A, self).__init__(name, settings)
         self._is_connected = False
         try:
             self.connect(port = self.settings['port'], baudrate = self.settings['baudrate'], timeout = self.settings['timeout'])
@@ -240,8 +366,8 @@ class MDT693A(Instrument):
 
         '''
         self.ser = serial.Serial(port = port, baudrate = baudrate, timeout = timeout)
-        self.ser.write('echo=0\r'.encode()) #disables repetition of input commands in output
-        self.ser.readlines()
+        self.transport = SerialTransport(self.ser, terminators=REPLY_TERMINATORS)
+        self.transport.query('echo=0\r', ACKNOWLEDGEMENTS) #disables repetition of input commands in output
         self._is_connected = True
 
     def update(self, settings):
@@ -253,7 +379,7 @@ class MDT693A(Instrument):
         Poststate: changes voltage on piezo controller if it is updated
 
         '''
-        super(PiezoController, self).update(settings)
+        super(MDT693A, self).update(settings)
         for key, value in settings.items():
             if key == 'voltage':
                 self.set_voltage(value)
@@ -286,13 +412,11 @@ class MDT693A(Instrument):
         assert isinstance(key, str)
 
         if key in ['voltage']:
-            self.ser.write((self.settings['axis'] + 'voltage?\r').encode())
-            xVoltage = self.ser.readline()
-            return(float(xVoltage[2:-2].strip()))
+            xVoltage = self.transport.query(self.settings['axis'] + 'voltage?\r')
+            return _parse_float(xVoltage)
         elif key in ['voltage_limit']:
-            self.ser.write('vlimit?\r')
-            vlimit = self.ser.readline()
-            return vlimit[2:-3].strip()
+            vlimit = self.transport.query('vlimit?\r')
+            return _parse_reply(vlimit)
 
     @property
     def is_connected(self):
@@ -322,9 +446,21 @@ class MDT693A(Instrument):
             voltage: voltage (in V) to set
 
         '''
-        self.ser.write((self.settings['axis'] + 'voltage=' + str(voltage) + '\r').encode())
-        successCheck = self.ser.readlines()
-        if successCheck[0] == '!':
+        self._write_voltage(voltage)
+
+    def _write_voltage(self, voltage):
+        """
+        sends the voltage to the controller and waits for the acknowledgement
+        Args:
+            voltage: voltage (in V) to set
+
+        """
+        try:
+            successCheck = self.transport.query(self.settings['axis'] + 'voltage=' + str(voltage) + '\r', ACKNOWLEDGEMENTS)
+        except SerialTimeoutError as e:
+            raise SerialTimeoutError('Something went wrong --- check that you are using the right port! ' + str(e))
+        # * and ! are values returned by controller on success or failure respectively
+        if successCheck.endswith('!'):
             message = 'Setting voltage failed. Confirm that device is properly connected and a valid voltage was entered'
             raise ValueError(message)
 
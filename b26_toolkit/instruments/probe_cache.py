@@ -0,0 +1,100 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import time
+
+
+class CachedProbesInstrument(object):
+    """
+    Mixin for instruments whose probes are read repeatedly (e.g. by the GUI) but change slowly. Values that have been
+    read less than the maximum age of the probe ago are returned from memory instead of querying the instrument.
+
+    Use it as the first base class, i.e. class MyInstrument(CachedProbesInstrument, Instrument), implement the
+    communication with the instrument in _read_probe instead of read_probes and declare the maximum age of each probe
+    in _PROBE_MAX_AGE.
+    """
+
+    # maximum age in seconds of a cached probe value, keyed by probe name. Probes that are not listed are not cached
+    _PROBE_MAX_AGE = {}
+
+    def _get_probe_cache(self):
+        # use __dict__ directly, since Instrument.__getattr__ and __setattr__ interpret unknown attributes as probes
+        # and settings
+        if '_probe_cache' not in self.__dict__:
+            self.__dict__['_probe_cache'] = {}
+        return self.__dict__['_probe_cache']
+
+    def read_probes(self, key=None, max_age=None):
+        """
+        reads the probe from memory, if the cached value is recent enough, or otherwise from the instrument
+        Args:
+            key: name of requested value, if None the values of all probes are returned in dictionary form
+            max_age: maximum age in seconds of a cached value, if None the value in _PROBE_MAX_AGE is used,
+                use 0 to force reading the instrument
+
+        Returns: the value of the requested probe or a dictionary with the values of all probes
+
+        """
+        if key is None:
+            return {k: self.read_probes(k, max_age) for k in list(self._PROBES.keys())}
+
+        if max_age is None:
+            max_age = self._PROBE_MAX_AGE.get(key, 0)
+
+        cache = self._get_probe_cache()
+        if max_age > 0 and key in cache:
+            read_time, value = cache[key]
+            if time.time() - read_time <= max_age:
+                return value
+
+        value = self._read_probe(key)
+        cache[key] = (time.time(), value)
+        return value
+
+    def _read_probe(self, key):
+        """
+        reads the value of a single probe from the instrument, this function should be overwritten in any subclass
+        Args:
+            key: name of requested value
+
+        Returns: the value of the requested probe
+        """
+        raise NotImplementedError
+
+    def update(self, settings):
+        """
+        updates the settings and invalidates the cached probes they affect: a setting that is also a probe
+        invalidates that probe, any other setting (e.g. the port) invalidates all probes
+        Args:
+            settings: a dictionary in the standard settings format
+        """
+        super(CachedProbesInstrument, self).update(settings)
+        self.invalidate_probes(list(settings.keys()))
+
+    def invalidate_probes(self, keys=None):
+        """
+        removes values from the probe cache, such that they are read from the instrument the next time
+        Args:
+            keys: names of settings or probes, if None or if any of the keys is not a probe the whole cache is cleared
+        """
+        cache = self._get_probe_cache()
+        if keys is None or any(key not in self._PROBES for key in keys):
+            cache.clear()
+        else:
+            for key in keys:
+                cache.pop(key, None)
@@ -0,0 +1,151 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+
+
+class SerialTimeoutError(IOError):
+    """
+    raised if an instrument does not send the expected reply within the timeout of the serial connection
+    """
+    pass
+
+
+class SerialTransport(object):
+    """
+    Communication with instruments connected to a serial port (pyserial). Replies are read until the terminator or
+    prompt of the instrument has been received, such that a query returns as soon as the reply is complete rather than
+    after the timeout of the connection. Incomplete replies raise a SerialTimeoutError.
+
+    The transport can be shared between threads, each write - read sequence holds the lock of the transport.
+    """
+
+    def __init__(self, connection, terminators=('\n',), encoding='ascii'):
+        """
+        Args:
+            connection: open serial.Serial connection, its timeout is the maximum time to wait for a reply
+            terminators: strings or bytes that terminate a reply, the reply ends with the first one that is received
+            encoding: encoding used to convert str commands to bytes and replies to str. If None, replies are bytes
+        """
+        self.connection = connection
+        self.terminators = terminators
+        self.encoding = encoding
+        self.lock = threading.RLock()
+
+    def _encode(self, data):
+        if isinstance(data, str):
+            return data.encode(self.encoding or 'ascii')
+        return data
+
+    def _decode(self, data):
+        if self.encoding is None:
+            return data
+        return data.decode(self.encoding)
+
+    def write(self, command):
+        """
+        sends a command without waiting for a reply
+        Args:
+            command: command as str or bytes, including the termination expected by the instrument
+        """
+        with self.lock:
+            self.connection.write(self._encode(command))
+
+    def read_reply(self, terminators=None):
+        """
+        reads a reply up to and including the first terminator
+        Args:
+            terminators: terminators of the reply, if None the terminators of the transport are used
+
+        Returns: the reply
+
+        """
+        if terminators is None:
+            terminators = self.terminators
+        terminators = [self._encode(terminator) for terminator in terminators]
+
+        with self.lock:
+            if len(terminators) == 1:
+                data = self.connection.read_until(terminators[0])
+            else:
+                # pyserial only supports a single terminator, so read byte by byte until any of them is received
+                data = b''
+                timeout = self.connection.timeout
+                start_time = time.time()
+                while not any(data.endswith(terminator) for terminator in terminators):
+                    if timeout is not None and time.time() - start_time > timeout:
+                        break
+                    byte = self.connection.read(1)
+                    if not byte:
+                        break
+                    data += byte
+
+        if not any(data.endswith(terminator) for terminator in terminators):
+            raise SerialTimeoutError('no reply terminated by {:s} received from {:s} within {:s} s, received {:s}'.format(
+                ' or '.join(repr(terminator) for terminator in terminators), str(self.connection.port),
+                str(self.connection.timeout), repr(data)))
+
+        return self._decode(data)
+
+    def read_bytes(self, size):
+        """
+        reads a reply of known length
+        Args:
+            size: number of bytes to read
+
+        Returns: the reply
+
+        """
+        with self.lock:
+            data = self.connection.read(size)
+        if len(data) < size:
+            raise SerialTimeoutError('expected {:d} bytes from {:s} within {:s} s, received {:s}'.format(
+                size, str(self.connection.port), str(self.connection.timeout), repr(data)))
+        return self._decode(data)
+
+    def query(self, command, terminators=None):
+        """
+        sends a command and reads the reply, unread data from earlier commands is discarded
+        Args:
+            command: command as str or bytes
+            terminators: terminators of the reply, if None the terminators of the transport are used
+
+        Returns: the reply
+
+        """
+        with self.lock:
+            self.connection.reset_input_buffer()
+            self.write(command)
+            return self.read_reply(terminators)
+
+    def query_all(self, commands, terminators=None):
+        """
+        pipelines several commands: they are sent in a single write and the replies are read afterwards, which saves
+        one round trip per command. Only use this for instruments that buffer commands and reply to each of them.
+        Args:
+            commands: list of commands as str or bytes
+            terminators: terminators of the replies, if None the terminators of the transport are used
+
+        Returns: list with the reply to each command
+
+        """
+        with self.lock:
+            self.connection.reset_input_buffer()
+            self.write(b''.join(self._encode(command) for command in commands))
+            return [self.read_reply(terminators) for _ in commands]
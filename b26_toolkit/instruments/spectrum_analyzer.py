@@ -17,7 +17,7 @@
 """
 
 from pylabcontrol.core import Instrument, Parameter
-import visa
+from b26_toolkit.instruments.visa_sessions import open_resource
 import numpy as np
 import time
 
@@ -67,11 +67,9 @@ class SpectrumAnalyzer(Instrument):
 
         self._last_update_time = time.time()
 
-        rm = visa.ResourceManager()
-
         # todo: JG 20170623 implement proper error handling when instrument is not connected.
         # try:
-        self.spec_anal = rm.open_resource(self.settings['visa_resource'])
+        self.spec_anal = open_resource(self.settings['visa_resource'])
         self.spec_anal.read_termination = '\n'
         self.spec_anal.timeout = self.settings['connection_timeout']
         self.spec_anal.write('*RST') #Places the oscilloscope in the factory default setup state.
@@ -18,9 +18,10 @@
 
 import serial
 from pylabcontrol.core import Instrument, Parameter
+from b26_toolkit.instruments.probe_cache import CachedProbesInstrument
 
 
-class TemperatureController(Instrument):
+class TemperatureController(CachedProbesInstrument, Instrument):
     """
     This class implements the Lakeshore Model 335 Temperature controller. The class communicates with the device over RS232 using pyserial.
     """
@@ -36,6 +37,11 @@ class TemperatureController(Instrument):
 
     _possible_com_ports = ['COM' + str(i) for i in range(0, 256)]
 
+    # maximum age in seconds of cached probe values
+    _PROBE_MAX_AGE = {
+        'temperature': 0.5
+    }
+
     _DEFAULT_SETTINGS = Parameter([
             Parameter('port', 'COM8', _possible_com_ports, 'com port to which the gauge controller is connected'),
             Parameter('timeout', 1.0, float, 'amount of time to wait for a response '
@@ -68,9 +74,9 @@ class TemperatureController(Instrument):
         }
 
     def update(self, settings):
-        super(Instrument, self).update(settings)
+        super(TemperatureController, self).update(settings)
 
-    def read_probes(self, probe_name):
+    def _read_probe(self, probe_name):
         """
         Args:
             probe_name: Name of the probe to get the value of from the Pressure Gauge (e.g., 'pressure')
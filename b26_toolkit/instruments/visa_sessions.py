@@ -0,0 +1,81 @@
+"""
+    This file is part of b26_toolkit, a pylabcontrol add-on for experiments in Harvard LISE B26.
+    Copyright (C) <2016>  Arthur Safira, Jan Gieseler, Aaron Kabcenell
+
+    b26_toolkit is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    b26_toolkit is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+import visa
+import pyvisa.errors
+
+# a single resource manager and one handle per resource are shared by all instruments of the process, since creating
+# a visa.ResourceManager can be very slow (up to minutes on some of the lab computers)
+_resource_manager = None
+_resources = {}
+_lock = threading.RLock()
+
+
+def get_resource_manager():
+    """
+    Returns: the visa.ResourceManager shared by all instruments, it is created on the first call
+    """
+    global _resource_manager
+    with _lock:
+        if _resource_manager is None:
+            _resource_manager = visa.ResourceManager()
+        return _resource_manager
+
+
+def open_resource(resource_name, **attributes):
+    """
+    opens a visa resource or returns the handle that is already open for the same resource name
+
+    Args:
+        resource_name: visa resource name, e.g. 'GPIB0::27::INSTR' or 'COM5'
+        **attributes: attributes that are set on the resource, e.g. baud_rate=115200 or timeout=1000
+
+    Returns: the visa resource
+
+    """
+    with _lock:
+        resource = _resources.get(resource_name)
+        if resource is not None:
+            try:
+                resource.session  # raises InvalidSession if the resource has been closed in the meantime
+            except pyvisa.errors.InvalidSession:
+                resource = None
+        if resource is None:
+            resource = get_resource_manager().open_resource(resource_name)
+            _resources[resource_name] = resource
+        for key, value in attributes.items():
+            setattr(resource, key, value)
+        return resource
+
+
+def close_resource(resource_name):
+    """
+    closes the resource and removes it from the shared handles, the next call to open_resource opens a new session
+
+    Args:
+        resource_name: visa resource name
+
+    """
+    with _lock:
+        resource = _resources.pop(resource_name, None)
+        if resource is not None:
+            try:
+                resource.close()
+            except pyvisa.errors.InvalidSession:
+                pass
@@ -18,6 +18,179 @@
 
 from pylabcontrol.core import Instrument, Parameter
 import numpy as np
+import time
+
+
+def fill_streams(daq, streams, poll_time=0.0, timeout=500):
+    """
+    transfers the samples buffered by the data server into the ring buffers of the streams. A poll returns the samples
+    of all subscribed nodes, so the streams of a connection have to be filled together, otherwise each poll discards
+    the samples of the other streams.
+    Args:
+        daq: connection to the ZI data server
+        streams: all DemodulatorStreams of the connection
+        poll_time: time in seconds to record new samples, 0 only transfers the samples that are already buffered
+        timeout: timeout of the poll in ms
+    """
+    flat_dictionary_key = True
+    data_poll = daq.poll(poll_time, timeout, 1, flat_dictionary_key)
+    for stream in streams:
+        if stream.path in data_poll:
+            sample = data_poll[stream.path]
+            stream.add_samples(sample['timestamp'], sample['x'], sample['y'])
+
+
+class DemodulatorStream(object):
+    """
+    Keeps the subscription to the samples of a demodulator open and collects the samples that the data server has
+    buffered since the last read in a ring buffer. Reading a windowed average therefore doesn't require to subscribe,
+    wait for the stream to start and unsubscribe for each value.
+
+    If several streams share a connection, pass a fill function that fills all of them (see fill_streams and
+    ZIHF2.get_stream).
+    """
+
+    def __init__(self, daq, path, clockbase, buffer_size=2**17, fill_function=None):
+        """
+        Args:
+            daq: connection to the ZI data server
+            path: node of the demodulator samples, e.g. /dev1234/demods/0/sample
+            clockbase: clock frequency of the device, converts the sample timestamps into seconds
+            buffer_size: number of samples that are kept, older samples are overwritten
+            fill_function: function(poll_time, timeout) that fills all streams of the connection, if None the stream
+                polls the connection for itself only
+        """
+        self.daq = daq
+        self.path = path
+        self.clockbase = clockbase
+        self._fill_function = fill_function
+
+        self._time = np.zeros(buffer_size)
+        self._x = np.zeros(buffer_size)
+        self._y = np.zeros(buffer_size)
+        self._index = 0  # position of the next sample in the ring buffer
+        self._count = 0  # number of valid samples in the ring buffer
+
+        self.daq.subscribe(self.path)
+
+    def close(self):
+        """
+        unsubscribes from the demodulator samples
+        """
+        self.daq.unsubscribe(self.path)
+
+    def add_samples(self, timestamps, x, y):
+        """
+        writes new samples to the ring buffer
+        Args:
+            timestamps: timestamps of the samples in clock ticks
+            x: X of the samples
+            y: Y of the samples
+        """
+        buffer_size = len(self._time)
+        n = len(timestamps)
+        if n >= buffer_size:
+            timestamps, x, y = timestamps[-buffer_size:], x[-buffer_size:], y[-buffer_size:]
+            n = buffer_size
+        index = (self._index + np.arange(n)) % buffer_size
+        self._time[index] = np.asarray(timestamps, dtype=float) / self.clockbase
+        self._x[index] = x
+        self._y[index] = y
+        self._index = (self._index + n) % buffer_size
+        self._count = min(self._count + n, buffer_size)
+
+    def fill(self, poll_time=0.0, timeout=500):
+        """
+        transfers the samples buffered by the data server into the ring buffer (and into the ring buffers of the other
+        streams of the connection, if the stream has a fill function)
+        Args:
+            poll_time: time in seconds to record new samples, 0 only transfers the samples that are already buffered
+            timeout: timeout of the poll in ms
+        """
+        if self._fill_function is None:
+            fill_streams(self.daq, [self], poll_time, timeout)
+        else:
+            self._fill_function(poll_time, timeout)
+
+    def clear(self):
+        """
+        discards all samples up to now, e.g. after the settings of the instrument have changed
+        """
+        self.fill()
+        self._count = 0
+
+    @property
+    def last_timestamp(self):
+        """
+        time in seconds of the newest sample in the ring buffer, None if the ring buffer is empty
+        """
+        if self._count == 0:
+            return None
+        return self._time[(self._index - 1) % len(self._time)]
+
+    def _buffered_index(self, min_timestamp=None):
+        """
+        Args:
+            min_timestamp: if not None, only samples newer than this time in seconds are considered
+
+        Returns: positions in the ring buffer of the valid samples in chronological order
+        """
+        buffer_size = len(self._time)
+        index = (self._index - self._count + np.arange(self._count)) % buffer_size
+        if min_timestamp is not None:
+            index = index[self._time[index] > min_timestamp]
+        return index
+
+    def get_samples(self, duration, min_timestamp=None):
+        """
+        Args:
+            duration: length of the window in seconds
+            min_timestamp: if not None, only samples newer than this time in seconds are returned
+
+        Returns: time, X and Y of the samples in the ring buffer that are not older than duration relative to the
+            newest sample, in chronological order
+        """
+        index = self._buffered_index(min_timestamp)
+        t = self._time[index]
+        if len(t) > 0:
+            index = index[t >= t[-1] - duration]
+        return self._time[index], self._x[index], self._y[index]
+
+    def covers(self, duration, min_timestamp=None):
+        """
+        Args:
+            duration: length of the window in seconds
+            min_timestamp: if not None, only samples newer than this time in seconds are considered
+
+        Returns: True if the ring buffer holds a sample at or before the start of the window that ends with the newest
+            sample, i.e. the samples returned by get_samples span the duration up to one sample period
+
+        """
+        t = self._time[self._buffered_index(min_timestamp)]
+        return len(t) > 0 and t[0] <= t[-1] - duration
+
+    def read(self, duration, timeout=500, min_timestamp=None):
+        """
+        returns the most recent samples that cover the duration, waits for new samples if the ring buffer doesn't
+        cover the duration yet
+
+        Note that the samples can have been recorded before the call, set min_timestamp (e.g. to last_timestamp before
+        changing a setting) to only accept samples that are recorded later.
+        Args:
+            duration: length of the window in seconds
+            timeout: maximum time in ms to wait on top of the duration
+            min_timestamp: if not None, only samples newer than this time in seconds are returned
+
+        Returns: time, X and Y of the samples
+        """
+        self.fill()
+        deadline = time.time() + duration + timeout / 1000.
+        # stop waiting once the ring buffer is full, it can't cover a longer duration
+        while not self.covers(duration, min_timestamp) and self._count < len(self._time) and time.time() < deadline:
+            t = self.get_samples(duration, min_timestamp)[0]
+            missing_time = duration if len(t) == 0 else duration - (t[-1] - t[0])
+            self.fill(missing_time, timeout)
+        return self.get_samples(duration, min_timestamp)
 
 
 # =============== ZURCIH INSTRUMENTS =======================
@@ -98,6 +271,9 @@ https://www.zhinst.com/sites/default/files/LabOneProgrammingManual_34390_1.pdf
        #  self.daq = self.utils.autoConnect(8006,1) # connect to ZI, 0014 is the port number
         self.device = self.utils.autoDetect(self.daq)
         self.options = self.daq.getByte('/%s/features/options' % self.device)
+        self.clockbase = float(self.daq.getInt('/%s/clockbase' % self.device))
+        # open streams of demodulator samples, keyed by demodulator channel
+        self._streams = {}
 
         super(ZIHF2, self).__init__(name, settings)
         # apply all settings to instrument
@@ -185,6 +361,9 @@ https://www.zhinst.com/sites/default/files/LabOneProgrammingManual_34390_1.pdf
                 self.daq.set(commands)
             except RuntimeError:
                 print(('runtime error. commands\n{:s}'.format(commands)))
+            # samples recorded with the old settings are no longer valid
+            for stream in self._streams.values():
+                stream.clear()
         else:
             print('hardware is not connected, the command to be send is:')
             print(commands)
@@ -222,15 +401,48 @@ https://www.zhinst.com/sites/default/files/LabOneProgrammingManual_34390_1.pdf
         return self._is_connected
 
 
-    # Poll the value of input 1 for polltime seconds and return the magnitude of the average data. Timeout is in milisecond.
-    def poll(self,  variable = 'R', demod_c = 0, pollTime = 0.1, timeout = 500):
+    def get_stream(self, demod_c = 0):
+        """
+        returns the stream of samples of the demodulator, the subscription is opened on the first call and stays open
+        until close_streams is called
+        Args:
+            demod_c: demodulator channel
+
+        Returns: DemodulatorStream
+
+        """
+        if demod_c not in self._streams:
+            path = '/%s/demods/%d/sample' % (self.device, demod_c)
+            self._streams[demod_c] = DemodulatorStream(self.daq, path, self.clockbase,
+                                                       fill_function=self._fill_streams)
+        return self._streams[demod_c]
+
+    def _fill_streams(self, poll_time=0.0, timeout=500):
+        """
+        fills all open demodulator streams with a single poll (see fill_streams)
+        """
+        fill_streams(self.daq, list(self._streams.values()), poll_time, timeout)
+
+    def close_streams(self):
+        """
+        unsubscribes from all demodulator streams
+        """
+        for stream in self._streams.values():
+            stream.close()
+        self._streams.clear()
+
+    # Average the value of input 1 over the last polltime seconds and return the magnitude of the average data. Timeout is in milisecond.
+    def poll(self,  variable = 'R', demod_c = 0, pollTime = 0.1, timeout = 500, new_samples_only = False):
         """
 
         Args:
             variable: string or list of strings, which varibale to poll ('R', 'x', 'y')
             demod_c:
-            pollTime: integration time
+            pollTime: integration time, the average is taken over the most recent samples that cover this time
             timeout: 0.1s could be varibale in the future
+            new_samples_only: if True, only samples recorded after the call are averaged. Otherwise samples that the
+                data server buffered before the call can be included, the settings changed with update are not
+                affected since update discards the buffered samples
 
         Returns: requested value from instrument as a dictionary {varible: array of values}
 
@@ -240,13 +452,13 @@ https://www.zhinst.com/sites/default/files/LabOneProgrammingManual_34390_1.pdf
         valid_variables = ['R','X','Y']
 
         if self.is_connected:
-            path = '/%s/demods/%d/sample' % (self.device, demod_c)
-            self.daq.subscribe(path)
-            flat_dictionary_key = True
-            data_poll = self.daq.poll(pollTime,timeout,1,flat_dictionary_key)
-            data = {}
-            for var in ['X','Y']:
-                data.update({var: data_poll[path][var.lower()]})
+            stream = self.get_stream(demod_c)
+            min_timestamp = None
+            if new_samples_only:
+                stream.fill()
+                min_timestamp = stream.last_timestamp
+            _, x, y = stream.read(pollTime, timeout, min_timestamp)
+            data = {'X': x, 'Y': y}
             data.update({'R': np.sqrt(np.square(data['X'])+np.square(data['Y']))})
 
             if isinstance(variable,str):
@@ -257,4 +469,4 @@ https://www.zhinst.com/sites/default/files/LabOneProgrammingManual_34390_1.pdf
         else:
             return_variable = None
 
-        return return_variable
\ No newline at end of file
+        return return_variable
@@ -16,32 +16,71 @@
     along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-# # from test_script import ScriptTest
-from .galvo_scan.galvo_scan import GalvoScan
-from .galvo_scan.galvo_scan_photodiode import GalvoScanPhotodiode
-from .set_laser import SetLaser
-from .daq_read_counter import Daq_Read_Counter
-from .take_image_camera import TakeImage
-from .esr import ESR
-from .esr_dithering import ESR_FM_Dither
-from .esr_two_freq_continuous import ESRTwoFreqContinuous
-from .spec_analyzer_get_spectrum import SpecAnalyzerGetSpectrum
-from .zi_sweeper import ZISweeper
-from .zi_high_res_sweep import ZISweeperHighResolution
-from .find_nv import FindNV
-from .atto_scan import AttoStep
-# # from .pulse_sequences import XY8_k, T1, Rabi, PDD, XY4, T1SingleInit, PulsedESR, \
-# #     HahnEcho, XY4, XYXY, ReadoutStartTimeWithoutMW, ReadoutStartTime, ReadoutDuration, CPMG, \
-# #     HahnEchoManyNVs, RabiPowerSweepSingleTau
-from .pulse_sequences.rabi import Rabi
-from .esr_and_rabi import ESRAndRabi
-# from .spec_analyzer_get_spectrum import KeysightGetSpectrum
-from .light_control import ApplyLightControlSettings, CameraOn
-from .correlate_images import Track_Correlate_Images, Take_And_Correlate_Images
-from .autofocus import AutoFocusDAQ, AutoFocusTwoPoints, AutoFocusTwoPointsFR, AutoFocusDaqSMC, AutoFocusCameraSMC, AutoFocusDAQCold
-from .record_pressures import RecordPressures
-from .set_magnetic_coils import SetMagneticCoils
-from .align_magnetic_field_to_NV import AlignFieldToNV
-from .Ni_9263_polarization_controller import Ni9263_BalancePolarization
-from .stability_with_microwaves import Stability_With_Microwaves
-from .read_temperature_lakeshore import ReadTemperatureLakeshore
\ No newline at end of file
+import sys
+from importlib import import_module
+
+# public classes and the modules they are defined in, the modules are imported on first access
+_CLASSES = {
+    # # from test_script import ScriptTest
+    'GalvoScan': '.galvo_scan.galvo_scan',
+    'GalvoScanFrame': '.galvo_scan.galvo_scan',
+    'GalvoScanPhotodiode': '.galvo_scan.galvo_scan_photodiode',
+    'SetLaser': '.set_laser',
+    'Daq_Read_Counter': '.daq_read_counter',
+    'TakeImage': '.take_image_camera',
+    'ESR': '.esr',
+    'ESR_Adaptive': '.esr',
+    'ESR_FM_Dither': '.esr_dithering',
+    'ESRTwoFreqContinuous': '.esr_two_freq_continuous',
+    'SpecAnalyzerGetSpectrum': '.spec_analyzer_get_spectrum',
+    'ZISweeper': '.zi_sweeper',
+    'ZISweeperHighResolution': '.zi_high_res_sweep',
+    'FindNV': '.find_nv',
+    'AttoStep': '.atto_scan',
+    # # from .pulse_sequences import XY8_k, T1, Rabi, PDD, XY4, T1SingleInit, PulsedESR, \
+    # #     HahnEcho, XY4, XYXY, ReadoutStartTimeWithoutMW, ReadoutStartTime, ReadoutDuration, CPMG, \
+    # #     HahnEchoManyNVs, RabiPowerSweepSingleTau
+    'Rabi': '.pulse_sequences.rabi',
+    'ESRAndRabi': '.esr_and_rabi',
+    # from .spec_analyzer_get_spectrum import KeysightGetSpectrum
+    'ApplyLightControlSettings': '.light_control',
+    'CameraOn': '.light_control',
+    'Track_Correlate_Images': '.correlate_images',
+    'Take_And_Correlate_Images': '.correlate_images',
+    'AutoFocusDAQ': '.autofocus',
+    'AutoFocusTwoPoints': '.autofocus',
+    'AutoFocusTwoPointsFR': '.autofocus',
+    'AutoFocusDaqSMC': '.autofocus',
+    'AutoFocusCameraSMC': '.autofocus',
+    'AutoFocusDAQCold': '.autofocus',
+    'RecordPressures': '.record_pressures',
+    'SetMagneticCoils': '.set_magnetic_coils',
+    'AlignFieldToNV': '.align_magnetic_field_to_NV',
+    'Ni9263_BalancePolarization': '.Ni_9263_polarization_controller',
+    'Stability_With_Microwaves': '.stability_with_microwaves',
+    'ReadTemperatureLakeshore': '.read_temperature_lakeshore',
+}
+
+__all__ = list(_CLASSES)
+
+
+def __getattr__(name):
+    """
+    imports the class name from its module on first access (PEP 562), such that importing the package doesn't load
+    all the drivers and their libraries
+    """
+    if name in _CLASSES:
+        value = getattr(import_module(_CLASSES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {:s} has no attribute {:s}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_CLASSES))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ is not supported, import everything
+    for _name in _CLASSES:
+        __getattr__(_name)
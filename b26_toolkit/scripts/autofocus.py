@@ -48,12 +48,19 @@ Autofocus: Takes images at different piezo voltages and uses a heuristic to figu
         Parameter('scan_width', 5, float, 'distance (in V or mm) between the minimum and maximum points of the range'),
         Parameter('num_sweep_points', 10, int, 'number of values to sweep between min and max voltage'),
         Parameter('focusing_optimizer', 'standard_deviation',
-                  ['mean', 'standard_deviation', 'normalized_standard_deviation'], 'optimization function for focusing'),
+                  ['mean', 'standard_deviation', 'normalized_standard_deviation', 'sharpness'], 'optimization function for focusing'),
         Parameter('wait_time', 0.1, float),
         Parameter('use_current_z_axis_position', False, bool, 'Overrides z axis center position and instead uses the current piezo voltage as the center of the range'),
         Parameter('center_on_current_location', False, bool, 'Check to use current galvo location rather than center point in take_image'),
         Parameter('galvo_return_to_initial', False, bool, 'Check to return galvo location to initial value (before calling autofocus)'),
-        Parameter('reverse_scan', False, bool, 'If true, scans from highest value to lowest')
+        Parameter('reverse_scan', False, bool, 'If true, scans from highest value to lowest'),
+        Parameter('search_method', 'sweep', ['sweep', 'golden_section'], 'sweep: take images at num_sweep_points evenly spaced positions and fit a Gaussian. \
+                                                                        golden_section: bracket the maximum of the focusing optimizer within the scan width'),
+        Parameter('golden_section',
+                  [Parameter('tolerance', 0.1, float, 'stop once the bracket is narrower than this (in V or mm)'),
+                   Parameter('max_evaluations', 15, int, 'maximum number of images'),
+                   Parameter('image_points', 0, int, 'if larger than 0, reduce the number of x and y points of take_image to this during the search (galvo scans only)')
+                   ])
         # Parameter('galvo_position', 'take_image_pta', ['take_image', 'current_location', 'last_run'], 'select galvo location (center point in acquire_image, current location of galvo or location from previous run)')
     ]
 
@@ -119,6 +126,43 @@ Autofocus: Takes images at different piezo voltages and uses a heuristic to figu
                 return np.std(image)
             elif optimizer == 'normalized_standard_deviation':
                 return np.std(image) / np.mean(image)
+            elif optimizer == 'sharpness':
+                # mean squared gradient, normalized such that it does not depend on the overall brightness
+                gradient_y, gradient_x = np.gradient(np.array(image, dtype=float))
+                return np.mean(np.square(gradient_x) + np.square(gradient_y)) / np.mean(image) ** 2
+
+        def measure_focus(voltage, index):
+            """
+            sets the z position, takes an image and evaluates the focusing optimizer
+            Args:
+                voltage: z position
+                index: index of the image, used for saving
+
+            Returns: focusing optimizer of the image
+
+            """
+            self.init_image()
+
+            # set the voltage on the piezo
+            self._step_piezo(voltage, self.settings['wait_time'])
+            self.log('take scan, position {:0.2f}'.format(voltage))
+            # update the tag of the suvbscript to reflect the current z position
+            take_image_tag = self.scripts['take_image'].settings['tag']
+            self.scripts['take_image'].settings['tag'] = '{:s}_{:0.2f}'.format(take_image_tag, voltage)
+            # take a galvo scan
+            self.scripts['take_image'].run()
+            self.scripts['take_image'].settings['tag'] = take_image_tag
+            self.data['current_image'] = deepcopy(self.scripts['take_image'].data['image_data'])
+
+            # save image if the user requests it
+            if self.settings['save_images']:
+                self.scripts['take_image'].save_image_to_disk(
+                    '{:s}\\image_{:03d}.jpg'.format(self.filename_image, index))
+                self.scripts['take_image'].save_data('{:s}\\image_{:03d}.csv'.format(self.filename_image, index),
+                                                     'image_data')
+
+            # calculate focusing function for this sweep
+            return calc_focusing_optimizer(self.data['current_image'], self.settings['focusing_optimizer'])
 
         def autofocus_loop(sweep_voltages):
             """
@@ -129,42 +173,59 @@ Autofocus: Takes images at different piezo voltages and uses a heuristic to figu
             Returns:
 
             """
-            # update instrument
-
-            take_image_tag = self.scripts['take_image'].settings['tag']
-
             for index, voltage in enumerate(sweep_voltages):
 
                 if self._abort:
                     self.log('Leaving autofocusing loop')
                     break
 
-                self.init_image()
+                self.data['focus_function_result'].append(measure_focus(voltage, index))
 
-                # set the voltage on the piezo
-                self._step_piezo(voltage, self.settings['wait_time'])
-                self.log('take scan, position {:0.2f}'.format(voltage))
-                # update the tag of the suvbscript to reflect the current z position
-                self.scripts['take_image'].settings['tag'] = '{:s}_{:0.2f}'.format(take_image_tag, voltage)
-                # take a galvo scan
-                self.scripts['take_image'].run()
-                self.data['current_image'] = deepcopy(self.scripts['take_image'].data['image_data'])
+                self.progress = 100. * index / len(sweep_voltages)
+                self.updateProgress.emit(self.progress if self.progress < 100 else 99)
 
-                # calculate focusing function for this sweep
-                self.data['focus_function_result'].append(
-                    calc_focusing_optimizer(self.data['current_image'], self.settings['focusing_optimizer']))
+        def golden_section_search(min_voltage, max_voltage):
+            """
+            finds the maximum of the focusing optimizer with a golden section search, which shrinks the bracket
+            [min_voltage, max_voltage] by a factor 0.618 with every image
+            Args:
+                min_voltage: lower end of the initial bracket
+                max_voltage: upper end of the initial bracket
 
-                # save image if the user requests it
-                if self.settings['save_images']:
-                    self.scripts['take_image'].save_image_to_disk(
-                        '{:s}\\image_{:03d}.jpg'.format(self.filename_image, index))
-                    self.scripts['take_image'].save_data('{:s}\\image_{:03d}.csv'.format(self.filename_image, index),
-                                                         'image_data')
+            Returns: position with the largest focusing optimizer
 
-                self.progress = 100. * index / len(sweep_voltages)
+            """
+            inverse_phi = (np.sqrt(5) - 1) / 2
+            max_evaluations = max(self.settings['golden_section']['max_evaluations'], 2)
+
+            def evaluate(voltage):
+                index = len(self.data['sweep_voltages'])
+                self.data['sweep_voltages'].append(voltage)
+                self.data['focus_function_result'].append(measure_focus(voltage, index))
+                self.progress = 100. * (index + 1) / max_evaluations
                 self.updateProgress.emit(self.progress if self.progress < 100 else 99)
+                return self.data['focus_function_result'][-1]
 
-            self.scripts['take_image'].settings['tag'] = take_image_tag
+            a, b = min_voltage, max_voltage
+            c, d = b - inverse_phi * (b - a), a + inverse_phi * (b - a)
+            f_c, f_d = evaluate(c), evaluate(d)
+
+            while b - a > self.settings['golden_section']['tolerance'] and len(self.data['sweep_voltages']) < max_evaluations:
+                if self._abort:
+                    self.log('Leaving autofocusing loop')
+                    break
+                if f_c > f_d:
+                    # maximum is in [a, d]
+                    b, d, f_d = d, c, f_c
+                    c = b - inverse_phi * (b - a)
+                    f_c = evaluate(c)
+                else:
+                    # maximum is in [c, b]
+                    a, c, f_c = c, d, f_d
+                    d = a + inverse_phi * (b - a)
+                    f_d = evaluate(d)
+
+            return float(self.data['sweep_voltages'][int(np.argmax(self.data['focus_function_result']))])
 
 
         if self.settings['save'] or self.settings['save_images']:
@@ -191,10 +252,26 @@ Autofocus: Takes images at different piezo voltages and uses a heuristic to figu
         self.data['current_image'] = np.zeros([1,1])
         self.data['extent'] = None
 
+        if self.settings['search_method'] == 'golden_section':
+            # the positions are added as they are evaluated
+            self.data['sweep_voltages'] = []
+
+            # smaller images are sufficient to compare the focus
+            num_points = deepcopy(self.scripts['take_image'].settings.get('num_points'))
+            if self.settings['golden_section']['image_points'] > 0 and num_points is not None:
+                self.scripts['take_image'].settings['num_points'].update({
+                    'x': self.settings['golden_section']['image_points'],
+                    'y': self.settings['golden_section']['image_points']})
+            try:
+                piezo_voltage = golden_section_search(min_voltage, max_voltage)
+            finally:
+                if num_points is not None:
+                    self.scripts['take_image'].settings['num_points'].update(num_points)
+            self.data['sweep_voltages'] = np.array(self.data['sweep_voltages'])
+        else:
+            autofocus_loop(sweep_voltages)
 
-        autofocus_loop(sweep_voltages)
-
-        piezo_voltage, self.data['fit_parameters'] = self.fit_focus()
+            piezo_voltage, self.data['fit_parameters'] = self.fit_focus()
 
         # set piezo value to the fit value if this is within the bounds of the piezo
         if piezo_voltage and piezo_voltage>0 and piezo_voltage<100:
@@ -304,7 +381,9 @@ Autofocus: Takes images at different piezo voltages and uses a heuristic to figu
             sweep_voltages = data['sweep_voltages']
             if len(focus_data)>0:
                 axis_focus.clear()  # ER 20181016 - axis.hold removed from old version of matplotlib
-                axis_focus.plot(sweep_voltages[0:len(focus_data)],focus_data)
+                # the golden section search does not evaluate the positions in order
+                order = np.argsort(sweep_voltages[0:len(focus_data)])
+                axis_focus.plot(np.array(sweep_voltages[0:len(focus_data)])[order], np.array(focus_data)[order], '.-')
                 if not (np.array_equal(data['fit_parameters'], [0,0,0,0])):
                     axis_focus.plot(sweep_voltages[0:len(focus_data)], self.gaussian(sweep_voltages[0:len(focus_data)], *self.data['fit_parameters']), 'k')
 #                axis_focus.hold(False)
@@ -350,7 +429,8 @@ Autofocus: Takes images at different piezo voltages and uses a heuristic to figu
         sweep_voltages = self.data['sweep_voltages']
         if len(focus_data) > 0:
             axis_focus.clear() #ER 20181016 - axis.hold removed from old version of matplotlib
-            axis_focus.plot(sweep_voltages[0:len(focus_data)], focus_data)
+            order = np.argsort(sweep_voltages[0:len(focus_data)])
+            axis_focus.plot(np.array(sweep_voltages[0:len(focus_data)])[order], np.array(focus_data)[order], '.-')
 
     def gaussian(self, x, noise, amp, center, width):
         return (noise + amp * np.exp(-1.0 * (np.square((x - center)) / (2 * (width ** 2)))))
@@ -603,6 +683,10 @@ class AutoFocusDAQNVTracking(AutoFocusDAQ):
         self.scripts['take_image'].settings['point_a'] = self.scripts['find_NV'].data['maximum_point']
 
 class AutoFocusTwoPoints(AutoFocusDAQ):
+    # compares two focusing measures along the same sweep, so only the sweep search is supported
+    _DEFAULT_SETTINGS = [p for p in AutoFocusGeneric._DEFAULT_SETTINGS
+                         if list(p.keys())[0] not in ['search_method', 'golden_section']]
+
     _SCRIPTS = {
         'take_image': GalvoScan,
         'take_image_2': GalvoScan
@@ -811,6 +895,9 @@ class AutoFocusTwoPoints(AutoFocusDAQ):
         return (noise + amp * np.exp(-1.0 * (np.square((x - center)) / (2 * (width ** 2)))))
 
 class AutoFocusTwoPointsFR(AutoFocusDaqSMC):
+    # compares two focusing measures along the same sweep, so only the sweep search is supported
+    _DEFAULT_SETTINGS = AutoFocusTwoPoints._DEFAULT_SETTINGS
+
     _INSTRUMENTS = {
         'z_driver': SMC100,
         'filter_wheel': MaestroLightControl
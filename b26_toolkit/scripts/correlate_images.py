@@ -16,7 +16,7 @@
     along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from b26_toolkit.data_processing import correlation, shift_NVs
+from b26_toolkit.data_processing import ImageCorrelator
 from b26_toolkit.plotting.plots_2d import plot_fluorescence_new, update_fluorescence
 from pylabcontrol.core import Script, Parameter
 from b26_toolkit.scripts import GalvoScan
@@ -49,6 +49,7 @@ class Take_And_Correlate_Images(Script):
         Script.__init__(self, name, settings = settings, instruments = instruments, scripts = scripts, log_function= log_function, data_path = data_path)
 
         self.data = {'baseline_image': [], 'new_image': [], 'image_extent': [], 'correlation_image': []}
+        self.correlator = None
 
     def _function(self):
         """
@@ -75,9 +76,14 @@ class Take_And_Correlate_Images(Script):
 
             self.data['new_image'] = self.scripts['GalvoScan'].data['image_data']
 
-            dx_voltage, dy_voltage, self.data['correlation_image'] = correlation(self.data['baseline_image'],
-                                                   self.data['image_extent'], self.data['new_image'],
-                                                   self.data['image_extent'], use_trackpy=self.settings['use_trackpy'])
+            # the correlator caches the baseline, rebuild it only when the baseline or the settings change
+            if self.correlator is None or self.correlator.baseline_image is not self.data['baseline_image'] \
+                    or self.correlator.use_trackpy != self.settings['use_trackpy']:
+                self.correlator = ImageCorrelator(self.data['baseline_image'], self.data['image_extent'],
+                                                  use_trackpy=self.settings['use_trackpy'])
+
+            dx_voltage, dy_voltage, self.data['correlation_image'], _ = self.correlator.find_shift(
+                self.data['new_image'], self.data['image_extent'])
 
             self.data['shift'] = [dx_voltage, dy_voltage]
             print((self.data['shift']))
@@ -156,6 +162,7 @@ Track_Correlate_Images:
         self.baseline_processed_image = self.data['baseline_image']
         self.new_processed_image = self.data['new_image']
         self.count_executions = 0 # counts how often the script has been updated
+        self.correlator = None # correlates new images with the cached baseline image
 
     def _function(self):
         """
@@ -196,11 +203,15 @@ Track_Correlate_Images:
             self.data['new_image_extent'] = deepcopy(self.scripts['take_new_image'].data['extent'])
 
 
-            dx_voltage, dy_voltage, self.data['correlation_image'], self.baseline_processed_image, self.new_processed_image = correlation(self.data['baseline_image'],
-                                                                                 self.data['baseline_extent'], self.data['new_image'],
-                                                                                 self.data['new_image_extent'], use_trackpy=use_trackpy,
-                                                                                 use_edge_detection=use_edge_detection
-                                                                                 )
+            # the correlator caches the baseline, rebuild it only when the baseline or the mode change
+            if self.correlator is None or self.correlator.baseline_image is not self.data['baseline_image'] \
+                    or self.correlator.use_trackpy != use_trackpy or self.correlator.use_edge_detection != use_edge_detection:
+                self.correlator = ImageCorrelator(self.data['baseline_image'], self.data['baseline_extent'],
+                                                  use_trackpy=use_trackpy, use_edge_detection=use_edge_detection)
+            self.baseline_processed_image = self.correlator.baseline_processed_image
+
+            dx_voltage, dy_voltage, self.data['correlation_image'], self.new_processed_image = self.correlator.find_shift(
+                self.data['new_image'], self.data['new_image_extent'])
             self.data['shift'] = np.array((dx_voltage, dy_voltage))
 
             if baseline_update_frequency > 0 and self.count_executions % baseline_update_frequency == 0:
@@ -17,6 +17,7 @@
 # """
 
 from pylabcontrol.core import Script, Parameter
+from b26_toolkit.core.background_saving import BackgroundSavingScript
 
 # import standard libraries
 import numpy as np
@@ -25,7 +26,7 @@ from b26_toolkit.scripts.spec_analyzer_get_spectrum import SpecAnalyzerGetSpectr
 from b26_toolkit.plotting.plots_1d import plot_esr
 
 # from b26_toolkit.plotting.plots_1d import plot_diff_freq_vs_freq
-from b26_toolkit.data_processing.esr_signal_processing import fit_esr
+from b26_toolkit.data_processing.esr_signal_processing import fit_esr, get_esr_peaks, get_adaptive_freq_array
 import time
 import random
 
@@ -669,7 +670,7 @@ class ESR_simple(Script):
         return super(ESR_simple, self).get_axes_layout(new_figure_list)
 
 # re-written by ER 20180831 to enable esr without frequency modulation
-class ESR(Script):
+class ESR(BackgroundSavingScript, Script):
     """
     This class runs ESR on an NV center, outputing microwaves using a MicrowaveGenerator and reading in NV counts using
     a DAQ. Each frequency is set explicitly on the SRS, instead of using FM.
@@ -700,6 +701,7 @@ class ESR(Script):
                       Parameter('ai_channel', 'ai4', ['ai0', 'ai1', 'ai2', 'ai3', 'ai4'], 'channel to use for analog input, to which the photodiode is connected')
                   ]),
         Parameter('randomize', True, bool, 'check to randomize esr frequencies'),
+        Parameter('data_format', 'csv', ['csv', 'hdf5'], 'file format of the data, hdf5 writes all data into a single compressed file (requires h5py)'),
     ]
 
     _INSTRUMENTS = {
@@ -1391,6 +1393,144 @@ class ESR_2(ESR):
 
         return single_sweep_data, single_sweep_laser_data
 
+
+class ESR_Adaptive(ESR):
+    """
+    This class runs ESR on an NV center, outputing microwaves using a MicrowaveGenerator and reading in NV counts using
+    a DAQ. Each frequency is set explicitly on the SRS, instead of using FM.
+
+    The first adaptive/coarse_avg averages are taken on the uniform frequency grid. The dips found in this coarse scan
+    are then used to build a non-uniform frequency grid that is dense around the resonances and sparse on the baseline,
+    which is used for the remaining averages.
+    """
+
+    _DEFAULT_SETTINGS = ESR._DEFAULT_SETTINGS + [
+        Parameter('adaptive',
+                  [
+                      Parameter('coarse_avg', 5, int, 'number of averages on the uniform grid before refining'),
+                      Parameter('points_per_peak', 50, int, 'number of frequencies around each dip in the refined grid'),
+                      Parameter('peak_range', 3., float, 'half width of the refined window around each dip in units of the fitted fwhm'),
+                      Parameter('baseline_points', 20, int, 'number of uniformly spaced frequencies kept for the baseline in the refined grid'),
+                      Parameter('default_fwhm', 5e6, float, 'width (Hz) assumed for the dips if the fit of the coarse scan fails')
+                  ])
+    ]
+
+    def get_refined_freq_array(self, freq_values, esr_avg, fit_params):
+        '''
+
+        Construct the refined frequency array from the coarse scan.
+
+        Args:
+            freq_values: frequencies of the coarse scan
+            esr_avg: averaged data of the coarse scan
+            fit_params: fit parameters of the coarse scan
+
+        Returns:
+            freq_values: array of the frequencies to be tested, the coarse grid if no dip was found
+        '''
+
+        centers, fwhm = get_esr_peaks(freq_values, esr_avg, fit_params, self.settings['adaptive']['default_fwhm'])
+
+        if len(centers) == 0:
+            self.log('no dip found in coarse scan, continue with uniform frequency grid')
+            return freq_values
+
+        self.log('refining frequency grid around {:s} Hz'.format(', '.join(['{:0.4e}'.format(c) for c in centers])))
+
+        return get_adaptive_freq_array(min(freq_values), max(freq_values), centers, fwhm,
+                                       points_per_peak=self.settings['adaptive']['points_per_peak'],
+                                       peak_range=self.settings['adaptive']['peak_range'],
+                                       baseline_points=self.settings['adaptive']['baseline_points'])
+
+    def _function(self):
+        """
+        This is the actual function that will be executed. It uses only information that is provided in the settings property
+        will be overwritten in the __init__
+        """
+
+        start_time = time.time()
+
+        if self.settings['track_laser_power']['on/off']:
+            self.log('tracking laser power drifts not supported for adaptive esr')
+            self._abort = True
+
+        take_ref = self.settings['norm_to_ref']
+        coarse_avg = min(max(self.settings['adaptive']['coarse_avg'], 1), self.settings['esr_avg'])
+
+        self.setup_daq()
+        self.setup_microwave_gen()
+        self.setup_pb()
+
+        self.data = {'frequency': [], 'data': [], 'fit_params': [], 'avrg_counts': []}
+
+        freq_values, freq_range = self.get_freq_array()
+        self.data.update({'frequency': freq_values})
+
+        esr_data = np.zeros((coarse_avg, len(freq_values)))
+        avrg_counts = np.zeros(self.settings['esr_avg'])
+
+        # number of completed averages on the current frequency grid
+        grid_avg = 0
+
+        for scan_num in range(0, self.settings['esr_avg']):
+
+            if self._abort:
+                break
+
+            if scan_num == coarse_avg:
+                # the coarse scan is done, switch to the refined frequency grid
+                self.data.update({'coarse_frequency': freq_values, 'coarse_data': esr_avg,
+                                  'coarse_fit_params': fit_params})
+                freq_values = self.get_refined_freq_array(freq_values, esr_avg, fit_params)
+                esr_data = np.zeros((self.settings['esr_avg'] - coarse_avg, len(freq_values)))
+                grid_avg = 0
+                self.data.update({'frequency': freq_values})
+
+            self.log('starting average number: ' + str(scan_num) + ' time elapsed: ' + str(time.time()-start_time))
+            single_sweep_data, _ = self.run_sweep(freq_values)
+
+            # save the single sweep data and normalize to kcounts/sec
+            esr_data[grid_avg] = single_sweep_data * (.001 / self.settings['integration_time'])
+
+            # weight by the local point spacing, since on the refined grid the plain mean would be biased towards the dips
+            avrg_counts[scan_num] = np.average(esr_data[grid_avg], weights=np.gradient(freq_values))
+
+            if take_ref is True:
+                esr_data[grid_avg] /= avrg_counts[scan_num]
+
+            grid_avg += 1
+            esr_avg = np.mean(esr_data[0:grid_avg], axis=0)
+
+            fit_params = fit_esr(freq_values, esr_avg, min_counts=self.settings['fit_constants']['minimum_counts'],
+                                 contrast_factor=self.settings['fit_constants']['contrast_factor'])
+
+            self.data.update({'data': esr_avg, 'fit_params': fit_params, 'avrg_counts': avrg_counts})
+
+            if self.settings['save_full_esr']:
+                self.data.update({'esr_data': esr_data[0:grid_avg]})
+
+            progress = self._calc_progress(scan_num)
+            self.updateProgress.emit(progress)
+
+        self.instruments['PB']['instance'].update({'microwave_switch': {'status': False}})
+
+        if self.settings['turn_off_after']:
+            self.instruments['microwave_generator']['instance'].update({'enable_output': False})
+
+    def _plot(self, axes_list, data = None):
+        """
+        plotting function for esr
+        Args:
+            axes_list: list of axes objects on which to plot plots the esr on the first axes object
+            data: data (dictionary that contains keys frequency, data and fit_params) if not provided use self.data
+        Returns:
+
+        """
+
+        if data is None:
+            data = self.data
+        plot_esr(axes_list[0], data['frequency'], data['data'], data['fit_params'])
+
 # re-written by ER 20180904 to check the ESR code.
 class ESR_Spec_Ana(Script):
     """
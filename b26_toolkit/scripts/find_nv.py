@@ -22,6 +22,7 @@ import numpy as np
 import trackpy as tp
 from matplotlib import patches
 
+from b26_toolkit.data_processing.fit_functions import fit_gaussian, gaussian
 from b26_toolkit.plotting.plots_2d import plot_fluorescence_new
 from pylabcontrol.core import Script, Parameter
 from b26_toolkit.scripts.galvo_scan.galvo_scan import GalvoScan
@@ -32,6 +33,7 @@ class FindNV(Script):
     """
 GalvoScan uses the apd, daq, and galvo to sweep across voltages while counting photons at each voltage,
 resulting in an image in the current field of view of the objective.
+In crosshair mode only short x and y line scans through the initial point are taken, which is much faster for tracking.
 
 Known issues:
     1.) if fits are poor, check  sweep_range. It should extend significantly beyond end of NV on both sides.
@@ -47,7 +49,17 @@ Known issues:
         Parameter('nv_size', 11, int, 'TEMP: size of nv in pixels - need to be refined!!'),
         Parameter('min_mass', 180, int, 'TEMP: brightness of nv - need to be refined!!'),
         Parameter('number_of_attempts', 1, int, 'Number of times to decrease min_mass if an NV is not found'),
-        Parameter('center_on_current_location', False, bool, 'Check to use current galvo location rather than ')
+        Parameter('center_on_current_location', False, bool, 'Check to use current galvo location rather than '),
+        Parameter('mode', 'image', ['image', 'crosshair'], 'image: locate the NV in a full galvo image. \
+                                                           crosshair: fit Gaussians to x and y line scans through the \
+                                                           initial point, falls back to the full image if this fails'),
+        Parameter('crosshair',
+                  [Parameter('sweep_range', .015, float, 'voltage range of each line scan'),
+                   Parameter('num_points', 21, int, 'number of points of each line scan'),
+                   Parameter('max_iterations', 3, int, 'maximum number of x and y line scan pairs'),
+                   Parameter('tolerance', .001, float, 'stop once the point moves less than this between iterations (V)'),
+                   Parameter('min_snr', 3., float, 'minimum ratio of the fitted amplitude to the fit residuals')
+                   ])
     ]
 
     _INSTRUMENTS = {}
@@ -109,6 +121,13 @@ Known issues:
             #COMMENT_ME
             return (min_mass - 20)
 
+        if self.settings['mode'] == 'crosshair':
+            if self.track_crosshair():
+                self.scripts['set_laser'].settings['point'].update(self.data['maximum_point'])
+                self.scripts['set_laser'].run()
+                return
+            self.log('FindNV crosshair tracking failed --- taking full image instead')
+
         self.scripts['take_image'].settings['point_a'].update({'x': self.settings['initial_point']['x'], 'y': self.settings['initial_point']['y']})
         self.scripts['take_image'].settings['point_b'].update({'x': self.settings['sweep_range'], 'y': self.settings['sweep_range']})
         self.scripts['take_image'].update({'RoI_mode': 'center'})
@@ -157,8 +176,102 @@ Known issues:
         self.scripts['set_laser'].run()
 
 
+    @staticmethod
+    def fit_line_scan(positions, counts, min_snr):
+        """
+        fits a Gaussian to a line scan through an NV
+        Args:
+            positions: galvo voltages of the line scan
+            counts: counts at each position
+            min_snr: minimum ratio of the fitted amplitude to the standard deviation of the fit residuals
+
+        Returns: fit parameters [constant_offset, amplitude, center, width] or None if the fit is not valid
+
+        """
+        span = max(positions) - min(positions)
+        start_vals = [np.min(counts), np.max(counts) - np.min(counts), positions[np.argmax(counts)], span / 6.]
+        try:
+            fit_params = fit_gaussian(positions, counts, starting_params=start_vals)
+        except (ValueError, TypeError):
+            return None
+
+        constant_offset, amplitude, center, width = fit_params
+        if amplitude <= 0 or width == 0 or abs(width) > span or not min(positions) <= center <= max(positions):
+            return None
+        if amplitude < min_snr * np.std(counts - gaussian(positions, *fit_params)):
+            return None
+
+        return fit_params
+
+    def line_scan(self, point, axis):
+        """
+        takes a line scan through point along axis
+        Args:
+            point: center of the line scan, dictionary with keys x and y
+            axis: 'x' or 'y'
+
+        Returns: positions, counts
+
+        """
+        sweep_range = self.settings['crosshair']['sweep_range']
+        num_points = self.settings['crosshair']['num_points']
+
+        self.scripts['take_image'].settings['point_a'].update({'x': point['x'], 'y': point['y']})
+        self.scripts['take_image'].settings['point_b'].update({'x': sweep_range if axis == 'x' else 0.,
+                                                               'y': sweep_range if axis == 'y' else 0.})
+        self.scripts['take_image'].update({'RoI_mode': 'center'})
+        self.scripts['take_image'].settings['num_points'].update({'x': num_points if axis == 'x' else 1,
+                                                                  'y': num_points if axis == 'y' else 1})
+        self.scripts['take_image'].run()
+
+        positions = np.linspace(point[axis] - sweep_range / 2., point[axis] + sweep_range / 2., num_points)
+        counts = np.array(self.scripts['take_image'].data['image_data']).flatten()
+
+        return positions, counts
+
+    def track_crosshair(self):
+        """
+        finds the NV with alternating x and y line scans through the current point, each fitted with a Gaussian,
+        until the point converges. Updates maximum_point and fluorescence in self.data
+
+        Returns: True if successful, False if a fit failed or the point did not converge
+
+        """
+        point = {'x': float(self.settings['initial_point']['x']), 'y': float(self.settings['initial_point']['y'])}
+
+        for iteration in range(self.settings['crosshair']['max_iterations']):
+            if self._abort:
+                return False
+
+            previous_point = deepcopy(point)
+            for axis in ['x', 'y']:
+                positions, counts = self.line_scan(point, axis)
+                self.data.update({axis + '_line_positions': positions, axis + '_line_counts': counts})
+                fit_params = self.fit_line_scan(positions, counts, self.settings['crosshair']['min_snr'])
+                if fit_params is None:
+                    return False
+                point[axis] = float(fit_params[2])
+
+            self.data['maximum_point'] = point
+            self.data['fluorescence'] = fit_params[0] + fit_params[1]
+
+            if np.linalg.norm([point['x'] - previous_point['x'], point['y'] - previous_point['y']]) < self.settings['crosshair']['tolerance']:
+                return True
+
+        return False
+
     @staticmethod
     def plot_data(axes_list, data):
+        if len(data['image_data']) == 0 and 'x_line_counts' in data:
+            # crosshair tracking, there is no image so plot the line scans instead
+            axes_list[0].clear()
+            axes_list[0].plot(data['x_line_positions'], data['x_line_counts'], 'b.-', label='x')
+            axes_list[0].plot(data['y_line_positions'], data['y_line_counts'], 'g.-', label='y')
+            axes_list[0].set_xlabel('galvo voltage (V)')
+            axes_list[0].set_ylabel('kcounts/sec')
+            axes_list[0].legend()
+            return
+
         plot_fluorescence_new(data['image_data'], data['extent'], axes_list[0])
 
         initial_point = data['initial_point']
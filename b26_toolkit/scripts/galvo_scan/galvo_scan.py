@@ -50,7 +50,8 @@ class GalvoScan(GalvoScanGeneric):
                     Parameter('counter_channel', 'ctr0', ['ctr0', 'ctr1', 'ctr2', 'ctr3'], 'Daq channel used for counter')
                   ]),
         Parameter('ending_behavior', 'return_to_start', ['return_to_start', 'return_to_origin', 'leave_at_corner'], 'return to the corn'),
-        Parameter('daq_type', 'PCI', ['PCI', 'cDAQ'], 'Type of daq to use for scan')
+        Parameter('daq_type', 'PCI', ['PCI', 'cDAQ'], 'Type of daq to use for scan'),
+        Parameter('data_format', 'csv', ['csv', 'hdf5'], 'file format of the data, hdf5 writes all data into a single compressed file (requires h5py)')
     ]
 
     _INSTRUMENTS = {'NI6259':  NI6259, 'NI9263': NI9263, 'NI9402': NI9402}
@@ -141,21 +142,19 @@ class GalvoScan(GalvoScanGeneric):
         aotask = self.daq_out.setup_AO([self.settings['DAQ_channels']['x_ao_channel']],
                                        self.x_array, ctrtask)
 
-        # start counter and scanning sequence
-        self.daq_out.run(aotask)
-        self.daq_in.run(ctrtask)
-        self.daq_out.waitToFinish(aotask)
-        self.daq_out.stop(aotask)
-        xLineData, _ = self.daq_in.read(ctrtask)
-        self.daq_in.stop(ctrtask)
+        # start counter and scanning sequence, the tasks are cleared even if the acquisition fails
+        try:
+            self.daq_out.run(aotask)
+            self.daq_in.run(ctrtask)
+            self.daq_out.waitToFinish(aotask)
+            xLineData, _ = self.daq_in.read(ctrtask)
+        finally:
+            self.daq_out.stop(aotask)
+            self.daq_in.stop(ctrtask)
         diffData = np.diff(xLineData)
 
-        summedData = np.zeros(int(len(self.x_array) / self.clockAdjust))
-        for i in range(0, int((len(self.x_array) / self.clockAdjust))):
-            summedData[i] = np.sum(
-                diffData[(i * self.clockAdjust + 1):(i * self.clockAdjust + self.clockAdjust - 1)])
         # also normalizing to kcounts/sec
-        return(summedData * (.001 / self.settings['time_per_pt']))
+        return self.bin_data(diffData, self.clockAdjust) * (.001 / self.settings['time_per_pt'])
 
     def get_galvo_location(self):
         """
@@ -189,6 +188,94 @@ class GalvoScan(GalvoScanGeneric):
         self.daq_out.waitToFinish(task)
         self.daq_out.stop(task)
 
+
+class GalvoScanFrame(GalvoScan):
+    """
+    GalvoScanFrame acquires the full image in a single hardware transaction. The x and y waveforms for the whole image,
+    including the flyback between lines, are uploaded to the DAQ at once and clocked against a single counter task.
+    With bidirectional scanning every other line is scanned backwards, which removes the x flyback.
+    """
+
+    _DEFAULT_SETTINGS = GalvoScan._DEFAULT_SETTINGS + [
+        Parameter('bidirectional', False, bool, 'if true scan every other line backwards (serpentine scan)'),
+        Parameter('flyback_time', .002, float, 'time in s to move the galvo from the end of a line to the start of the next line')
+    ]
+
+    _ACQ_TYPE = 'frame'
+
+    @staticmethod
+    def get_frame_waveform(x_array, y_array, flyback_pts, bidirectional=False):
+        """
+        calculates the galvo waveform for a full frame
+        Args:
+            x_array: x voltages of a single line, each point repeated clockAdjust times
+            y_array: y voltages of the lines
+            flyback_pts: number of samples used to move between lines
+            bidirectional: if true every other line is scanned backwards
+
+        Returns:
+            waveform: 2D array with the x (first row) and y (second row) voltages
+            line_starts: index of the first sample of each line in the waveform
+
+        """
+        x_segments, y_segments, line_starts = [], [], []
+        x_end, y_end = x_array[0], y_array[0]
+        num_samples = 0
+        for y_num, y_pos in enumerate(y_array):
+            x_line = x_array[::-1] if bidirectional and y_num % 2 == 1 else x_array
+
+            # linear ramp from the end of the previous line to the start of this line
+            ramp = np.linspace(0, 1, flyback_pts + 1)[1:]
+            x_segments += [x_end + (x_line[0] - x_end) * ramp, x_line]
+            y_segments += [y_end + (y_pos - y_end) * ramp, np.full(len(x_line), y_pos)]
+
+            line_starts.append(num_samples + flyback_pts)
+            num_samples += flyback_pts + len(x_line)
+            x_end, y_end = x_line[-1], y_pos
+
+        return np.vstack((np.concatenate(x_segments), np.concatenate(y_segments))), np.array(line_starts)
+
+    def read_frame(self):
+        """
+        reads the full image from the DAQ
+
+        Returns: image data, 2D array of shape (num_points y, num_points x) in kcounts/sec
+
+        """
+        flyback_pts = max(int(self.settings['flyback_time'] / self.settings['settle_time']), 1)
+        waveform, line_starts = self.get_frame_waveform(self.x_array, self.y_array, flyback_pts,
+                                                        self.settings['bidirectional'])
+
+        # move galvo to first point of the frame
+        self.daq_out.set_analog_voltages(
+            {self.settings['DAQ_channels']['x_ao_channel']: waveform[0, 0],
+             self.settings['DAQ_channels']['y_ao_channel']: waveform[1, 0]})
+
+        ctrtask = self.daq_in.setup_counter(self.settings['DAQ_channels']['counter_channel'], waveform.shape[1] + 1)
+        aotask = self.daq_out.setup_AO([self.settings['DAQ_channels']['x_ao_channel'],
+                                        self.settings['DAQ_channels']['y_ao_channel']], waveform, ctrtask)
+
+        # the tasks are cleared even if the acquisition fails
+        try:
+            self.daq_out.run(aotask)
+            self.daq_in.run(ctrtask)
+            self.daq_out.waitToFinish(aotask)
+            frame_data, _ = self.daq_in.read(ctrtask)
+        finally:
+            self.daq_out.stop(aotask)
+            self.daq_in.stop(ctrtask)
+        diffData = np.diff(frame_data)
+
+        # pick out the samples of each line, dropping the flyback
+        line_data = diffData[line_starts[:, np.newaxis] + np.arange(len(self.x_array))]
+        image_data = self.bin_data(line_data, self.clockAdjust)
+
+        if self.settings['bidirectional']:
+            image_data[1::2] = image_data[1::2, ::-1]
+
+        # also normalizing to kcounts/sec
+        return image_data * (.001 / self.settings['time_per_pt'])
+
 if __name__ == '__main__':
     script, failed, instruments = Script.load_and_append(script_dict={'GalvoScan': 'GalvoScan'})
 
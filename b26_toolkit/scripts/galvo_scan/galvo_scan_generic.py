@@ -21,8 +21,9 @@ import time
 from b26_toolkit.instruments import NI6259
 from b26_toolkit.plotting.plots_2d import plot_fluorescence_new, update_fluorescence
 from pylabcontrol.core import Script, Parameter
+from b26_toolkit.core.background_saving import BackgroundSavingScript
 
-class GalvoScanGeneric(Script):
+class GalvoScanGeneric(BackgroundSavingScript, Script):
     """
     GalvoScan uses the apd, daq, and galvo to sweep across voltages while counting photons at each voltage,
     resulting in an image in the current field of view of the objective.
@@ -52,13 +53,14 @@ class GalvoScanGeneric(Script):
         #             Parameter('y_ao_channel', 'ao3', ['ao0', 'ao1', 'ao2', 'ao3'], 'Daq channel used for y voltage analog output'),
         #             Parameter('counter_channel', 'ctr0', ['ctr0', 'ctr1'], 'Daq channel used for counter')
         #           ]),
-        Parameter('ending_behavior', 'return_to_start', ['return_to_start', 'return_to_origin', 'leave_at_corner'], 'return to the corn')
+        Parameter('ending_behavior', 'return_to_start', ['return_to_start', 'return_to_origin', 'leave_at_corner'], 'return to the corn'),
+        Parameter('data_format', 'csv', ['csv', 'hdf5'], 'file format of the data, hdf5 writes all data into a single compressed file (requires h5py)')
     ]
 
     _INSTRUMENTS = {}
     _SCRIPTS = {}
 
-    _ACQ_TYPE = 'line' #this defines if the galvo acquisition is line by line or point by point, the default is line
+    _ACQ_TYPE = 'line' #this defines if the galvo acquisition is line by line, point by point or the full frame at once, the default is line
 
     def __init__(self, instruments, name=None, settings=None, log_function=None, data_path=None):
         '''
@@ -117,6 +119,12 @@ class GalvoScanGeneric(Script):
 
         Nx, Ny = self.settings['num_points']['x'], self.settings['num_points']['y']
 
+        if self._ACQ_TYPE == 'frame':
+            # the full image is acquired in a single hardware timed task, the line loop below does nothing in this case
+            self.data['image_data'] = self.read_frame()
+            self.progress = 100.
+            self.updateProgress.emit(int(self.progress))
+
         for yNum in range(0, Ny):
 
             if self._ACQ_TYPE == 'line':
@@ -181,6 +189,33 @@ class GalvoScanGeneric(Script):
         """
         raise NotImplementedError
 
+    @staticmethod
+    def bin_data(data, clock_adjust, function=np.sum):
+        """
+        bins the data along the last axis in bins of clock_adjust samples, the first and last sample of each bin are
+        dropped since the galvo is still settling
+        Args:
+            data: array whose last axis holds clock_adjust samples per point, additional samples at the end are ignored
+            clock_adjust: number of samples per point
+            function: function that reduces the samples of a bin, e.g. np.sum or np.mean
+
+        Returns: binned data, with the last axis reduced by a factor clock_adjust
+
+        """
+        data = np.asarray(data)
+        num_points = data.shape[-1] // clock_adjust
+        data = data[..., :num_points * clock_adjust].reshape(data.shape[:-1] + (num_points, clock_adjust))
+        return function(data[..., 1:clock_adjust - 1], axis=-1)
+
+    def read_frame(self):
+        """
+        reads the full image from the DAQ, this function is used if _ACQ_TYPE = 'frame'
+
+        Returns: image data, 2D array of shape (num_points y, num_points x)
+
+        """
+        raise NotImplementedError
+
     def read_point(self, x_pos, y_pos):
         """
         reads a line of data from the DAQ, this function is used if _ACQ_TYPE = 'point'
@@ -372,11 +407,8 @@ class GalvoScanDAQ(GalvoScanGeneric):
         self.instruments['daq']['instance'].DI_stop()
         diffData = np.diff(xLineData)
 
-        summedData = np.zeros(len(self.x_array) / self.clockAdjust)
-        for i in range(0, int((len(self.x_array) / self.clockAdjust))):
-            summedData[i] = np.sum(diffData[(i * self.clockAdjust + 1):(i * self.clockAdjust + self.clockAdjust - 1)])
         # also normalizing to kcounts/sec
-        return summedData * (.001 / self.settings['time_per_pt'])
+        return self.bin_data(diffData, self.clockAdjust) * (.001 / self.settings['time_per_pt'])
 
 
 
@@ -176,13 +176,7 @@ class GalvoScanPhotodiode(GalvoScanGeneric): # ER 20181221
         self.daq_in.stop(clktask)
       #  diffData = np.diff(xLineData)
 
-        meanData = np.zeros(int(len(self.x_array) / self.clockAdjust))
-        for i in range(0, int((len(self.x_array) / self.clockAdjust))):
-            meanData[i] = np.mean(
-               xLineData[(i * self.clockAdjust + 1):(i * self.clockAdjust + self.clockAdjust - 1)])
-               # diffData[(i * self.clockAdjust + 1):(i * self.clockAdjust + self.clockAdjust - 1)])
-        # also normalizing to kcounts/sec
-        return meanData
+        return self.bin_data(xLineData, self.clockAdjust, np.mean)
 
     def get_galvo_location(self):
         """
@@ -17,6 +17,7 @@
 """
 
 import itertools
+import time
 from copy import deepcopy
 
 import numpy as np
@@ -24,14 +25,16 @@ import numpy as np
 from b26_toolkit.scripts import FindNV, ESR
 from b26_toolkit.instruments import NI6259, NI9402, B26PulseBlaster, Pulse, MicrowaveGenerator
 from b26_toolkit.plotting.plots_1d import plot_1d_simple_timetrace_ns, plot_pulses, update_pulse_plot, update_1d_simple
+from b26_toolkit.data_processing.drift_estimation import DriftEstimator
 from pylabcontrol.core import Script, Parameter
+from b26_toolkit.core.background_saving import BackgroundSavingScript
 import random
 
 MAX_AVERAGES_PER_SCAN = 100000  # 1E5, the max number of loops per point allowed at one time (true max is ~4E6 since
                                  #pulseblaster stores this value in 22 bits in its register
 
 
-class PulsedExperimentBaseScript(Script):
+class PulsedExperimentBaseScript(BackgroundSavingScript, Script):
     """
 This class is a base class that should be inherited by all classes that utilize the pulseblaster for experiments. The
 _function part of this class takes care of high-level interaction with the pulseblaster for experiment control and optionally
@@ -44,7 +47,13 @@ for a given experiment
         Parameter('Tracking', [
             Parameter('on/off', True, bool, 'used to turn on tracking'),
             Parameter('threshold', 0.85, float, 'threshold for tracking'),
-            Parameter('init_fluor', 20., float, 'initial fluorescence of the NV to compare to, in kcps')
+            Parameter('init_fluor', 20., float, 'initial fluorescence of the NV to compare to, in kcps'),
+            Parameter('drift_model', [
+                Parameter('on/off', False, bool, 'predict the NV drift from previous tracking results, move the laser accordingly and also track when the prediction becomes too uncertain'),
+                Parameter('max_uncertainty', .002, float, 'track to the NV when the uncertainty of the predicted position exceeds this (V)'),
+                Parameter('measurement_noise', .0005, float, 'uncertainty of the position found by find_nv (V)'),
+                Parameter('process_noise', 1e-7, float, 'random change of the drift velocity (V/s/sqrt(s))')
+            ])
         ]),
         Parameter('ESR_Tracking', [
             Parameter('on/off', False, bool, 'turn on to track NV ESR'),
@@ -59,6 +68,7 @@ for a given experiment
             Parameter('no_iq_overlap', True, bool,'Toggle to check for overlapping i q output. In general i and q channels should not be on simultaneously.')
         ]),
         Parameter('daq_type', 'PCI', ['PCI', 'cDAQ'], 'daq to be used for pulse sequence'),
+        Parameter('data_format', 'csv', ['csv', 'hdf5'], 'file format of the data, hdf5 writes all data into a single compressed file (requires h5py)'),
     ]
     _INSTRUMENTS = {'NI6259': NI6259, 'NI9402': NI9402, 'PB': B26PulseBlaster}
 
@@ -155,11 +165,15 @@ for a given experiment
         (num_1E5_avg_pb_programs, remainder) = divmod(self.num_averages, MAX_AVERAGES_PER_SCAN)
         # run find_nv if tracking is on ER 5/30/2017
         if self.settings['Tracking']['on/off']:
+            self.drift_estimator = DriftEstimator(
+                measurement_noise=self.settings['Tracking']['drift_model']['measurement_noise'],
+                process_noise=self.settings['Tracking']['drift_model']['process_noise'])
             self.scripts['find_nv'].run()
             if self.scripts['find_nv'].data['fluorescence'] == 0.0: # if it doesn't find an NV, abort the experiment
                 self.log('Could not find an NV in FindNV.')
                 self._abort = True
                 return  # exit function in case no NV is found
+            self._update_drift_model()
 
         self.log("Averaging over {0} blocks of 1e5".format(num_1E5_avg_pb_programs))
         for average_loop in range(int(num_1E5_avg_pb_programs)):
@@ -314,13 +328,51 @@ for a given experiment
             # track to the NV if necessary ER 5/31/17
             if self.settings['Tracking']['on/off']:
                 if (1+(1-self.settings['Tracking']['threshold']))*self.settings['Tracking']['init_fluor'] < counts_temp or \
-                        self.settings['Tracking']['threshold']*self.settings['Tracking']['init_fluor'] > counts_temp:
+                        self.settings['Tracking']['threshold']*self.settings['Tracking']['init_fluor'] > counts_temp or \
+                        not self._apply_drift_model():
                     if verbose:
                         print('TRACKING TO NV...')
                     self.scripts['find_nv'].run()
                     self.scripts['find_nv'].settings['initial_point'] = self.scripts['find_nv'].data['maximum_point']
+                    self._update_drift_model()
             self.updateProgress.emit(self._calc_progress(index))
 
+    def _update_drift_model(self):
+        '''
+        Adds the position found by find_nv to the drift model, if the drift model is on and find_nv found an NV
+
+        '''
+        if not self.settings['Tracking']['drift_model']['on/off'] or self.scripts['find_nv'].data['fluorescence'] == 0.0:
+            return
+
+        maximum_point = self.scripts['find_nv'].data['maximum_point']
+        self.drift_estimator.update(time.time(), [maximum_point['x'], maximum_point['y']])
+
+    def _apply_drift_model(self):
+        '''
+        Moves the laser to the NV position predicted by the drift model (feed-forward)
+
+        Returns: False if the predicted position is too uncertain and the NV should be tracked, True otherwise
+        (always True if the drift model is off)
+
+        '''
+        if not self.settings['Tracking']['drift_model']['on/off']:
+            return True
+
+        position, uncertainty = self.drift_estimator.predict(time.time())
+        if uncertainty > self.settings['Tracking']['drift_model']['max_uncertainty']:
+            return False
+
+        # only move if the predicted position changed noticeably since the last time the laser was set
+        current_point = self.scripts['find_nv'].settings['initial_point']
+        if np.linalg.norm(position - [current_point['x'], current_point['y']]) > self.settings['Tracking']['drift_model']['measurement_noise']:
+            predicted_point = {'x': float(position[0]), 'y': float(position[1])}
+            self.scripts['find_nv'].scripts['set_laser'].settings['point'].update(predicted_point)
+            self.scripts['find_nv'].scripts['set_laser'].run()
+            self.scripts['find_nv'].settings['initial_point'] = predicted_point
+
+        return True
+
     def _run_single_sequence(self, pulse_sequence, num_loops, num_daq_reads):
         '''
         Runs a single pulse sequence, num_loops consecutive times
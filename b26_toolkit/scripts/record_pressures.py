@@ -15,7 +15,11 @@
     You should have received a copy of the GNU General Public License
     along with b26_toolkit.  If not, see <http://www.gnu.org/licenses/>.
 """
+import csv
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 from b26_toolkit.plotting.plots_1d import plot_1d_simple_timetrace_ns, update_1d_simple
@@ -24,11 +28,57 @@ from pylabcontrol.core import Script, Parameter
 from b26_toolkit.instruments import ChamberPressureGauge, PumpLinePressureGauge, TemperatureController
 from b26_toolkit.instruments import CryoStation
 
+class CircularBuffer(object):
+    """
+    Preallocated buffer that keeps the most recent values of a set of columns, such that long recordings don't grow the
+    memory. Rows are counted from the start of the recording, which allows to get the rows that have been added since a
+    given row, e.g. to write them to disk.
+    """
+
+    def __init__(self, columns, length):
+        """
+        Args:
+            columns: dictionary with the column names as keys and the numpy dtype of the column as values
+            length: number of rows that are kept
+        """
+        self.length = length
+        self._data = {column: np.empty(length, dtype=dtype) for column, dtype in columns.items()}
+        self.total = 0  # number of rows that have been added since the start
+
+    def append(self, row):
+        """
+        Args:
+            row: dictionary with a value for each column
+        """
+        index = self.total % self.length
+        for column, values in self._data.items():
+            values[index] = row[column]
+        self.total += 1
+
+    def get(self, column, start=0):
+        """
+        Args:
+            column: name of the column
+            start: number of the first row, rows that have already been overwritten are skipped
+
+        Returns: the values of the rows from start to the newest row in chronological order
+        """
+        start = max(start, self.total - self.length)
+        index = np.arange(start, self.total) % self.length
+        return self._data[column][index]
+
+
 class RecordPressures(Script):
-    # COMMENT_ME
+    """
+    Records the pressures, the temperature of the Lakeshore controller and the temperatures of the cryostation. The
+    instruments are read in parallel and each reading has its own timestamp. The most recent points are kept in memory,
+    all points are written to a log file in the data folder every flush_interval.
+    """
 
     _DEFAULT_SETTINGS = [
         Parameter('time_interval', 60.0, float, 'Time between points (s)'),
+        Parameter('buffer_length', 10000, int, 'number of points kept in memory, older points are only in the log file'),
+        Parameter('flush_interval', 600.0, float, 'time between writes of new points to the log file (s)'),
     ]
 
     _INSTRUMENTS = {
@@ -49,46 +99,119 @@ class RecordPressures(Script):
         """
         Script.__init__(self, name, settings = settings, instruments = instruments, log_function= log_function, data_path=data_path)
 
-    def _function(self):
+    def _get_readers(self):
         """
-        This is the actual function that will be executed. It uses only information that is provided in the settings property
-        will be overwritten in the __init__
+        Returns: dictionary with the instrument names as keys and a tuple (names of the values, function that reads
+            the values from the instrument) as values
         """
-
         chamber_gauge = self.instruments['chamber_pressure_gauge']['instance']
         pump_line_gauge = self.instruments['pump_line_pressure_gauge']['instance']
         temp_controller = self.instruments['temp_controller']['instance']
         cryo_station = self.instruments['cryo_station']['instance']
 
-        self.data['time'] = []
-        self.data['chamber_pressures'] = []
-        self.data['pump_line_pressures'] = []
-        self.data['temperatures'] = []
-        self.data['temperatures_raw'] = []
-        self.data['Platform_Temp'] = []
-        self.data['Stage_1_Temp'] = []
-        self.data['Stage_2_Temp'] = []
-
-        time_index = 0
-
-        while not self._abort:
-            self.data['chamber_pressures'].append(chamber_gauge.pressure)
-            self.data['pump_line_pressures'].append(pump_line_gauge.pressure)
-            temp, raw = temp_controller.temperature
-            self.data['temperatures'].append(temp)
-            self.data['temperatures_raw'].append(raw)
-
-            self.data['Platform_Temp'].append(cryo_station.Platform_Temp)
-            self.data['Stage_1_Temp'].append(cryo_station.stage_1_temp)
-            self.data['Stage_2_Temp'].append(cryo_station.stage_2_temp)
-
-
-            self.data['time'].append(time_index * self.settings['time_interval'])
-            time_index += 1
-            self.force_update()
-            self.progress = 50
-            self.updateProgress.emit(int(self.progress))
-            time.sleep(self.settings['time_interval'])
+        return {
+            'chamber_pressure_gauge': (['chamber_pressures'], lambda: [chamber_gauge.pressure]),
+            'pump_line_pressure_gauge': (['pump_line_pressures'], lambda: [pump_line_gauge.pressure]),
+            'temp_controller': (['temperatures', 'temperatures_raw'], lambda: list(temp_controller.temperature)),
+            'cryo_station': (['Platform_Temp', 'Stage_1_Temp', 'Stage_2_Temp'],
+                             lambda: [cryo_station.Platform_Temp, cryo_station.stage_1_temp, cryo_station.stage_2_temp])
+        }
+
+    @staticmethod
+    def _read(read_function):
+        """
+        reads an instrument, runs in a worker thread
+        Args:
+            read_function: function that returns the values of the instrument
+
+        Returns: the values and the time at which they have been read
+        """
+        values = read_function()
+        return values, time.time()
+
+    def _flush(self, filename, columns, start):
+        """
+        appends the rows that have been recorded since start to the log file
+        Args:
+            filename: path of the log file
+            columns: names of the columns
+            start: number of the first row to write
+
+        Returns: number of the next row to write
+        """
+        write_header = not os.path.exists(filename)
+        with open(filename, 'a', newline='') as log_file:
+            writer = csv.writer(log_file)
+            if write_header:
+                writer.writerow(columns)
+            writer.writerows(zip(*[self._buffer.get(column, start) for column in columns]))
+        return self._buffer.total
+
+    def _function(self):
+        """
+        This is the actual function that will be executed. It uses only information that is provided in the settings property
+        will be overwritten in the __init__
+        """
+
+        readers = self._get_readers()
+
+        # the time of each point plus the values and the time of the reading of each instrument
+        columns = ['time']
+        column_types = {'time': float}
+        for name, (keys, _) in readers.items():
+            columns += keys + [name + '_time']
+            column_types.update({key: float for key in keys})
+            column_types[name + '_time'] = float
+        column_types['temperatures_raw'] = object
+
+        self._buffer = CircularBuffer(column_types, self.settings['buffer_length'])
+
+        if self.settings['save']:
+            log_filename = self.filename('-log.csv', create_if_not_existing=True)
+        else:
+            log_filename = None
+        flushed_rows = 0
+        last_flush_time = time.time()
+
+        start_time = time.time()
+
+        # one worker per instrument, such that the duration of a point is given by the slowest instrument rather than
+        # the sum of all instruments
+        with ThreadPoolExecutor(max_workers=len(readers)) as executor:
+            while not self._abort:
+                point_time = time.time()
+                futures = {name: executor.submit(self._read, read_function) for name, (_, read_function) in readers.items()}
+
+                row = {'time': point_time - start_time}
+                for name, future in futures.items():
+                    keys = readers[name][0]
+                    try:
+                        values, read_time = future.result()
+                    except Exception as e:
+                        self.log('reading {:s} failed: {:s}'.format(name, str(e)))
+                        values, read_time = [np.nan] * len(keys), np.nan
+                    row.update(zip(keys, values))
+                    row[name + '_time'] = read_time - start_time
+                self._buffer.append(row)
+
+                self.data = {column: self._buffer.get(column) for column in columns}
+
+                # write to disk periodically and before points that haven't been written yet are overwritten
+                if log_filename is not None and (time.time() - last_flush_time > self.settings['flush_interval']
+                                                 or self._buffer.total - flushed_rows >= self._buffer.length):
+                    flushed_rows = self._flush(log_filename, columns, flushed_rows)
+                    last_flush_time = time.time()
+
+                self.force_update()
+                self.progress = 50
+                self.updateProgress.emit(int(self.progress))
+
+                # wait for the next point, but stay responsive to abort
+                while not self._abort and time.time() < point_time + self.settings['time_interval']:
+                    time.sleep(min(0.1, max(point_time + self.settings['time_interval'] - time.time(), 0)))
+
+        if log_filename is not None and self._buffer.total > flushed_rows:
+            self._flush(log_filename, columns, flushed_rows)
 
 
     def _plot(self, axes_list):
@@ -127,9 +127,9 @@ First it acquires a sweep over a larger frequecy range. Then it finds the maximu
         # run low resolution scan
         print('run low resolution scan')
         sweeper_script.run()
-        # get data from sweeper script
-        self.data['low_res_r'] = deepcopy(sweeper_script.data[-1]['r'])
-        self.data['low_res_freq'] = deepcopy(sweeper_script.data[-1]['frequency'])
+        # get data from sweeper script, the arrays are not modified by later runs of the sweeper so they don't need to be copied
+        self.data['low_res_r'] = sweeper_script.data[-1]['r']
+        self.data['low_res_freq'] = sweeper_script.data[-1]['frequency']
 
         # find max
         fo = self.data['low_res_freq'][np.argmax(self.data['low_res_r'])]
@@ -155,8 +155,8 @@ First it acquires a sweep over a larger frequecy range. Then it finds the maximu
         print('run high resolution scan')
         sweeper_script.run()
         # get data from sweeper script
-        self.data['high_res_r'] = deepcopy(sweeper_script.data[-1]['r'])
-        self.data['high_res_freq'] = deepcopy(sweeper_script.data[-1]['frequency'])
+        self.data['high_res_r'] = sweeper_script.data[-1]['r']
+        self.data['high_res_freq'] = sweeper_script.data[-1]['frequency']
         # self.data = sweeper_script.data[-1]
 
         # set the sweeper script back to initial settings
@@ -131,46 +131,70 @@ This script performs a frequency sweep with the Zurich Instrument HF2 Series Loc
         N_loops = self.settings['loopcount']
         last_progress = 0
         loopcount = 0
+        # the sweeper doesn't notify about new data, so check its progress often and only read the data when it has
+        # advanced. The interval grows while nothing happens, e.g. during long settling times at a single frequency
+        wait_time = 0.01
         while not self.sweeper.finished():
-            time.sleep(1)
+            time.sleep(wait_time)
+
+            new_progress = float(np.max(self.sweeper.progress()))
+            if new_progress == last_progress:
+                wait_time = min(1.5 * wait_time, 1.0)
+                continue
+            wait_time = 0.01
 
-            new_progress = self.sweeper.progress()
             # poor mans way of keeping track of the repetitions, there should be a command to get this directly from the ZI API
-            if new_progress < last_progress:
+            new_loop = new_progress < last_progress
+            if new_loop:
                 loopcount +=1
             last_progress = new_progress
 
-            self.progress = float(100.*(self.sweeper.progress()+loopcount) / N_loops)
-            # self.sweeper.finished
-            data = self.sweeper.read(True)# True: flattened dictionary
+            self.progress = float(100.*(new_progress+loopcount) / N_loops)
 
-            #  ensures that first point has completed before attempting to read data
-            if (path not in data) or not (data[path][0]):
+            data = self._read_sweep(path)
+            if data is None:
                 continue
 
-            data = data[path][0][0] # the data is nested, we remove the outer brackets with [0][0]
-            # now we only want a subset of the data porvided by ZI
-            data = {k : data[k] for k in self._sweep_values}
-
-            start = time.time()
-            self.data.append(data)
-
-            if (time.time() - start) > self._timeout:
-                # If for some reason the sweep is blocking, force the end of the
-                # measurement
-                print("\nSweep still not finished, forcing finish...")
-                self.sweeper.finish()
-                self._recording = False
-
-            print(("Individual sweep %.2f%% complete. \n" % (self.progress)))
+            # each read returns the complete current sweep, so it replaces the previous read of the same sweep
+            if new_loop or len(self.data) == 0:
+                self.data.append(data)
+            else:
+                self.data[-1] = data
 
             self.updateProgress.emit(int(self.progress))
 
+        # read the points that have been acquired after the last read
+        data = self._read_sweep(path)
+        if data is not None:
+            if len(self.data) == 0:
+                self.data.append(data)
+            else:
+                self.data[-1] = data
+
         if self.sweeper.finished():
             self._recording = False
 
 
 
+    def _read_sweep(self, path):
+        """
+        reads the data of the current sweep from the sweeper
+        Args:
+            path: demodulator path to which the sweeper is subscribed
+
+        Returns: dictionary with the values in self._sweep_values or None if no point has been completed yet
+
+        """
+        data = self.sweeper.read(True)# True: flattened dictionary
+
+        #  ensures that first point has completed before attempting to read data
+        if (path not in data) or not (data[path][0]):
+            return None
+
+        data = data[path][0][0] # the data is nested, we remove the outer brackets with [0][0]
+        # now we only want a subset of the data porvided by ZI
+        return {k : data[k] for k in self._sweep_values}
+
     def _plot(self, axes_list, data = None, trace_only = False):
         """
         plots the zi instrument frequency sweep
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.core.background_saving import BackgroundSavingScript, BackgroundWriter
+
+
+class FakeScript(BackgroundSavingScript):
+    """
+    script without a gui or instruments that records its log
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.settings = {}
+        self.data = {'counts': np.arange(5)}
+        self.messages = []
+
+    def filename(self, appendix=''):
+        return os.path.join(self.path, 'data' + appendix)
+
+    def log(self, message):
+        self.messages.append(message)
+
+
+class TestBackgroundSaving(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_save(self):
+        script = FakeScript(self.path)
+        script.save_data()
+        # the acquisition can change the data while it is written
+        script.data['counts'][:] = 0
+        script.wait_for_saves()
+
+        filename = os.path.join(self.path, 'raw_data', 'data-counts.csv')
+        self.assertTrue(np.array_equal(np.loadtxt(filename, delimiter=',', skiprows=1), np.arange(5)))
+        self.assertEqual(script.messages, [])
+
+    def test_errors_are_raised_by_wait_for_saves(self):
+        # raw_data is a file, so the data can't be written
+        open(os.path.join(self.path, 'raw_data'), 'w').close()
+        script = FakeScript(self.path)
+
+        script.save_data()
+        script.save_data()
+        script.save_data()
+
+        with self.assertRaises(IOError):
+            script.wait_for_saves()
+        # each error is logged once, whether by save_data or wait_for_saves
+        self.assertEqual(len(script.messages), 3)
+
+        # the errors are only raised once
+        script.wait_for_saves()
+
+    def test_queue_is_bounded(self):
+        writer = BackgroundWriter(max_jobs=2)
+        done = []
+        for i in range(10):
+            writer.submit(done.append, (i,))
+            self.assertLessEqual(writer._queue.qsize(), 2)
+        writer.flush()
+        self.assertEqual(done, list(range(10)))
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.core.hdf5_storage import save_data_hdf5, load_data_hdf5, load_settings_hdf5, \
+    get_hdf5_files, _h5py_detected
+
+
+@skipIf(not _h5py_detected, 'h5py is not installed')
+class TestHDF5Storage(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'raw_data', '170101-00_00_00_esr.h5')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        data = {
+            'frequency': np.linspace(2.82e9, 2.92e9, 100),
+            'image_data': np.random.rand(20, 30),
+            'counts': 12.5,
+            'label': 'nv_1'
+        }
+        save_data_hdf5(self.filename, data, settings={'esr_avg': 50})
+
+        self.assertEqual(get_hdf5_files(self.path), [self.filename])
+        loaded = load_data_hdf5(self.path)
+        self.assertTrue(np.allclose(loaded['frequency'], data['frequency']))
+        self.assertTrue(np.allclose(loaded['image_data'], data['image_data']))
+        self.assertEqual(loaded['counts'], 12.5)
+        self.assertEqual(loaded['label'], 'nv_1')
+        self.assertEqual(load_settings_hdf5(self.path), {'esr_avg': 50})
+
+    def test_dictionary_entries(self):
+        # Script.load_data returns the entries of dictionaries as arrays, e.g. pos['x'][0]
+        data = {'maximum_point': {'x': 0.1, 'y': -0.2}, 'fit_params': {'a': [1., 2.], 'b': [3., 4.]}}
+        save_data_hdf5(self.filename, data)
+
+        loaded = load_data_hdf5(self.path)
+        self.assertEqual(loaded['maximum_point']['x'].shape, (1,))
+        self.assertEqual(loaded['maximum_point']['x'][0], 0.1)
+        self.assertEqual(loaded['maximum_point']['y'][0], -0.2)
+        self.assertTrue(np.allclose(loaded['fit_params']['b'], [3., 4.]))
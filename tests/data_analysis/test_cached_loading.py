@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from b26_toolkit.b26_toolkit.data_analysis.cached_loading import load_data_cached, load_folders, get_folder_signature
+
+
+class TestCachedLoading(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache_folder = os.path.join(self.path, 'cache')
+        self.folders = [os.path.join(self.path, '170101-00_00_0{:d}_esr'.format(i)) for i in range(3)]
+        for i, folder in enumerate(self.folders):
+            self._write(folder, np.arange(5) * i)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, folder, counts):
+        raw_data = os.path.join(folder, 'raw_data')
+        if not os.path.exists(raw_data):
+            os.makedirs(raw_data)
+        pd.DataFrame({'counts': counts}).to_csv(os.path.join(raw_data, 'data-counts.csv'), index=False)
+
+    def test_cache_is_used(self):
+        data = load_data_cached(self.folders[1], self.cache_folder)
+        self.assertTrue(np.array_equal(data['counts']['counts'], np.arange(5)))
+        self.assertEqual(len(os.listdir(self.cache_folder)), 1)
+
+        # unchanged folder, the data comes from the cache
+        self.assertTrue(np.array_equal(load_data_cached(self.folders[1], self.cache_folder)['counts']['counts'],
+                                       np.arange(5)))
+
+    def test_rewrite_in_place(self):
+        folder = self.folders[1]
+        load_data_cached(folder, self.cache_folder)
+
+        # rewriting a file doesn't change the modification time of the folders
+        folder_times = [os.stat(path) for path in (folder, os.path.join(folder, 'raw_data'))]
+        signature = get_folder_signature(folder)
+        self._write(folder, np.arange(5) + 100)
+        filename = os.path.join(folder, 'raw_data', 'data-counts.csv')
+        os.utime(filename, ns=(os.stat(filename).st_atime_ns, os.stat(filename).st_mtime_ns + 10**9))
+        for path, stat in zip((folder, os.path.join(folder, 'raw_data')), folder_times):
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertNotEqual(get_folder_signature(folder), signature)
+        self.assertTrue(np.array_equal(load_data_cached(folder, self.cache_folder)['counts']['counts'],
+                                       np.arange(5) + 100))
+
+    def test_load_folders(self):
+        data_list = load_folders(self.folders, self.cache_folder, max_workers=1)
+        for i, data in enumerate(data_list):
+            self.assertTrue(np.array_equal(data['counts']['counts'], np.arange(5) * i))
+
+    def test_missing_folder(self):
+        self.assertIsNone(get_folder_signature(os.path.join(self.path, 'missing')))
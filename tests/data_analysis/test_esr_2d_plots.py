@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from b26_toolkit.b26_toolkit.data_analysis.esr_2d_plots import build_esr_stack, load_esr_stack, get_esr_stack_rows, \
+    resample_esr_rows
+
+
+class TestESRStack(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.esr_folder = os.path.join(self.path, '170101-00_00_00_select_points')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write_esr(self, index, frequency, spectrum):
+        """
+        writes an ESR folder in the format of Script.save_data
+        """
+        folder = os.path.join(self.esr_folder, 'data_subscripts', '170101-00_00_{:02d}_esr_pt_{:d}'.format(index, index))
+        raw_data = os.path.join(folder, 'raw_data')
+        if not os.path.exists(raw_data):
+            os.makedirs(raw_data)
+        esr_data = np.tile(spectrum, (2, 1))
+        for key, value in [('frequency', frequency), ('data', spectrum), ('esr_data', esr_data)]:
+            pd.DataFrame(value).to_csv(os.path.join(raw_data, '170101-00_00_{:02d}_esr-{:s}.csv'.format(index, key)), index=False)
+        return folder
+
+    def test_common_frequencies(self):
+        frequency = np.linspace(2.82e9, 2.92e9, 11)
+        for i in range(3):
+            self._write_esr(i, frequency, np.ones(11) * (i + 1))
+
+        stack_folder = build_esr_stack(self.esr_folder)
+        f, data, metadata = load_esr_stack(stack_folder)
+        self.assertEqual(f.ndim, 1)
+        self.assertTrue(np.allclose(f, frequency))
+        self.assertEqual(data.shape, (3, 11))
+        self.assertTrue(np.allclose(data[2], 3))
+        self.assertEqual(metadata['tag'].tolist(), ['esr_pt_0', 'esr_pt_1', 'esr_pt_2'])
+
+        _, spectra, _ = get_esr_stack_rows(stack_folder, rows=[1], normalize=True)
+        self.assertTrue(np.allclose(spectra, 1))
+
+    def test_different_frequencies(self):
+        # e.g. ESR_Adaptive, which measures a different number of frequencies for each point
+        self._write_esr(0, np.linspace(2.82e9, 2.92e9, 11), np.ones(11))
+        self._write_esr(1, np.linspace(2.85e9, 2.90e9, 6), np.ones(6) * 2)
+
+        stack_folder = build_esr_stack(self.esr_folder)
+        f, data, metadata = load_esr_stack(stack_folder)
+        self.assertEqual(f.shape, (2, 11))
+        self.assertEqual(metadata['length'].tolist(), [11, 6])
+        self.assertTrue(np.allclose(f[1, 0:6], np.linspace(2.85e9, 2.90e9, 6)))
+        self.assertTrue(np.all(np.isnan(data[1, 6:])))
+
+        common_frequency, resampled = resample_esr_rows(np.array(f), np.array(data))
+        self.assertTrue(np.allclose(common_frequency, np.linspace(2.82e9, 2.92e9, 11)))
+        self.assertTrue(np.all(np.isnan(resampled[1, 0:3])))
+        self.assertTrue(np.allclose(resampled[1, 3:9], 2))
+
+    def test_outdated_stack_is_rebuilt(self):
+        frequency = np.linspace(2.82e9, 2.92e9, 11)
+        self._write_esr(0, frequency, np.ones(11))
+        stack_folder = build_esr_stack(self.esr_folder)
+        self.assertEqual(len(load_esr_stack(stack_folder)[2]), 1)
+
+        self._write_esr(1, frequency, np.ones(11))
+        build_esr_stack(self.esr_folder)
+        self.assertEqual(len(load_esr_stack(stack_folder)[2]), 2)
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from b26_toolkit.b26_toolkit.data_analysis.measurement_catalog import MeasurementCatalog
+
+
+class TestMeasurementCatalog(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.catalog = MeasurementCatalog(os.path.join(self.path, 'catalog.db'))
+        self.data_directory = os.path.join(self.path, 'data')
+
+        self.iterator = self._make_folder(self.data_directory, '170101-00_00_00_select_nvs', 'ScriptIteratorB26')
+        self.subscripts = os.path.join(self.iterator, 'data_subscripts')
+        for i in range(2):
+            self._make_folder(self.subscripts, '170101-00_0{:d}_00_find_nv_pt_{:02d}'.format(i, i), 'FindNV')
+            self._make_folder(self.subscripts, '170101-00_0{:d}_30_esr_pt_{:02d}'.format(i, i), 'ESR', {'freq_points': 100})
+        # the _ in find_nv must not match any character and the tag is case sensitive
+        self._make_folder(self.subscripts, '170101-00_05_00_findXnv_pt_00', 'FindNV')
+        self._make_folder(self.subscripts, '170101-00_06_00_Find_NV_pt_00', 'FindNV')
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.path)
+
+    def _make_folder(self, parent, name, script_class, settings=None):
+        path = os.path.join(parent, name)
+        os.makedirs(os.path.join(path, 'raw_data'))
+        with open(os.path.join(path, name + '.b26'), 'w') as outfile:
+            json.dump({'scripts': {name: {'class': script_class, 'settings': settings or {}}}}, outfile)
+        return path
+
+    def test_find(self):
+        self.assertEqual(self.catalog.update(self.data_directory), 7)
+
+        esr_folders = self.catalog.find(parent=self.subscripts, tag='*esr*')
+        self.assertEqual([os.path.basename(f) for f in esr_folders], ['170101-00_00_30_esr_pt_00', '170101-00_01_30_esr_pt_01'])
+
+        findnv_folders = self.catalog.find(parent=self.subscripts, tag='*find_nv*', nv_index=0)
+        self.assertEqual([os.path.basename(f) for f in findnv_folders], ['170101-00_00_00_find_nv_pt_00'])
+
+        self.assertEqual(self.catalog.find(within=self.data_directory, script_class='ScriptIteratorB26'), [self.iterator])
+        self.assertEqual(self.catalog.get_settings(esr_folders[0]), {'freq_points': 100})
+        self.assertEqual(len(self.catalog.find(settings={'freq_points': 100})), 2)
+
+    def test_incremental_update(self):
+        self.catalog.update(self.data_directory)
+        self.assertEqual(self.catalog.update(self.data_directory), 0)
+
+        new_folder = self._make_folder(self.subscripts, '170101-00_10_00_esr_pt_02', 'ESR')
+        shutil.rmtree(os.path.join(self.subscripts, '170101-00_06_00_Find_NV_pt_00'))
+
+        # unchanged directories are not listed again
+        listed = []
+        scandir = os.scandir
+
+        def logged_scandir(path):
+            listed.append(path)
+            return scandir(path)
+
+        os.scandir = logged_scandir
+        try:
+            self.assertEqual(self.catalog.update(self.data_directory), 1)
+        finally:
+            os.scandir = scandir
+
+        self.assertEqual(set(listed), {self.subscripts, new_folder})
+        self.assertIn(new_folder, self.catalog.find(parent=self.subscripts, tag='*esr*'))
+        self.assertEqual(len(self.catalog.find(within=self.data_directory)), 7)
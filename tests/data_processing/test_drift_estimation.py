@@ -0,0 +1,63 @@
+import json
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.data_processing.drift_estimation import DriftEstimator
+
+
+class TestDriftEstimator(TestCase):
+
+    def setUp(self):
+        self.estimator = DriftEstimator(measurement_noise=1e-4, process_noise=1e-8, initial_velocity=1e-3)
+        self.velocity = np.array([2e-4, -1e-4])
+
+    def _measure(self, times, noise=0.):
+        for t in times:
+            self.estimator.update(t, 0.1 + self.velocity * t + np.random.normal(0, noise, 2))
+
+    def test_not_initialized(self):
+        position, uncertainty = self.estimator.predict(10)
+        self.assertIsNone(position)
+        self.assertEqual(uncertainty, np.inf)
+
+    def test_follows_linear_drift(self):
+        self._measure(np.arange(0, 100, 10), noise=1e-5)
+        position, _ = self.estimator.predict(200)
+        self.assertTrue(np.allclose(position, 0.1 + self.velocity * 200, atol=2e-3))
+
+    def test_uncertainty_grows_with_time(self):
+        self._measure([0, 10, 20])
+        uncertainties = [self.estimator.predict(t)[1] for t in (20, 100, 1000)]
+        self.assertTrue(uncertainties[0] < uncertainties[1] < uncertainties[2])
+
+        # a new measurement reduces the uncertainty again
+        self.estimator.update(1000, 0.1 + self.velocity * 1000)
+        self.assertLess(self.estimator.predict(1000)[1], uncertainties[2])
+
+
+class TestDriftEstimatorState(TestCase):
+    """
+    the state of the estimator is saved in the checkpoints of the ScriptIteratorB26
+    """
+
+    def setUp(self):
+        self.estimator = DriftEstimator(measurement_noise=1e-4, process_noise=1e-8, initial_velocity=1e-3)
+        for t in [0, 10, 20]:
+            self.estimator.update(t, 0.1 + np.array([2e-4, -1e-4]) * t)
+
+    def test_state(self):
+        state = json.loads(json.dumps(self.estimator.get_state()))
+
+        restored = DriftEstimator(measurement_noise=1e-4, process_noise=1e-8, initial_velocity=1e-3)
+        restored.set_state(state)
+        self.assertTrue(restored.initialized)
+        for t in (20, 500):
+            position, uncertainty = restored.predict(t)
+            expected_position, expected_uncertainty = self.estimator.predict(t)
+            self.assertTrue(np.allclose(position, expected_position))
+            self.assertAlmostEqual(uncertainty, expected_uncertainty)
+
+        self.estimator.reset()
+        restored.set_state(self.estimator.get_state())
+        self.assertFalse(restored.initialized)
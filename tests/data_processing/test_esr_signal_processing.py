@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.data_processing.esr_signal_processing import get_esr_peaks, get_adaptive_freq_array
+
+
+class TestGetEsrPeaks(TestCase):
+
+    def setUp(self):
+        self.freq = np.linspace(2.82e9, 2.92e9, 200)
+
+    def _lorentzian(self, center, fwhm):
+        return (fwhm / 2) ** 2 / ((self.freq - center) ** 2 + (fwhm / 2) ** 2)
+
+    def test_from_fit(self):
+        # single dip: offset, amplitude, center, width
+        centers, fwhm = get_esr_peaks(self.freq, None, [1., -0.2, 2.87e9, -4e6])
+        self.assertEqual(centers, [2.87e9])
+        self.assertEqual(fwhm, 4e6)
+
+        # double dip: offset, width, amplitudes, centers
+        centers, fwhm = get_esr_peaks(self.freq, None, [1., 4e6, -0.2, -0.2, 2.85e9, 2.89e9])
+        self.assertEqual(centers, [2.85e9, 2.89e9])
+        self.assertEqual(fwhm, 4e6)
+
+    def test_without_fit(self):
+        ampl = 1 - 0.2 * self._lorentzian(2.85e9, 5e6) - 0.2 * self._lorentzian(2.89e9, 5e6)
+        centers, fwhm = get_esr_peaks(self.freq, ampl, None, default_fwhm=7e6)
+        self.assertEqual(fwhm, 7e6)
+        self.assertTrue(np.allclose(centers, [2.85e9, 2.89e9], atol=1e6))
+
+        ampl = 1 - 0.2 * self._lorentzian(2.87e9, 5e6)
+        centers, fwhm = get_esr_peaks(self.freq, ampl, None, default_fwhm=7e6)
+        self.assertEqual(fwhm, 7e6)
+        self.assertTrue(np.allclose(centers, [2.87e9], atol=1e6))
+
+
+class TestGetAdaptiveFreqArray(TestCase):
+
+    def setUp(self):
+        self.freq_start, self.freq_stop = 2.82e9, 2.92e9
+        self.fwhm, self.points_per_peak, self.peak_range = 5e6, 30, 3.
+
+    def _get_freq_array(self, centers):
+        return get_adaptive_freq_array(self.freq_start, self.freq_stop, centers, self.fwhm, self.points_per_peak,
+                                       self.peak_range, baseline_points=20)
+
+    def test_sorted_unique_in_range(self):
+        # the second and third windows overlap, the last one is cut at the end of the range
+        freq = self._get_freq_array([2.85e9, 2.87e9, 2.875e9, 2.918e9])
+        self.assertTrue(np.all(np.diff(freq) > 0))
+        self.assertEqual(freq[0], self.freq_start)
+        self.assertEqual(freq[-1], self.freq_stop)
+
+    def test_points_per_peak(self):
+        centers = [2.85e9, 2.89e9]
+        freq = self._get_freq_array(centers)
+        for center in centers:
+            window = freq[np.abs(freq - center) <= self.peak_range * self.fwhm]
+            self.assertGreaterEqual(len(window), self.points_per_peak)
+            # the points of the window are evenly spaced across peak_range * fwhm on both sides of the dip
+            expected = np.linspace(center - self.peak_range * self.fwhm, center + self.peak_range * self.fwhm,
+                                   self.points_per_peak)
+            self.assertTrue(np.all(np.isin(expected, window)))
+        self.assertLessEqual(len(freq), 20 + len(centers) * self.points_per_peak)
+
+    def test_without_peaks(self):
+        freq = self._get_freq_array([])
+        self.assertTrue(np.allclose(freq, np.linspace(self.freq_start, self.freq_stop, 20)))
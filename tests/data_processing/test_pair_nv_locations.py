@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.data_processing.correlate_images import pair_nv_locations
+
+
+class TestPairNvLocations(TestCase):
+
+    def setUp(self):
+        self.nv_locs_1 = np.array([[0., 0.], [10., 0.], [0., 10.], [50., 50.]])
+        # same NVs, slightly shifted and in a different order, without the last one but with a new one far away
+        self.nv_locs_2 = np.array([[0.5, 10.2], [0.3, -0.1], [10.1, 0.4], [-30., -30.]])
+
+    def test_nearest_neighbours(self):
+        pairs, unmatched_1, unmatched_2 = pair_nv_locations(self.nv_locs_1, self.nv_locs_2, max_distance=2)
+        self.assertEqual(pairs.tolist(), [[0, 1], [1, 2], [2, 0]])
+        self.assertEqual(unmatched_1.tolist(), [3])
+        self.assertEqual(unmatched_2.tolist(), [3])
+
+    def test_without_max_distance(self):
+        pairs, unmatched_1, unmatched_2 = pair_nv_locations(self.nv_locs_1, self.nv_locs_2)
+        self.assertEqual(len(pairs), 4)
+        self.assertEqual(unmatched_1.tolist(), [])
+        self.assertEqual(unmatched_2.tolist(), [3])
+
+    def test_one_to_one(self):
+        # both NVs are closest to the first NV of the second list, only one of them can be paired with it
+        nv_locs_1 = [[0., 0.], [1., 0.]]
+        nv_locs_2 = [[0.9, 0.], [-1.5, 0.]]
+
+        pairs, _, unmatched_2 = pair_nv_locations(nv_locs_1, nv_locs_2, max_distance=2)
+        self.assertEqual(pairs.tolist(), [[0, 0], [1, 0]])
+        self.assertEqual(unmatched_2.tolist(), [1])
+
+        pairs, unmatched_1, unmatched_2 = pair_nv_locations(nv_locs_1, nv_locs_2, max_distance=2, one_to_one=True)
+        self.assertEqual(pairs.tolist(), [[0, 1], [1, 0]])
+        self.assertEqual(unmatched_1.tolist(), [])
+        self.assertEqual(unmatched_2.tolist(), [])
+
+        # the only partner of the first NV is too far away
+        pairs, unmatched_1, _ = pair_nv_locations(nv_locs_1, nv_locs_2, max_distance=1, one_to_one=True)
+        self.assertEqual(pairs.tolist(), [[1, 0]])
+        self.assertEqual(unmatched_1.tolist(), [0])
+
+    def test_empty(self):
+        pairs, unmatched_1, unmatched_2 = pair_nv_locations([], self.nv_locs_2, one_to_one=True)
+        self.assertEqual(pairs.shape, (0, 2))
+        self.assertEqual(unmatched_1.tolist(), [])
+        self.assertEqual(unmatched_2.tolist(), [0, 1, 2, 3])
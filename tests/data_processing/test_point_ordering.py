@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.data_processing.point_ordering import get_point_order, nearest_neighbour_path, two_opt
+
+
+def path_length(points, path):
+    points = np.asarray(points)[path]
+    return np.sum(np.sqrt(np.sum(np.square(np.diff(points, axis=0)), axis=1)))
+
+
+class TestPointOrdering(TestCase):
+
+    def test_line(self):
+        # points on a line in random order are visited from one end to the other
+        points = np.zeros((10, 2))
+        points[:, 0] = np.random.permutation(10)
+        start = int(np.argmin(points[:, 0]))
+
+        order = get_point_order(points, start)
+        self.assertTrue(np.array_equal(points[order, 0], np.arange(10)))
+
+    def test_visits_each_point_once(self):
+        points = np.random.rand(30, 2)
+        order = get_point_order(points, start=5)
+        self.assertEqual(order[0], 5)
+        self.assertEqual(sorted(order.tolist()), list(range(30)))
+
+    def test_two_opt_shortens_path(self):
+        points = np.random.rand(40, 2)
+        path = nearest_neighbour_path(points)
+        improved = two_opt(points, path)
+        self.assertEqual(improved[0], path[0])
+        self.assertLessEqual(path_length(points, improved), path_length(points, path) + 1e-12)
+
+        # a crossing is removed
+        square = [[0, 0], [1, 1], [1, 0], [0, 1]]
+        self.assertAlmostEqual(path_length(square, two_opt(square, [0, 1, 2, 3])), 3)
+
+    def test_empty(self):
+        self.assertEqual(len(get_point_order(np.zeros((0, 2)))), 0)
@@ -0,0 +1,77 @@
+import time
+from unittest import TestCase
+
+from pylabcontrol.core import Instrument, Parameter
+from b26_toolkit.b26_toolkit.instruments.probe_cache import CachedProbesInstrument
+
+
+class FakeInstrument(CachedProbesInstrument, Instrument):
+    """
+    instrument without hardware that records the probes read from it
+    """
+
+    _DEFAULT_SETTINGS = Parameter([
+        Parameter('port', 'COM1', str, 'serial port'),
+        Parameter('temperature', 300., float, 'temperature setpoint')
+    ])
+
+    _PROBES = {'temperature': 'temperature', 'pressure': 'pressure', 'status': 'status'}
+
+    _PROBE_MAX_AGE = {'temperature': 10, 'pressure': 0.2}
+
+    def __init__(self, name=None, settings=None):
+        self.__dict__['reads'] = []
+        super(FakeInstrument, self).__init__(name, settings)
+
+    def _read_probe(self, key):
+        self.reads.append(key)
+        return len(self.reads)
+
+
+class TestCachedProbesInstrument(TestCase):
+
+    def setUp(self):
+        self.instrument = FakeInstrument()
+
+    def test_cached(self):
+        self.assertEqual(self.instrument.temperature, 1)
+        self.assertEqual(self.instrument.temperature, 1)
+        self.assertEqual(self.instrument.reads, ['temperature'])
+
+        # probes without maximum age are always read
+        self.instrument.read_probes('status')
+        self.instrument.read_probes('status')
+        self.assertEqual(self.instrument.reads, ['temperature', 'status', 'status'])
+
+    def test_max_age(self):
+        self.instrument.read_probes('pressure')
+        self.instrument.read_probes('pressure')
+        time.sleep(0.3)
+        self.instrument.read_probes('pressure')
+        self.assertEqual(self.instrument.reads, ['pressure', 'pressure'])
+
+        # max_age 0 forces a read
+        self.instrument.read_probes('temperature')
+        self.instrument.read_probes('temperature', max_age=0)
+        self.assertEqual(self.instrument.reads.count('temperature'), 2)
+
+    def test_read_all(self):
+        self.assertEqual(sorted(self.instrument.read_probes().keys()), ['pressure', 'status', 'temperature'])
+        self.instrument.read_probes()
+        self.assertEqual(sorted(self.instrument.reads), ['pressure', 'status', 'status', 'temperature'])
+
+    def test_update_invalidates(self):
+        self.instrument.read_probes('temperature')
+        self.instrument.read_probes('pressure')
+
+        # a setting that is a probe only invalidates that probe
+        self.instrument.update({'temperature': 4.})
+        self.instrument.read_probes('temperature')
+        self.instrument.read_probes('pressure')
+        self.assertEqual(self.instrument.reads, ['temperature', 'pressure', 'temperature'])
+
+        # any other setting invalidates all probes
+        self.instrument.port = 'COM2'
+        self.instrument.read_probes('temperature')
+        self.instrument.read_probes('pressure')
+        self.assertEqual(self.instrument.reads, ['temperature', 'pressure', 'temperature', 'temperature', 'pressure'])
@@ -0,0 +1,103 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.instruments.zurich_instruments import DemodulatorStream, fill_streams
+
+
+class FakeDAQ(object):
+    """
+    fake connection to the data server that records samples at a fixed rate, polling for poll_time returns the samples
+    buffered since the last poll plus the samples of the next poll_time seconds without waiting for all subscribed nodes
+    """
+    def __init__(self, clockbase=1e6, sample_rate=1000.):
+        self.clockbase = clockbase
+        self.sample_rate = sample_rate
+        self.time = 0.  # time of the device in seconds
+        self.last_poll = 0.
+        self.polls = 0
+        self.subscribed = set()
+
+    def subscribe(self, path):
+        self.subscribed.add(path)
+
+    def unsubscribe(self, path):
+        self.subscribed.discard(path)
+
+    def advance(self, duration):
+        self.time += duration
+
+    def poll(self, poll_time, timeout, flags, flat_dictionary_key):
+        self.polls += 1
+        self.time += poll_time
+        t = np.arange(np.ceil(self.last_poll * self.sample_rate), np.floor(self.time * self.sample_rate) + 1)
+        t = t / self.sample_rate
+        t = t[t > self.last_poll] if self.polls > 1 else t
+        self.last_poll = self.time
+        if len(t) == 0:
+            return {}
+        sample = {'timestamp': np.round(t * self.clockbase).astype(np.uint64), 'x': t, 'y': -t}
+        return {path: sample for path in self.subscribed}
+
+
+class TestDemodulatorStream(TestCase):
+
+    def setUp(self):
+        self.path = '/dev1/demods/0/sample'
+        self.daq = FakeDAQ()
+        self.stream = DemodulatorStream(self.daq, self.path, self.daq.clockbase, buffer_size=1000)
+
+    def test_subscription(self):
+        self.assertEqual(self.daq.subscribed, {self.path})
+        self.stream.close()
+        self.assertEqual(self.daq.subscribed, set())
+
+    def test_read_covers_duration(self):
+        t, x, y = self.stream.read(0.1)
+        self.assertLessEqual(self.daq.polls, 3)
+        self.assertGreaterEqual(t[-1] - t[0], 0.1 - 1. / self.daq.sample_rate)
+        self.assertTrue(np.allclose(x, t))
+        self.assertTrue(np.allclose(y, -t))
+
+    def test_read_uses_buffered_samples(self):
+        self.daq.advance(0.5)
+        t, _, _ = self.stream.read(0.1)
+        self.assertEqual(self.daq.polls, 1)
+        self.assertAlmostEqual(t[-1], 0.5)
+        self.assertAlmostEqual(t[0], 0.4)
+
+    def test_read_min_timestamp(self):
+        self.daq.advance(0.5)
+        self.stream.fill()
+        min_timestamp = self.stream.last_timestamp
+        t, _, _ = self.stream.read(0.1, min_timestamp=min_timestamp)
+        self.assertTrue(np.all(t > min_timestamp))
+        self.assertGreaterEqual(t[-1] - t[0], 0.1 - 1. / self.daq.sample_rate)
+
+    def test_ring_buffer_wraps(self):
+        self.daq.advance(2.5)
+        t, _, _ = self.stream.read(0.5)
+        self.assertEqual(len(t), 501)
+        self.assertTrue(np.all(np.diff(t) > 0))
+
+    def test_clear(self):
+        self.daq.advance(0.5)
+        self.stream.clear()
+        self.assertIsNone(self.stream.last_timestamp)
+
+    def test_shared_connection(self):
+        # a poll returns the samples of both streams, so both have to be filled by it
+        streams = [self.stream]
+        fill_function = lambda poll_time, timeout: fill_streams(self.daq, streams, poll_time, timeout)
+        self.stream._fill_function = fill_function
+        streams.append(DemodulatorStream(self.daq, '/dev1/demods/1/sample', self.daq.clockbase, buffer_size=1000,
+                                         fill_function=fill_function))
+
+        self.daq.advance(0.5)
+        t, _, _ = streams[0].read(0.1)
+        self.assertAlmostEqual(t[-1], 0.5)
+
+        # the samples of the second stream were transferred by the poll of the first one
+        t, _, _ = streams[1].read(0.1)
+        self.assertAlmostEqual(t[0], 0.4)
+        self.assertAlmostEqual(t[-1], 0.5)
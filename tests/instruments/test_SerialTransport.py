@@ -0,0 +1,101 @@
+import threading
+import time
+from unittest import TestCase
+
+from b26_toolkit.b26_toolkit.instruments.serial_transport import SerialTransport, SerialTimeoutError
+
+
+class FakeSerial(object):
+    """
+    fake serial.Serial connection, replies to each command terminated by \\r with the command in upper case followed by
+    reply_terminator
+    """
+
+    def __init__(self, reply_terminator=b'\n', timeout=0.2):
+        self.port = 'COM_FAKE'
+        self.timeout = timeout
+        self.reply_terminator = reply_terminator
+        self.input = b''
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+        for command in data.split(b'\r')[:-1]:
+            self.input += command.upper() + self.reply_terminator
+
+    def reset_input_buffer(self):
+        self.input = b''
+
+    def read(self, size=1):
+        data, self.input = self.input[:size], self.input[size:]
+        if len(data) < size:
+            time.sleep(self.timeout)
+        return data
+
+    def read_until(self, terminator=b'\n'):
+        index = self.input.find(terminator)
+        if index < 0:
+            time.sleep(self.timeout)
+            data, self.input = self.input, b''
+        else:
+            data, self.input = self.input[:index + len(terminator)], self.input[index + len(terminator):]
+        return data
+
+
+class TestSerialTransport(TestCase):
+
+    def test_query(self):
+        transport = SerialTransport(FakeSerial())
+
+        # returns as soon as the terminator is received rather than after the timeout
+        start = time.time()
+        self.assertEqual(transport.query('pos?\r'), 'POS?\n')
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(transport.connection.written, [b'pos?\r'])
+
+    def test_unread_data_is_discarded(self):
+        transport = SerialTransport(FakeSerial())
+        transport.write('a\r')
+        self.assertEqual(transport.query('b\r'), 'B\n')
+
+    def test_several_terminators(self):
+        transport = SerialTransport(FakeSerial(reply_terminator=b'>'), terminators=('\n', '>'))
+        self.assertEqual(transport.query('vol?\r'), 'VOL?>')
+
+    def test_timeout(self):
+        transport = SerialTransport(FakeSerial(reply_terminator=b''))
+        with self.assertRaises(SerialTimeoutError):
+            transport.query('x\r')
+
+        transport = SerialTransport(FakeSerial(reply_terminator=b''), terminators=('\n', '>'))
+        with self.assertRaises(SerialTimeoutError):
+            transport.query('x\r')
+
+    def test_read_bytes(self):
+        transport = SerialTransport(FakeSerial(), encoding=None)
+        transport.write(b'ab\r')
+        self.assertEqual(transport.read_bytes(2), b'AB')
+        with self.assertRaises(SerialTimeoutError):
+            transport.read_bytes(2)
+
+    def test_query_all(self):
+        transport = SerialTransport(FakeSerial())
+        self.assertEqual(transport.query_all(['x?\r', 'y?\r', 'z?\r']), ['X?\n', 'Y?\n', 'Z?\n'])
+        # the commands are sent in a single write
+        self.assertEqual(transport.connection.written, [b'x?\ry?\rz?\r'])
+
+    def test_threads(self):
+        transport = SerialTransport(FakeSerial())
+        replies = {}
+
+        def query(name):
+            replies[name] = [transport.query(name + '\r') for _ in range(20)]
+
+        threads = [threading.Thread(target=query, args=(name,)) for name in ('a', 'b', 'c')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for name in ('a', 'b', 'c'):
+            self.assertEqual(replies[name], [name.upper() + '\n'] * 20)
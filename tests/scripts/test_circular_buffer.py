@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.scripts.record_pressures import CircularBuffer
+
+
+class TestCircularBuffer(TestCase):
+
+    def setUp(self):
+        self.buffer = CircularBuffer({'time': float, 'pressure': float, 'valid': bool}, 5)
+
+    def _append(self, values):
+        for value in values:
+            self.buffer.append({'time': value, 'pressure': 2 * value, 'valid': value % 2 == 0})
+
+    def test_not_full(self):
+        self._append(range(3))
+        self.assertEqual(self.buffer.total, 3)
+        self.assertTrue(np.array_equal(self.buffer.get('time'), [0, 1, 2]))
+        self.assertTrue(np.array_equal(self.buffer.get('pressure', start=1), [2, 4]))
+        self.assertTrue(np.array_equal(self.buffer.get('valid'), [True, False, True]))
+
+    def test_wraps_around(self):
+        self._append(range(12))
+        self.assertEqual(self.buffer.total, 12)
+        # only the newest rows are kept, in chronological order
+        self.assertTrue(np.array_equal(self.buffer.get('time'), [7, 8, 9, 10, 11]))
+        self.assertTrue(np.array_equal(self.buffer.get('pressure'), [14, 16, 18, 20, 22]))
+
+    def test_new_rows(self):
+        self._append(range(4))
+        written = self.buffer.total
+        self._append(range(4, 7))
+
+        # rows added since the last write, including the ones that overwrote older rows
+        self.assertTrue(np.array_equal(self.buffer.get('time', start=written), [4, 5, 6]))
+        # rows that have already been overwritten are skipped
+        self.assertTrue(np.array_equal(self.buffer.get('time', start=0), [2, 3, 4, 5, 6]))
+        self.assertEqual(len(self.buffer.get('time', start=self.buffer.total)), 0)
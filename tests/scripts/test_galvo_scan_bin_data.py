@@ -0,0 +1,28 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.scripts.galvo_scan.galvo_scan_generic import GalvoScanGeneric
+
+
+class TestBinData(TestCase):
+
+    def test_line(self):
+        clock_adjust, num_points = 11, 25
+        data = np.random.randint(0, 100, num_points * clock_adjust)
+
+        # sum of each bin without the first and last sample, as the galvo is still settling
+        expected = np.array([np.sum(data[i * clock_adjust + 1:(i + 1) * clock_adjust - 1]) for i in range(num_points)])
+        self.assertTrue(np.array_equal(GalvoScanGeneric.bin_data(data, clock_adjust), expected))
+
+    def test_extra_samples_are_ignored(self):
+        data = np.arange(3 * 4 + 2)
+        self.assertTrue(np.array_equal(GalvoScanGeneric.bin_data(data, 4), [1 + 2, 5 + 6, 9 + 10]))
+
+    def test_frame(self):
+        clock_adjust = 5
+        frame = np.random.rand(7, 10 * clock_adjust)
+        binned = GalvoScanGeneric.bin_data(frame, clock_adjust, function=np.mean)
+        self.assertEqual(binned.shape, (7, 10))
+        self.assertTrue(np.allclose(binned[3], GalvoScanGeneric.bin_data(frame[3], clock_adjust, function=np.mean)))
+        self.assertAlmostEqual(binned[2, 4], np.mean(frame[2, 4 * clock_adjust + 1:5 * clock_adjust - 1]))
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+import numpy as np
+
+from b26_toolkit.b26_toolkit.scripts.galvo_scan.galvo_scan import GalvoScanFrame
+
+
+class FakeDAQ(object):
+    """
+    DAQ without hardware that counts one photon per sample and records the stopped tasks
+    """
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.stopped = []
+        self.num_samples = 0
+
+    def set_analog_voltages(self, voltages):
+        pass
+
+    def setup_counter(self, channel, num_samples):
+        self.num_samples = num_samples
+        return 'ctr'
+
+    def setup_AO(self, channels, waveform, clk_source=None):
+        return 'ao'
+
+    def run(self, task):
+        pass
+
+    def waitToFinish(self, task):
+        if self.fail:
+            raise RuntimeError('DAQ timeout')
+
+    def read(self, task):
+        return np.arange(self.num_samples), self.num_samples
+
+    def stop(self, task):
+        self.stopped.append(task)
+
+
+class TestReadFrame(TestCase):
+
+    def _get_script(self, daq):
+        script = GalvoScanFrame.__new__(GalvoScanFrame)
+        script._settings = {'flyback_time': .002, 'settle_time': .001, 'bidirectional': True, 'time_per_pt': .001,
+                            'DAQ_channels': {'x_ao_channel': 'ao0', 'y_ao_channel': 'ao1', 'counter_channel': 'ctr0'}}
+        script.daq_in = script.daq_out = daq
+        script.clockAdjust = 4
+        script.x_array = np.repeat(np.linspace(0, 1, 5), script.clockAdjust)
+        script.y_array = np.linspace(0, 1, 3)
+        return script
+
+    def test_read_frame(self):
+        daq = FakeDAQ()
+        image = self._get_script(daq).read_frame()
+        # one count per sample, the first and last sample of each point are dropped
+        self.assertTrue(np.array_equal(image, np.full((3, 5), 2.)))
+        self.assertEqual(sorted(daq.stopped), ['ao', 'ctr'])
+
+    def test_tasks_are_stopped_on_failure(self):
+        daq = FakeDAQ(fail=True)
+        with self.assertRaises(RuntimeError):
+            self._get_script(daq).read_frame()
+        self.assertEqual(sorted(daq.stopped), ['ao', 'ctr'])